@@ -0,0 +1,101 @@
+"""
+Read throughput of the biothings-client cache storage backends
+
+Fills every backend with the same number of cached responses and then times
+random lookups through the hishel storage interface (get_entries + reading the
+response body), which is exactly the work done on a cache hit.
+
+Usage:
+    python benchmarks/cache_backends.py --entries 1000000 --lookups 100000
+
+Requires the caching optional dependencies, plus lmdb for the LMDB backend.
+Filling a 1M entry cache takes a while and needs a few GB of free disk space,
+use a smaller --entries value for a quick comparison.
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import hishel
+
+from biothings_client._dependencies import _LMDB
+from biothings_client.cache.storage.filesystem import BiothingsClientSyncFileSystemStorage
+from biothings_client.cache.storage.sqlite3 import BiothingsClientSyncSqliteStorage
+
+if _LMDB:
+    from biothings_client.cache.storage.lmdb import BiothingsClientSyncLMDBStorage
+
+
+def build_payload(index: int) -> bytes:
+    """A small mygene-like document so the body size is realistic for a single getgene call."""
+    document = {
+        "_id": str(index),
+        "entrezgene": str(index),
+        "symbol": f"GENE{index}",
+        "name": "cyclin dependent kinase " * 4,
+        "taxid": 9606,
+        "ensembl": {"gene": f"ENSG{index:011d}"},
+        "summary": "x" * 512,
+    }
+    return json.dumps(document).encode("utf-8")
+
+
+def fill(storage: Any, entries: int) -> List[str]:
+    keys = []
+    for index in range(entries):
+        key = uuid.uuid4().hex
+        request = hishel.Request(method="GET", url=f"https://mygene.info/v3/gene/{index}")
+        response = hishel.Response(status_code=200, stream=iter([build_payload(index)]))
+        entry = storage.create_entry(request, response, key)
+        for _ in entry.response.stream:
+            pass
+        keys.append(key)
+    return keys
+
+
+def lookup(storage: Any, keys: List[str], lookups: int) -> float:
+    sample = random.choices(keys, k=lookups)
+    start = time.perf_counter()
+    for key in sample:
+        for entry in storage.get_entries(key):
+            b"".join(entry.response.stream)
+    return lookups / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--directory", type=Path, default=None, help="where to create the caches (default: tmp)")
+    arguments = parser.parse_args()
+
+    directory = arguments.directory or Path(tempfile.mkdtemp(prefix="biothings-cache-benchmark-"))
+    backends: Dict[str, Callable[[], Any]] = {
+        "sqlite": lambda: BiothingsClientSyncSqliteStorage(database_path=directory / "cache.sqlite"),
+        "filesystem": lambda: BiothingsClientSyncFileSystemStorage(database_path=directory / "cache.fs"),
+    }
+    if _LMDB:
+        map_size = max(1 << 30, arguments.entries * 4096)
+        backends["lmdb"] = lambda: BiothingsClientSyncLMDBStorage(
+            database_path=directory / "cache.lmdb", map_size=map_size
+        )
+
+    print(f"{'backend':<12}{'fill (s)':>12}{'lookups/s':>14}")
+    for name, factory in backends.items():
+        storage = factory()
+        start = time.perf_counter()
+        keys = fill(storage, arguments.entries)
+        fill_time = time.perf_counter() - start
+        throughput = lookup(storage, keys, arguments.lookups)
+        print(f"{name:<12}{fill_time:>12.1f}{throughput:>14.0f}")
+        storage.delete_database()
+
+
+if __name__ == "__main__":
+    main()
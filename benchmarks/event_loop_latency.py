@@ -0,0 +1,124 @@
+"""
+Event loop responsiveness of the async cache storages under heavy cache writes
+
+A probe coroutine sleeps for a fixed interval in a loop and records how late it
+wakes up. Concurrently, a batch of writers stores large responses through the
+hishel storage interface (create_entry + draining the response stream, which is
+what the async client does on a cache miss) followed by a VACUUM of the cache.
+The wake-up lag of the probe is the time every other coroutine of the process
+would have been stalled.
+
+The storages compared are hishel's AsyncSqliteStorage, which unpacks entries on
+the event loop thread and hops to a worker thread for every sqlite call, and the
+biothings-client async storages running all of their work on a dedicated
+executor. The residual lag of the latter is the worker thread holding the GIL
+(see sys.getswitchinterval).
+
+Usage:
+    python benchmarks/event_loop_latency.py --writes 2000 --concurrency 8 --body-size 262144
+
+Requires the caching optional dependencies, plus lmdb for the LMDB backend.
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+import hishel
+
+from biothings_client._dependencies import _LMDB
+from biothings_client.cache.storage.filesystem import BiothingsClientAsyncFileSystemStorage
+from biothings_client.cache.storage.sqlite3 import BiothingsClientAsyncSqliteStorage
+
+if _LMDB:
+    from biothings_client.cache.storage.lmdb import BiothingsClientAsyncLMDBStorage
+
+
+async def stream(body: bytes, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    for offset in range(0, len(body), chunk_size):
+        yield body[offset : offset + chunk_size]
+
+
+async def write(storage: Any, index: int, body: bytes) -> None:
+    request = hishel.Request(method="GET", url=f"https://mygene.info/v3/gene/{index}")
+    response = hishel.Response(status_code=200, stream=stream(body))
+    entry = await storage.create_entry(request, response, uuid.uuid4().hex)
+    async for _ in entry.response.stream:
+        pass
+
+
+async def vacuum(storage: Any) -> None:
+    if hasattr(storage, "rebuild_cache_database"):
+        await storage.rebuild_cache_database()
+    else:
+        connection = await storage._ensure_connection()
+        await connection.execute("VACUUM")
+
+
+async def probe(interval: float, lags: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(storage: Any, writes: int, concurrency: int, body_size: int, interval: float) -> List[float]:
+    body = b"x" * body_size
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(interval, lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded_write(index: int) -> None:
+        async with semaphore:
+            await write(storage, index, body)
+
+    await asyncio.gather(*(bounded_write(index) for index in range(writes)))
+    if isinstance(storage, (hishel.AsyncSqliteStorage, BiothingsClientAsyncSqliteStorage)):
+        await vacuum(storage)
+    stop.set()
+    await probe_task
+    await storage.close()
+    return lags
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8, help="number of writes in flight")
+    parser.add_argument("--body-size", type=int, default=256 * 1024, help="size of each cached response in bytes")
+    parser.add_argument("--interval", type=float, default=0.001, help="probe sleep interval in seconds")
+    parser.add_argument("--directory", type=Path, default=None, help="where to create the caches (default: tmp)")
+    arguments = parser.parse_args()
+
+    directory = arguments.directory or Path(tempfile.mkdtemp(prefix="biothings-loop-benchmark-"))
+    backends: Dict[str, Callable[[], Any]] = {
+        "hishel sqlite": lambda: hishel.AsyncSqliteStorage(database_path=directory / "hishel.sqlite"),
+        "sqlite": lambda: BiothingsClientAsyncSqliteStorage(database_path=directory / "cache.sqlite"),
+        "filesystem": lambda: BiothingsClientAsyncFileSystemStorage(database_path=directory / "cache.fs"),
+    }
+    if _LMDB:
+        map_size = max(1 << 30, 2 * arguments.writes * arguments.body_size)
+        backends["lmdb"] = lambda: BiothingsClientAsyncLMDBStorage(
+            database_path=directory / "cache.lmdb", map_size=map_size
+        )
+
+    print(f"{'backend':<16}{'total (s)':>12}{'lag p50 (ms)':>15}{'lag p99 (ms)':>15}{'lag max (ms)':>15}")
+    for name, factory in backends.items():
+        start = time.perf_counter()
+        lags = asyncio.run(
+            run(factory(), arguments.writes, arguments.concurrency, arguments.body_size, arguments.interval)
+        )
+        total = time.perf_counter() - start
+        lags_ms = sorted(lag * 1000 for lag in lags)
+        p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+        print(f"{name:<16}{total:>12.2f}{statistics.median(lags_ms):>15.2f}{p99:>15.2f}{lags_ms[-1]:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
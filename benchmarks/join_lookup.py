@@ -0,0 +1,116 @@
+"""
+Requests and end-to-end latency of a gene to variant join, scrolled or looked up by key
+
+Joins the genes of an in-process mock gene API to the variants of a mock
+variant API on dbsnp.gene.geneid, every request waiting for a simulated round
+trip time. The inner variants of every chunk of genes are either queried with
+an OR-disjunction of the join values scrolled with fetch_all (lookup=False), or
+looked up in one querymany batch on the dbsnp.gene.geneid scope (lookup=True).
+
+Usage:
+    python benchmarks/join_lookup.py --genes 5000 --variants-per-gene 3 --rtt 0.05
+"""
+
+import argparse
+import re
+import time
+from typing import Any, Dict, List
+from urllib.parse import parse_qs
+
+import httpx
+
+import biothings_client
+from biothings_client.utils.join import join
+
+SCROLL_PAGE = 1000
+
+
+def variant_hits(geneid: int, count: int) -> List[Dict[str, Any]]:
+    return [
+        {"_id": f"chr1:g.{geneid * 100 + n}A>G", "dbsnp": {"rsid": f"rs{geneid * 100 + n}", "gene": {"geneid": geneid}}}
+        for n in range(count)
+    ]
+
+
+def scroll_response(
+    hits: List[Dict[str, Any]], request: httpx.Request, scrolls: Dict[str, List[Any]]
+) -> httpx.Response:
+    scroll_id = request.url.params.get("scroll_id")
+    if scroll_id is None:
+        scroll_id = str(len(scrolls))
+        scrolls[scroll_id] = hits
+    remaining = scrolls[scroll_id]
+    if not remaining:
+        return httpx.Response(200, json={"success": False, "error": "No results to return."})
+    scrolls[scroll_id] = remaining[SCROLL_PAGE:]
+    return httpx.Response(200, json={"total": len(hits), "hits": remaining[:SCROLL_PAGE], "_scroll_id": scroll_id})
+
+
+def make_client(biothing_type: str, handler: Any) -> Any:
+    client = biothings_client.get_client(biothing_type)
+    client.http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    client.http_client_setup = True
+    client.delay = 0
+    return client
+
+
+def run(lookup: bool, arguments: argparse.Namespace) -> Dict[str, Any]:
+    requests = {"gene": 0, "variant": 0}
+    scrolls: Dict[str, List[Any]] = {}
+    genes = [{"_id": str(geneid), "entrezgene": geneid} for geneid in range(1, arguments.genes + 1)]
+
+    def gene_handler(request: httpx.Request) -> httpx.Response:
+        requests["gene"] += 1
+        time.sleep(arguments.rtt)
+        return scroll_response(genes, request, scrolls)
+
+    def variant_handler(request: httpx.Request) -> httpx.Response:
+        requests["variant"] += 1
+        time.sleep(arguments.rtt)
+        if request.method == "POST":
+            terms = parse_qs(request.content.decode())["q"][0].replace('"', "").split(",")
+            hits = [
+                {"query": term, **hit} for term in terms for hit in variant_hits(int(term), arguments.variants_per_gene)
+            ]
+            return httpx.Response(200, json=hits)
+        hits = []
+        if "scroll_id" not in request.url.params:
+            for geneid in re.findall(r"dbsnp\.gene\.geneid:(\d+)", request.url.params["q"]):
+                hits.extend(variant_hits(int(geneid), arguments.variants_per_gene))
+        return scroll_response(hits, request, scrolls)
+
+    gene_client, variant_client = make_client("gene", gene_handler), make_client("variant", variant_handler)
+    start = time.perf_counter()
+    docs = 0
+    for chunk in join(
+        gene_client,
+        variant_client,
+        size=1000,
+        e1_join_field="entrezgene",
+        e2_join_field="dbsnp.gene.geneid",
+        lookup=lookup,
+    ):
+        docs += len(chunk)
+    elapsed = time.perf_counter() - start
+    assert docs == arguments.genes
+    return {"seconds": elapsed, "docs": docs, **requests}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--genes", type=int, default=5000)
+    parser.add_argument("--variants-per-gene", type=int, default=3)
+    parser.add_argument("--rtt", type=float, default=0.05, help="round trip time, in seconds")
+    arguments = parser.parse_args()
+
+    print(
+        f"{arguments.genes} genes, {arguments.variants_per_gene} variants per gene, {arguments.rtt * 1000:.0f} ms RTT"
+    )
+    print(f"{'inner docs':<12}{'gene requests':>15}{'variant requests':>18}{'seconds':>10}")
+    for name, lookup in (("scrolled", False), ("looked up", True)):
+        result = run(lookup, arguments)
+        print(f"{name:<12}{result['gene']:>15}{result['variant']:>18}{result['seconds']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
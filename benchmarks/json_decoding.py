@@ -0,0 +1,127 @@
+"""
+Per-batch JSON decode time of the biothings-client response decoders
+
+Builds the body of a 1000 document POST response (the default batch size of
+getgenes / getvariants / querymany) shaped like mygene.info and myvariant.info
+hits, and times decoding it with every available backend: the standard library
+json module, orjson, msgspec, and decode_json which is what the clients use.
+
+Usage:
+    python benchmarks/json_decoding.py --batch-size 1000 --repeat 50
+
+Install orjson or msgspec to compare the fast decoders.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from biothings_client.utils.decoding import JSON_DECODER, decode_json
+
+
+def gene_hit(index: int) -> Dict[str, Any]:
+    return {
+        "query": str(index),
+        "_id": str(index),
+        "_version": 1,
+        "entrezgene": str(index),
+        "symbol": f"GENE{index}",
+        "name": "cyclin dependent kinase " + str(index),
+        "taxid": 9606,
+        "alias": [f"ALIAS{index}-{position}" for position in range(5)],
+        "ensembl": {
+            "gene": f"ENSG{index:011d}",
+            "transcript": [f"ENST{index * 10 + position:011d}" for position in range(8)],
+            "protein": [f"ENSP{index * 10 + position:011d}" for position in range(8)],
+        },
+        "genomic_pos": {"chr": str(random.randint(1, 22)), "start": index * 1000, "end": index * 1000 + 5321},
+        "go": {
+            "BP": [
+                {"id": f"GO:{position:07d}", "term": "cell cycle process " * 2, "evidence": "IDA", "pubmed": [1, 2]}
+                for position in range(12)
+            ]
+        },
+        "summary": "The protein encoded by this gene is a member of a family of kinases. " * 4,
+    }
+
+
+def variant_hit(index: int) -> Dict[str, Any]:
+    hgvs = f"chr1:g.{index + 35366}C>T"
+    return {
+        "query": hgvs,
+        "_id": hgvs,
+        "_version": 2,
+        "chrom": "1",
+        "vcf": {"alt": "T", "position": str(index + 35366), "ref": "C"},
+        "cadd": {
+            "rawscore": random.random(),
+            "phred": random.random() * 40,
+            "consequence": "NON_SYNONYMOUS",
+            "gene": {"gene_id": f"ENSG{index:011d}", "genename": f"GENE{index}", "prot": {"protpos": index}},
+            "encode": {"h3k27ac": random.random(), "h3k4me1": random.random(), "h3k4me3": random.random()},
+        },
+        "dbsnp": {
+            "rsid": f"rs{index}",
+            "alleles": [{"allele": allele, "freq": {"exac": random.random()}} for allele in "CT"],
+            "gene": {"geneid": index, "symbol": f"GENE{index}"},
+        },
+        "gnomad_genome": {
+            "af": {f"af_{population}": random.random() for population in ("afr", "amr", "asj", "eas", "fin", "nfe")},
+            "an": {f"an_{population}": random.randint(0, 30000) for population in ("afr", "amr", "eas", "nfe")},
+        },
+        "clinvar": {"rcv": [{"accession": f"RCV{index:09d}", "clinical_significance": "Benign"}]},
+    }
+
+
+def decoders() -> Dict[str, Callable[[bytes], Any]]:
+    available: Dict[str, Callable[[bytes], Any]] = {"json": json.loads}
+    try:
+        import orjson
+
+        available["orjson"] = orjson.loads
+    except ImportError:
+        pass
+    try:
+        import msgspec
+
+        available["msgspec"] = msgspec.json.Decoder().decode
+    except ImportError:
+        pass
+    available[f"decode_json ({JSON_DECODER})"] = decode_json
+    return available
+
+
+def time_decoder(decoder: Callable[[bytes], Any], body: bytes, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decoder(body)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    arguments = parser.parse_args()
+
+    payloads: Dict[str, bytes] = {
+        "gene": json.dumps([gene_hit(index) for index in range(arguments.batch_size)]).encode("utf-8"),
+        "variant": json.dumps([variant_hit(index) for index in range(arguments.batch_size)]).encode("utf-8"),
+    }
+    print(f"{'payload':<10}{'size (KiB)':>12}  {'decoder':<24}{'median (ms)':>13}{'min (ms)':>10}")
+    for payload_name, body in payloads.items():
+        for decoder_name, decoder in decoders().items():
+            timings = time_decoder(decoder, body, arguments.repeat)
+            print(
+                f"{payload_name:<10}{len(body) / 1024:>12.0f}  {decoder_name:<24}"
+                f"{statistics.median(timings) * 1000:>13.2f}{min(timings) * 1000:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Peak memory of the duplicate and missing accounting of querymany
+
+Feeds the hits of synthetic querymany batches, one hit per term with a few
+duplicates and missing terms, to the accounting formerly inlined in
+querymany (every matched query string kept in a list, counted with
+list_itemcnt, the duplicates rendered with str() for the log line) and to
+biothings_client.utils.accounting.QueryAccounting. The query terms come from
+a generator and the query strings of the hits are new objects, as when they
+are decoded from the responses, so only the accounting itself is measured.
+Peak memory is measured with tracemalloc in a second run, as tracing slows
+the allocations down.
+
+Usage:
+    python benchmarks/querymany_accounting.py --terms 1000000
+"""
+
+import argparse
+import logging
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from biothings_client.utils.accounting import QueryAccounting
+from biothings_client.utils.iteration import iter_n, list_itemcnt
+
+logger = logging.getLogger("benchmark")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+BATCH_SIZE = 1000
+
+
+def query_terms(count: int) -> Iterator[str]:
+    for index in range(count):
+        yield f"rs{index * 7919 % 2147483647:010d}"
+
+
+def batch_hits(batch: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    hits = []
+    for term in batch:
+        query = "".join(term)  # a new string, like the query key of a decoded hit
+        index = int(term[2:])
+        if index % 50 == 0:
+            hits.append({"query": query, "notfound": True})
+            continue
+        hits.append({"query": query, "_id": query})
+        if index % 10 == 0:
+            hits.append({"query": "".join(term), "_id": query + "-2"})
+    return hits
+
+
+def with_lists(terms: int) -> Tuple[int, int]:
+    li_missing = []
+    li_query = []
+    for batch in iter_n(query_terms(terms), BATCH_SIZE):
+        for hit in batch_hits(batch):
+            if hit.get("notfound", False):
+                li_missing.append(hit["query"])
+            else:
+                li_query.append(hit["query"])
+    li_dup = [(query, cnt) for query, cnt in list_itemcnt(li_query) if cnt > 1]
+    del li_query
+    logger.warning("{0} input query terms found dup hits:".format(len(li_dup)) + "\t" + str(li_dup)[:100])
+    logger.warning("{0} input query terms found no hit:".format(len(li_missing)) + "\t" + str(li_missing)[:100])
+    return len(li_dup), len(li_missing)
+
+
+def with_accounting(terms: int) -> Tuple[int, int]:
+    accounting = QueryAccounting()
+    for batch in iter_n(query_terms(terms), BATCH_SIZE):
+        accounting.add_inputs(batch)
+        for hit in batch_hits(batch):
+            accounting.add_hit(hit["query"], found=not hit.get("notfound", False))
+    accounting.log_summary(logger)
+    return accounting.duplicate_count, accounting.missing_count
+
+
+def measure(function: Callable[[int], Tuple[int, int]], terms: int) -> Tuple[float, int, Tuple[int, int]]:
+    start = time.perf_counter()
+    result = function(terms)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(terms)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terms", type=int, default=1000000)
+    arguments = parser.parse_args()
+
+    print(f"{arguments.terms} query terms")
+    baseline = None
+    for name, function in (("lists", with_lists), ("QueryAccounting", with_accounting)):
+        elapsed, peak, (duplicates, missing) = measure(function, arguments.terms)
+        ratio = "" if baseline is None else f"  ({baseline / peak:.1f}x less memory)"
+        baseline = baseline or peak
+        print(f"{name:<16}{elapsed:>8.3f} s{peak / 2**20:>10.1f} MiB peak  {duplicates} dup, {missing} missing{ratio}")
+
+
+if __name__ == "__main__":
+    main()
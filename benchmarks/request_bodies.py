@@ -0,0 +1,143 @@
+"""
+Bytes on the wire and end-to-end latency of variant batch queries by body encoding
+
+Sends querymany batches of long HGVS ids to an in-process mock transport
+simulating a network link (a round trip time and a bandwidth shared by the
+request and the response), with the request body form-encoded or JSON, plain
+or gzip compressed, and the response either uncompressed or compressed with
+the best encoding accepted by the client (zstd when zstandard is installed,
+br when brotli is installed, gzip otherwise).
+
+Usage:
+    python benchmarks/request_bodies.py --batches 5 --bandwidth 20 --rtt 0.05
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+
+import biothings_client
+from biothings_client._dependencies import _ZSTANDARD
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+if _ZSTANDARD:
+    import zstandard
+
+
+def hgvs_ids(count: int) -> List[str]:
+    generator = random.Random(0)
+    ids = []
+    for _ in range(count):
+        chrom = generator.choice([str(n) for n in range(1, 23)] + ["X", "Y"])
+        position = generator.randrange(1000000, 248000000)
+        inserted = "".join(generator.choice("ACGT") for _ in range(generator.randrange(1, 40)))
+        ids.append(f"chr{chrom}:g.{position}_{position + len(inserted)}delins{inserted}")
+    return ids
+
+
+def variant_hit(hgvs: str) -> Dict[str, Any]:
+    chrom = hgvs.split(":")[0][3:]
+    position = int(hgvs.split(".")[1].split("_")[0])
+    return {
+        "query": hgvs,
+        "_id": hgvs,
+        "_version": 2,
+        "chrom": chrom,
+        "vcf": {"position": str(position), "ref": "A", "alt": hgvs.split("delins")[1]},
+        "cadd": {"phred": 12.5, "rawscore": 1.3, "consequence": "NON_SYNONYMOUS", "gene": {"genename": "BRCA1"}},
+        "dbsnp": {"rsid": f"rs{position}", "vartype": "delins", "alleles": [{"allele": "A", "freq": {"topmed": 0.99}}]},
+        "clinvar": {"rcv": [{"accession": f"RCV{position:09d}", "clinical_significance": "Benign"}] * 3},
+    }
+
+
+def compress_response(body: bytes, accepted: str) -> Tuple[bytes, Optional[str]]:
+    encodings = [encoding.strip() for encoding in accepted.split(",")]
+    if "zstd" in encodings and _ZSTANDARD:
+        return zstandard.ZstdCompressor().compress(body), "zstd"
+    if "br" in encodings and brotli is not None:
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in encodings:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
+
+
+def run(body_format: str, compression: Optional[str], identity: bool, arguments: argparse.Namespace) -> Dict[str, Any]:
+    wire = {"sent": 0, "received": 0, "encoding": None}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = request.content
+        if request.headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        if request.headers["content-type"] == "application/json":
+            qterms = json.loads(body)["q"]
+        else:
+            qterms = parse_qs(body.decode())["q"][0].replace('"', "").split(",")
+        content, encoding = compress_response(
+            json.dumps([variant_hit(qterm) for qterm in qterms]).encode("utf-8"),
+            request.headers.get("accept-encoding", ""),
+        )
+        wire["sent"] += len(request.content)
+        wire["received"] += len(content)
+        wire["encoding"] = encoding
+        time.sleep(arguments.rtt + (len(request.content) + len(content)) * 8 / (arguments.bandwidth * 1e6))
+        headers = {"content-type": "application/json"}
+        if encoding is not None:
+            headers["content-encoding"] = encoding
+        return httpx.Response(200, content=content, headers=headers)
+
+    variant_client = biothings_client.get_client("variant")
+    variant_client.http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    if identity:
+        variant_client.http_client.headers["accept-encoding"] = "identity"
+    variant_client.http_client_setup = True
+    variant_client.delay = 0
+    variant_client.coalesce_requests = False
+    variant_client.request_body_format = body_format
+    variant_client.request_compression = compression
+
+    qterms = hgvs_ids(arguments.batches * 1000)
+    start = time.perf_counter()
+    hits = variant_client.querymany(qterms, scopes="_id", verbose=False)
+    elapsed = time.perf_counter() - start
+    assert len(hits) == len(qterms)
+    return {"seconds": elapsed, **wire}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--bandwidth", type=float, default=20.0, help="link bandwidth, in Mbit/s")
+    parser.add_argument("--rtt", type=float, default=0.05, help="round trip time, in seconds")
+    arguments = parser.parse_args()
+
+    print(
+        f"{arguments.batches} batches of 1000 HGVS ids, {arguments.bandwidth} Mbit/s, {arguments.rtt * 1000:.0f} ms RTT"
+    )
+    print(f"{'request body':<16}{'response':<10}{'sent KiB':>10}{'received KiB':>14}{'seconds':>10}")
+    for body_format, compression, identity in (
+        ("form", None, True),
+        ("form", None, False),
+        ("form", "gzip", False),
+        ("json", None, False),
+        ("json", "gzip", False),
+    ):
+        result = run(body_format, compression, identity, arguments)
+        name = body_format + (f"+{compression}" if compression else "")
+        print(
+            f"{name:<16}{result['encoding'] or 'identity':<10}{result['sent'] / 1024:>10.1f}"
+            f"{result['received'] / 1024:>14.1f}{result['seconds']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Time to first hit and peak memory of buffered and streamed as_generator queries
+
+Serves getgenes batches from an in-process mock transport that sends the body
+of every 1000 hit response in chunks, sleeping between chunks to simulate the
+network, and compares the client with stream_responses disabled (the whole body
+is downloaded and decoded before the first hit is yielded) and enabled (hits are
+parsed as the chunks arrive). Peak memory is measured with tracemalloc in a
+second run, as tracing slows the allocations down.
+
+Usage:
+    python benchmarks/streaming_parse.py --batches 5 --chunk-size 65536 --chunk-delay 0.002
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator
+
+import httpx
+
+import biothings_client
+
+
+def gene_hit(index: int) -> Dict[str, Any]:
+    return {
+        "query": str(index),
+        "_id": str(index),
+        "symbol": f"GENE{index}",
+        "name": "cyclin dependent kinase " + str(index),
+        "taxid": 9606,
+        "alias": [f"ALIAS{index}-{position}" for position in range(5)],
+        "ensembl": {"gene": f"ENSG{index:011d}", "transcript": [f"ENST{index * 10 + n:011d}" for n in range(8)]},
+        "go": {"BP": [{"id": f"GO:{n:07d}", "term": "cell cycle process", "evidence": "IDA"} for n in range(12)]},
+        "summary": "The protein encoded by this gene is a member of a family of kinases. " * 4,
+    }
+
+
+class ChunkedStream(httpx.SyncByteStream):
+    def __init__(self, body: bytes, chunk_size: int, chunk_delay: float) -> None:
+        self.body = body
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+
+    def __iter__(self) -> Iterator[bytes]:
+        for offset in range(0, len(self.body), self.chunk_size):
+            time.sleep(self.chunk_delay)
+            yield self.body[offset : offset + self.chunk_size]
+
+
+def run(stream_responses: bool, arguments: argparse.Namespace, trace: bool = False) -> Dict[str, float]:
+    body = json.dumps([gene_hit(index) for index in range(1000)]).encode("utf-8")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, stream=ChunkedStream(body, arguments.chunk_size, arguments.chunk_delay))
+
+    gene_client = biothings_client.get_client("gene")
+    gene_client.http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    gene_client.http_client_setup = True
+    gene_client.stream_responses = stream_responses
+    gene_client.delay = 0
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    first_hit = None
+    count = 0
+    for _ in gene_client.getgenes(range(1000 * arguments.batches), as_generator=True, verbose=False):
+        if first_hit is None:
+            first_hit = time.perf_counter() - start
+        count += 1
+    total = time.perf_counter() - start
+    peak = 0
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"hits": count, "first_hit": first_hit or 0.0, "total": total, "peak": peak / (1 << 20)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=5, help="number of 1000 hit batches")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="seconds between two chunks")
+    arguments = parser.parse_args()
+
+    print(f"{'mode':<10}{'hits':>8}{'first hit (ms)':>16}{'total (s)':>11}{'peak (MiB)':>12}")
+    for name, stream_responses in (("buffered", False), ("streamed", True)):
+        result = run(stream_responses, arguments)
+        result["peak"] = run(stream_responses, arguments, trace=True)["peak"]
+        print(
+            f"{name:<10}{result['hits']:>8}{result['first_hit'] * 1000:>16.1f}"
+            f"{result['total']:>11.2f}{result['peak']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,10 @@
 Generic client for Biothings APIs
 """
 
+from biothings_client.__version__ import __version__
+from biothings_client._dependencies import _CACHING, _PANDAS, _POLARS, _PYARROW, _ZSTANDARD
 from biothings_client.client.asynchronous import AsyncBiothingClient, get_async_client
 from biothings_client.client.base import BiothingClient, get_client
-from biothings_client.__version__ import __version__
-from biothings_client._dependencies import _CACHING, _PANDAS
 from biothings_client.utils._external import alwayslist
 
 __all__ = [
@@ -13,6 +13,9 @@ __all__ = [
     "BiothingClient",
     "_CACHING",
     "_PANDAS",
+    "_POLARS",
+    "_PYARROW",
+    "_ZSTANDARD",
     "__version__",
     "alwayslist",
     "get_async_client",
@@ -3,4 +3,11 @@ from importlib import util
 
 _PANDAS = util.find_spec("pandas") is not None
 _CACHING = util.find_spec("hishel") is not None and util.find_spec("anysqlite") is not None
+_LMDB = util.find_spec("lmdb") is not None
+_ORJSON = util.find_spec("orjson") is not None
+_MSGSPEC = util.find_spec("msgspec") is not None
+_PYARROW = util.find_spec("pyarrow") is not None
+_POLARS = util.find_spec("polars") is not None
+_ZSTANDARD = util.find_spec("zstandard") is not None
+_BROTLI = util.find_spec("brotli") is not None or util.find_spec("brotlicffi") is not None
 _CACHING_NOT_SUPPORTED = sys.version_info < (3, 8)
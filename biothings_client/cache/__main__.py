@@ -0,0 +1,84 @@
+"""
+Command line interface for inspecting a biothings-client cache
+
+Usage:
+    python -m biothings_client.cache inspect <cache path> [--top N]
+    python -m biothings_client.cache prune <cache path>
+    python -m biothings_client.cache vacuum <cache path>
+    python -m biothings_client.cache export <cache path> <output file> [--include-deleted]
+
+The cache path is either the sqlite3 database file, the filesystem storage
+directory or the LMDB environment directory. The storage type is detected
+from the on-disk layout
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+from biothings_client.cache.inspection import export_records, open_storage, summarize
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m biothings_client.cache", description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    inspect_parser = subparsers.add_parser("inspect", help="summarize the cache content")
+    inspect_parser.add_argument("path", help="cache database file or directory")
+    inspect_parser.add_argument("--top", type=int, default=10, help="number of endpoints to list")
+
+    prune_parser = subparsers.add_parser("prune", help="hard delete expired and soft deleted entries")
+    prune_parser.add_argument("path", help="cache database file or directory")
+
+    vacuum_parser = subparsers.add_parser("vacuum", help="reclaim the disk space held by removed entries")
+    vacuum_parser.add_argument("path", help="cache database file or directory")
+
+    export_parser = subparsers.add_parser("export", help="export the cached responses as NDJSON")
+    export_parser.add_argument("path", help="cache database file or directory")
+    export_parser.add_argument("output", help="output file, '-' for stdout")
+    export_parser.add_argument("--include-deleted", action="store_true", help="also export soft deleted entries")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arguments = _build_parser().parse_args(argv)
+    storage = open_storage(arguments.path)
+    try:
+        if arguments.command == "inspect":
+            summary = summarize(storage, top=arguments.top)
+            print(f"cache:           {storage.database_path}")
+            print(f"entries:         {summary['entries']}")
+            print(f"deleted entries: {summary['deleted_entries']}")
+            print(f"size on disk:    {_format_size(summary['bytes_on_disk'])}")
+            if summary["top_endpoints"]:
+                print("top endpoints by cached bytes:")
+                for endpoint, size in summary["top_endpoints"]:
+                    print(f"  {_format_size(size):>12}  {endpoint}")
+        elif arguments.command == "prune":
+            print(f"removed {storage.prune()} entries")
+        elif arguments.command == "vacuum":
+            before = storage.disk_usage()
+            storage.vacuum()
+            print(f"size on disk: {_format_size(before)} -> {_format_size(storage.disk_usage())}")
+        elif arguments.command == "export":
+            if arguments.output == "-":
+                exported = export_records(storage, sys.stdout, include_deleted=arguments.include_deleted)
+            else:
+                with open(arguments.output, "w", encoding="utf-8") as output:
+                    exported = export_records(storage, output, include_deleted=arguments.include_deleted)
+            print(f"exported {exported} entries", file=sys.stderr)
+    finally:
+        storage.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
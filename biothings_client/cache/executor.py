@@ -0,0 +1,72 @@
+"""
+Dedicated executor for the blocking cache work of the async client
+
+Storage reads, writes, VACUUM and the (de)serialization of cache entries all
+run on a small pool of worker threads owned by the storage instead of the
+event loop thread or the loop's default executor. The number of jobs handed
+to the pool is bounded: once `max_pending` jobs are queued, further callers
+wait asynchronously for a slot, so a burst of cache traffic applies
+backpressure to the coroutines issuing it instead of growing an unbounded
+queue of pending writes
+"""
+
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+DEFAULT_MAX_WORKERS: int = 1
+DEFAULT_MAX_PENDING: int = 64
+
+
+class CacheIOExecutor:
+    """Bounded thread pool running the blocking cache operations of the async client.
+
+    :param max_workers: number of worker threads. A single worker is enough for
+                        storages serializing access to one connection (sqlite3)
+    :param max_pending: maximum number of jobs submitted to the pool at once
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_pending < max_workers:
+            raise ValueError("max_pending must be greater or equal to max_workers")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # asyncio.Semaphore is bound to the loop it is first used on
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="biothings-client-cache"
+                )
+            return self._executor
+
+    def _get_slots(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = asyncio.Semaphore(self.max_pending)
+            self._slots[loop] = slots
+        return slots
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run fn(*args, **kwargs) on a worker thread once a queue slot is available."""
+        loop = asyncio.get_running_loop()
+        async with self._get_slots(loop):
+            return await loop.run_in_executor(self._ensure_executor(), functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker threads. The pool is recreated on the next call to `run`."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,197 @@
+"""
+Cache statistics and inspection helpers
+
+Shared by `client.cache_stats()` and the `python -m biothings_client.cache`
+command line interface. Storages expose their content through `iter_records`,
+which only reads entry metadata and body sizes, so summarizing a cache never
+loads the cached response bodies
+"""
+
+import base64
+import json
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from biothings_client._dependencies import _CACHING, _LMDB
+
+if sys.version_info >= (3, 8):
+    from typing import Protocol, TypedDict, runtime_checkable
+else:
+    from typing_extensions import Protocol, TypedDict, runtime_checkable
+
+
+class CacheRecord(NamedTuple):
+    """Metadata describing a single cached response."""
+
+    id: str
+    method: str
+    url: str
+    status_code: int
+    size: int
+    created_at: float
+    deleted_at: Optional[float]
+
+
+class CacheSummary(TypedDict):
+    entries: int
+    deleted_entries: int
+    bytes_on_disk: int
+    top_endpoints: List[Tuple[str, int]]
+
+
+class CacheStats(CacheSummary):
+    hits: int
+    misses: int
+    stale: int
+    average_lookup_latency: float
+
+
+@runtime_checkable
+class BiothingsClientInspectableStorage(Protocol):
+    """Operations a sync cache storage implements to support statistics and the cache CLI."""
+
+    database_path: Path
+
+    def iter_records(self) -> Iterator[CacheRecord]: ...
+
+    def read_body(self, id: str) -> Optional[bytes]: ...  # pylint: disable=W0622
+
+    def disk_usage(self) -> int: ...
+
+    def prune(self) -> int: ...
+
+    def vacuum(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class CacheStatistics:
+    """Thread-safe hit, miss and stale counters for a client since it was created."""
+
+    def __init__(self) -> None:
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stale: int = 0
+        self.lookup_time: float = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, extensions: Dict[str, Any], elapsed: float) -> None:
+        """Record the outcome of a request made while caching was enabled."""
+        with self._lock:
+            if extensions.get("hishel_from_cache", False):
+                self.hits += 1
+                self.lookup_time += elapsed
+            else:
+                self.misses += 1
+            if extensions.get("hishel_revalidated", False):
+                self.stale += 1
+
+    @property
+    def average_lookup_latency(self) -> float:
+        """Average wall time in seconds of a request served from the cache."""
+        return self.lookup_time / self.hits if self.hits else 0.0
+
+
+# Endpoint suffixes used by every biothings API, mirrored from client.settings
+KNOWN_ENDPOINTS: Tuple[str, ...] = (
+    "/metadata/fields",
+    "/metadata",
+    "/query/",
+    "/chem/",
+    "/disease/",
+    "/gene/",
+    "/geneset/",
+    "/taxon/",
+    "/variant/",
+)
+
+
+def endpoint_of(url: str, endpoints: Iterable[str] = KNOWN_ENDPOINTS) -> str:
+    """Group a cached url by the API endpoint it was sent to, dropping ids and query strings."""
+    parts = urlsplit(url)
+    path = parts.path if parts.path.endswith("/") or "/metadata" in parts.path else parts.path + "/"
+    for endpoint in endpoints:
+        position = path.find(endpoint)
+        if position >= 0:
+            return f"{parts.scheme}://{parts.netloc}{path[:position + len(endpoint)]}"
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def summarize(
+    storage: BiothingsClientInspectableStorage, top: int = 10, endpoints: Iterable[str] = KNOWN_ENDPOINTS
+) -> CacheSummary:
+    """Count the live entries of a storage and rank the endpoints holding the most cached bytes."""
+    endpoints = tuple(endpoints)
+    entries = 0
+    deleted_entries = 0
+    endpoint_sizes: "Counter[str]" = Counter()
+    for record in storage.iter_records():
+        if record.deleted_at:
+            deleted_entries += 1
+            continue
+        entries += 1
+        endpoint_sizes[endpoint_of(record.url, endpoints)] += record.size
+    return {
+        "entries": entries,
+        "deleted_entries": deleted_entries,
+        "bytes_on_disk": storage.disk_usage(),
+        "top_endpoints": endpoint_sizes.most_common(top),
+    }
+
+
+def export_records(storage: BiothingsClientInspectableStorage, output: IO[str], include_deleted: bool = False) -> int:
+    """Write every cached response as one JSON document per line. Returns the number of exported entries."""
+    exported = 0
+    for record in storage.iter_records():
+        if record.deleted_at and not include_deleted:
+            continue
+        body = storage.read_body(record.id)
+        if body is None:
+            continue
+        document: Dict[str, Any] = record._asdict()
+        try:
+            document["body"] = json.loads(body)
+        except ValueError:
+            document["body_base64"] = base64.b64encode(body).decode("ascii")
+        output.write(json.dumps(document) + "\n")
+        exported += 1
+    return exported
+
+
+def open_storage(path: Union[str, Path]) -> BiothingsClientInspectableStorage:
+    """Open an existing cache with the sync storage matching its on-disk layout."""
+    from biothings_client.client.exceptions import OptionalDependencyImportError
+
+    if not _CACHING:
+        raise OptionalDependencyImportError(
+            optional_function_access="inspect a biothings-client cache",
+            optional_group="caching",
+            libraries=["anysqlite", "hishel"],
+        )
+
+    path = Path(path).resolve().absolute()
+    if not path.exists():
+        raise FileNotFoundError(f"No cache found at {path}")
+    if path.is_file():
+        from biothings_client.cache.storage.sqlite3 import BiothingsClientSyncSqliteStorage
+
+        return BiothingsClientSyncSqliteStorage(database_path=path)
+    if (path / "data.mdb").exists():
+        if not _LMDB:
+            raise OptionalDependencyImportError(
+                optional_function_access="inspect an LMDB biothings-client cache",
+                optional_group="lmdb",
+                libraries=["lmdb"],
+            )
+        from biothings_client.cache.storage.lmdb import BiothingsClientSyncLMDBStorage
+
+        return BiothingsClientSyncLMDBStorage(database_path=path)
+    if (path / "entries").is_dir():
+        from biothings_client.cache.storage.filesystem import BiothingsClientSyncFileSystemStorage
+
+        return BiothingsClientSyncFileSystemStorage(database_path=path)
+    raise ValueError(f"Unrecognized cache layout at {path}")
@@ -0,0 +1,22 @@
+"""
+The hishel internals our cache storages depend on, gathered in one place
+
+hishel doesn't expose the serialization of its entries, so the storages pack
+and unpack them with its private _packing module. The layout of the response
+bodies in the streams table of its sqlite storage is private as well: the
+chunks are numbered from 0 and a row numbered STREAM_COMPLETE_CHUNK_NUMBER with
+empty data marks a complete body. Our sqlite storage writes and reads bodies
+in that layout without going through the private methods of hishel.
+
+Both were checked against hishel 1.4.0. test_hishel_internals in test_caching
+fails loudly when a hishel release within the range allowed by the caching
+extra moves them
+"""
+
+from biothings_client._dependencies import _CACHING
+
+# chunk number of the completion marker of a response body in the streams table
+STREAM_COMPLETE_CHUNK_NUMBER: int = -1
+
+if _CACHING:
+    from hishel._core._storages._packing import pack, unpack  # type: ignore[import-not-found]  # noqa: F401
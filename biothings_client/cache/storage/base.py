@@ -0,0 +1,331 @@
+"""
+Storage protocol and shared building blocks for the biothings-client cache backends
+
+Any storage handed to `set_caching(storage=...)` has to be a hishel storage
+(SyncBaseStorage for the sync client, AsyncBaseStorage for the async client)
+that additionally satisfies the matching protocol below. The protocol covers
+the extra operations the clients rely on for `clear_cache`, `delete_cache` and,
+for the async client, `cache_stats`
+
+The key-value base class implements the hishel storage contract on top of a
+handful of primitive record operations so that new backends (filesystem, LMDB,
+...) only have to describe how bytes are laid out on disk
+"""
+
+import sys
+from pathlib import Path
+from typing import Any, Iterable
+
+from biothings_client._dependencies import _CACHING
+from biothings_client.cache.executor import CacheIOExecutor
+from biothings_client.cache.inspection import (
+    KNOWN_ENDPOINTS,
+    BiothingsClientInspectableStorage,
+    CacheRecord,
+    CacheSummary,
+    summarize,
+)
+
+if sys.version_info >= (3, 8):
+    from typing import Protocol, runtime_checkable
+else:
+    from typing_extensions import Protocol, runtime_checkable
+
+
+@runtime_checkable
+class BiothingsClientSyncStorage(Protocol):
+    """Operations the sync client requires from a cache storage on top of hishel.SyncBaseStorage."""
+
+    database_path: Path
+
+    def hard_cleanup(self) -> None: ...
+
+    def delete_database(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+@runtime_checkable
+class BiothingsClientAsyncStorage(Protocol):
+    """Operations the async client requires from a cache storage on top of hishel.AsyncBaseStorage."""
+
+    database_path: Path
+
+    async def hard_cleanup(self) -> None: ...
+
+    async def delete_database(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+    async def summarize(self, top: int = 10, endpoints: Iterable[str] = KNOWN_ENDPOINTS) -> CacheSummary: ...
+
+
+if _CACHING:  # noqa: MC0001
+    import logging
+    import time
+    import uuid
+    from dataclasses import replace
+    from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple, Union
+
+    import hishel  # type: ignore[import-not-found]
+
+    logger = logging.getLogger("biothings.client")
+    logger.setLevel(logging.INFO)
+
+    def is_entry_expired(entry: "hishel.Entry", default_ttl: Optional[float]) -> bool:
+        """Whether an entry outlived its TTL, the hishel_ttl of its request or else default_ttl."""
+        ttl = entry.request.metadata.get("hishel_ttl") or default_ttl
+        if ttl is None:
+            return False
+        return bool(entry.meta.created_at + ttl < time.time())
+
+    class BiothingsClientSyncKeyValueStorage(hishel.SyncBaseStorage):
+        """Generic hishel storage built on top of primitive record operations.
+
+        Subclasses persist a packed entry record plus the complete response body.
+        The response body is buffered while the client consumes the response and
+        the entry is only written once the stream has been fully read, so partially
+        downloaded responses never become visible to readers
+        """
+
+        def __init__(self, database_path: Union[str, Path], default_ttl: Optional[float] = None) -> None:
+            self.database_path: Path = Path(database_path).resolve().absolute()
+            self.default_ttl = default_ttl
+
+        # primitive operations implemented by the concrete backends
+        def _write_entry(self, entry: "hishel.Entry", body: bytes) -> None:
+            raise NotImplementedError()
+
+        def _read_entries(self, key: bytes) -> List["hishel.Entry"]:
+            raise NotImplementedError()
+
+        def _read_entry(self, id: uuid.UUID) -> Optional["hishel.Entry"]:  # pylint: disable=W0622
+            raise NotImplementedError()
+
+        def _read_body(self, entry: "hishel.Entry") -> bytes:
+            raise NotImplementedError()
+
+        def _replace_entry(self, previous: "hishel.Entry", entry: "hishel.Entry") -> None:
+            raise NotImplementedError()
+
+        def _delete_entry(self, entry: "hishel.Entry") -> None:
+            raise NotImplementedError()
+
+        def _iter_entry_sizes(self) -> Iterator[Tuple["hishel.Entry", int]]:
+            raise NotImplementedError()
+
+        def hard_cleanup(self) -> None:
+            raise NotImplementedError()
+
+        def delete_database(self) -> None:
+            raise NotImplementedError()
+
+        def disk_usage(self) -> int:
+            raise NotImplementedError()
+
+        def vacuum(self) -> None:
+            pass
+
+        def close(self) -> None:
+            pass
+
+        def iter_records(self) -> Iterator[CacheRecord]:
+            """Yield the metadata and body size of every entry."""
+            for entry, size in self._iter_entry_sizes():
+                yield CacheRecord(
+                    id=entry.id.hex,
+                    method=entry.request.method,
+                    url=str(entry.request.url),
+                    status_code=entry.response.status_code,
+                    size=size,
+                    created_at=entry.meta.created_at,
+                    deleted_at=entry.meta.deleted_at,
+                )
+
+        def read_body(self, id: str) -> Optional[bytes]:  # pylint: disable=W0622
+            """Return the full response body of an entry, None if the entry is missing."""
+            entry = self._read_entry(uuid.UUID(hex=id))
+            return self._read_body(entry) if entry is not None else None
+
+        def prune(self) -> int:
+            """Hard delete expired and soft deleted entries. Returns the number of removed entries."""
+            stale_entries = [
+                entry
+                for entry, _ in self._iter_entry_sizes()
+                if self.is_soft_deleted(entry) or self._is_pair_expired(entry)
+            ]
+            for entry in stale_entries:
+                self._delete_entry(entry)
+            return len(stale_entries)
+
+        def _is_pair_expired(self, entry: "hishel.Entry") -> bool:
+            return is_entry_expired(entry, self.default_ttl)
+
+        def _is_visible(self, entry: "hishel.Entry") -> bool:
+            """Filter expired and soft deleted entries, hard deleting the stale ones we walk past."""
+            if self.is_soft_deleted(entry):
+                if self.is_safe_to_hard_delete(entry):
+                    self._delete_entry(entry)
+                return False
+            if self._is_pair_expired(entry):
+                self._replace_entry(entry, self.mark_pair_as_deleted(entry))
+                return False
+            return True
+
+        def _save_stream(self, stream: Iterator[bytes], entry: "hishel.Entry") -> Iterator[bytes]:
+            body = bytearray()
+            for chunk in stream:
+                body += chunk
+                yield chunk
+            self._write_entry(entry, bytes(body))
+
+        def _stream_body(self, entry: "hishel.Entry") -> Iterator[bytes]:
+            yield self._read_body(entry)
+
+        def create_entry(
+            self,
+            request: "hishel.Request",
+            response: "hishel.Response",
+            key: str,
+            id_: Optional[uuid.UUID] = None,
+        ) -> "hishel.Entry":
+            entry = hishel.Entry(
+                id=id_ if id_ is not None else uuid.uuid4(),
+                request=request,
+                response=response,
+                meta=hishel.EntryMeta(created_at=time.time()),
+                cache_key=key.encode("utf-8"),
+            )
+            return replace(entry, response=replace(response, stream=self._save_stream(response.stream, entry)))
+
+        def get_entries(self, key: str) -> List["hishel.Entry"]:
+            entries = []
+            for entry in self._read_entries(key.encode("utf-8")):
+                if self._is_visible(entry):
+                    entries.append(replace(entry, response=replace(entry.response, stream=self._stream_body(entry))))
+            return entries
+
+        def update_entry(
+            self,
+            id: uuid.UUID,  # pylint: disable=W0622
+            new_entry: Union["hishel.Entry", Callable[["hishel.Entry"], "hishel.Entry"]],
+        ) -> Optional["hishel.Entry"]:
+            entry = self._read_entry(id)
+            if entry is None:
+                return None
+            updated_entry = new_entry if isinstance(new_entry, hishel.Entry) else new_entry(entry)
+            if updated_entry.id != entry.id:
+                raise ValueError("Entry ID mismatch")
+            self._replace_entry(entry, updated_entry)
+            return updated_entry
+
+        def refresh_entry_ttl(self, id: uuid.UUID) -> None:  # pylint: disable=W0622
+            self.update_entry(id, lambda entry: replace(entry, meta=replace(entry.meta, created_at=time.time())))
+
+        def remove_entry(self, id: uuid.UUID) -> None:  # pylint: disable=W0622
+            entry = self._read_entry(id)
+            if entry is not None:
+                self._replace_entry(entry, self.mark_pair_as_deleted(entry))
+
+        def hard_remove_entry(self, id: uuid.UUID) -> None:  # pylint: disable=W0622
+            """Hard delete entry rather than soft delete."""
+            entry = self._read_entry(id)
+            if entry is not None:
+                self._delete_entry(entry)
+
+    class BiothingsClientAsyncStorageAdapter(hishel.AsyncBaseStorage):
+        """Exposes a BiothingsClientSyncKeyValueStorage to the async client.
+
+        Every storage call is dispatched to a dedicated bounded executor so disk
+        I/O and entry (de)serialization never run on the event loop thread
+
+        :param storage: sync storage doing the actual work
+        :param executor: executor running the storage calls, a single worker
+                         executor owned by the adapter if None
+        """
+
+        def __init__(
+            self, storage: BiothingsClientSyncKeyValueStorage, executor: Optional[CacheIOExecutor] = None
+        ) -> None:
+            self.storage = storage
+            self._owns_executor = executor is None
+            self.executor = executor if executor is not None else CacheIOExecutor()
+
+        @property
+        def database_path(self) -> Path:
+            return self.storage.database_path
+
+        async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+            return await self.executor.run(fn, *args)
+
+        async def _save_stream(self, stream: AsyncIterator[bytes], entry: "hishel.Entry") -> AsyncIterator[bytes]:
+            body = bytearray()
+            async for chunk in stream:
+                body += chunk
+                yield chunk
+            await self._run(self.storage._write_entry, entry, bytes(body))
+
+        async def _stream_body(self, entry: "hishel.Entry") -> AsyncIterator[bytes]:
+            yield await self._run(self.storage._read_body, entry)
+
+        async def create_entry(
+            self,
+            request: "hishel.Request",
+            response: "hishel.Response",
+            key: str,
+            id_: Optional[uuid.UUID] = None,
+        ) -> "hishel.Entry":
+            entry = hishel.Entry(
+                id=id_ if id_ is not None else uuid.uuid4(),
+                request=request,
+                response=response,
+                meta=hishel.EntryMeta(created_at=time.time()),
+                cache_key=key.encode("utf-8"),
+            )
+            return replace(entry, response=replace(response, stream=self._save_stream(response.stream, entry)))
+
+        async def get_entries(self, key: str) -> List["hishel.Entry"]:
+            def _visible_entries() -> List["hishel.Entry"]:
+                return [
+                    entry
+                    for entry in self.storage._read_entries(key.encode("utf-8"))
+                    if self.storage._is_visible(entry)
+                ]
+
+            entries = await self._run(_visible_entries)
+            return [
+                replace(entry, response=replace(entry.response, stream=self._stream_body(entry))) for entry in entries
+            ]
+
+        async def update_entry(
+            self,
+            id: uuid.UUID,  # pylint: disable=W0622
+            new_entry: Union["hishel.Entry", Callable[["hishel.Entry"], "hishel.Entry"]],
+        ) -> Optional["hishel.Entry"]:
+            return await self._run(self.storage.update_entry, id, new_entry)
+
+        async def refresh_entry_ttl(self, id: uuid.UUID) -> None:  # pylint: disable=W0622
+            await self._run(self.storage.refresh_entry_ttl, id)
+
+        async def remove_entry(self, id: uuid.UUID) -> None:  # pylint: disable=W0622
+            await self._run(self.storage.remove_entry, id)
+
+        async def hard_remove_entry(self, id: uuid.UUID) -> None:  # pylint: disable=W0622
+            await self._run(self.storage.hard_remove_entry, id)
+
+        async def hard_cleanup(self) -> None:
+            await self._run(self.storage.hard_cleanup)
+
+        async def delete_database(self) -> None:
+            await self._run(self.storage.delete_database)
+
+        async def close(self) -> None:
+            await self._run(self.storage.close)
+            if self._owns_executor:
+                self.executor.shutdown(wait=False)
+
+        async def summarize(self, top: int = 10, endpoints: Iterable[str] = KNOWN_ENDPOINTS) -> CacheSummary:
+            """Summarize the wrapped storage on the executor so walking a large cache doesn't block the event loop."""
+            if not isinstance(self.storage, BiothingsClientInspectableStorage):
+                raise TypeError(f"Cache storage {type(self.storage).__name__} does not support inspection")
+            return await self._run(summarize, self.storage, top, endpoints)
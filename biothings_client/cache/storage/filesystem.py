@@ -0,0 +1,194 @@
+"""
+Content-addressed filesystem storage for our hishel cache instance
+
+Layout of the cache directory:
+    entries/<entry id>                    packed hishel entry + sha256 digest of its body
+    keys/<sha256(cache key)>/<entry id>   empty marker files indexing entries by cache key
+    blobs/<digest[:2]>/<digest>           response bodies, shared by every entry with identical content
+    tmp/                                  staging area so every write lands through an atomic rename
+
+Identical response bodies are only stored once. Blobs left behind by removed
+entries are reclaimed by `collect_garbage`
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from biothings_client._dependencies import _CACHING
+
+if _CACHING:  # noqa: MC0001
+    import logging
+    import uuid
+    from typing import Iterator, List, Tuple
+
+    import hishel  # type: ignore[import-not-found]
+    import msgpack  # type: ignore[import-not-found]
+
+    from biothings_client.cache.executor import CacheIOExecutor
+    from biothings_client.cache.storage._hishel import pack, unpack
+    from biothings_client.cache.storage.base import (
+        BiothingsClientAsyncStorageAdapter,
+        BiothingsClientSyncKeyValueStorage,
+    )
+
+    logger = logging.getLogger("biothings.client")
+    logger.setLevel(logging.INFO)
+
+    class BiothingsClientSyncFileSystemStorage(BiothingsClientSyncKeyValueStorage):
+        """Content-addressed filesystem storage for the sync biothings-client."""
+
+        def __init__(self, database_path: Union[str, Path], default_ttl: Optional[float] = None) -> None:
+            super().__init__(database_path=database_path, default_ttl=default_ttl)
+            self._entries = self.database_path / "entries"
+            self._keys = self.database_path / "keys"
+            self._blobs = self.database_path / "blobs"
+            self._tmp = self.database_path / "tmp"
+            self._ensure_directories()
+
+        def _ensure_directories(self) -> None:
+            for directory in (self._entries, self._keys, self._blobs, self._tmp):
+                directory.mkdir(parents=True, exist_ok=True)
+
+        def _atomic_write(self, path: Path, data: bytes) -> None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handle, staged = tempfile.mkstemp(dir=self._tmp)
+            try:
+                with os.fdopen(handle, "wb") as staged_file:
+                    staged_file.write(data)
+                os.replace(staged, path)
+            except BaseException:
+                Path(staged).unlink(missing_ok=True)
+                raise
+
+        def _key_directory(self, key: bytes) -> Path:
+            return self._keys / hashlib.sha256(key).hexdigest()
+
+        def _blob_path(self, digest: str) -> Path:
+            return self._blobs / digest[:2] / digest
+
+        def _pack_record(self, entry: "hishel.Entry", digest: str) -> bytes:
+            return msgpack.packb({"entry": pack(entry, kind="pair"), "digest": digest})
+
+        def _unpack_record(self, path: Path) -> Optional[Any]:
+            try:
+                return msgpack.unpackb(path.read_bytes())
+            except FileNotFoundError:
+                return None
+
+        def _write_entry(self, entry: "hishel.Entry", body: bytes) -> None:
+            digest = hashlib.sha256(body).hexdigest()
+            blob_path = self._blob_path(digest)
+            if not blob_path.exists():
+                self._atomic_write(blob_path, body)
+            self._atomic_write(self._entries / entry.id.hex, self._pack_record(entry, digest))
+            key_directory = self._key_directory(entry.cache_key)
+            key_directory.mkdir(parents=True, exist_ok=True)
+            (key_directory / entry.id.hex).touch()
+
+        def _load_entry(self, path: Path) -> Optional["hishel.Entry"]:
+            record = self._unpack_record(path)
+            if record is None:
+                return None
+            return unpack(record["entry"], kind="pair")
+
+        def _read_entries(self, key: bytes) -> List["hishel.Entry"]:
+            entries = []
+            key_directory = self._key_directory(key)
+            if key_directory.is_dir():
+                for marker in key_directory.iterdir():
+                    entry = self._load_entry(self._entries / marker.name)
+                    if entry is None:
+                        marker.unlink(missing_ok=True)
+                    else:
+                        entries.append(entry)
+            return entries
+
+        def _read_entry(self, id: uuid.UUID) -> Optional["hishel.Entry"]:  # pylint: disable=W0622
+            return self._load_entry(self._entries / id.hex)
+
+        def _read_digest(self, entry: "hishel.Entry") -> str:
+            record = self._unpack_record(self._entries / entry.id.hex)
+            if record is None:
+                raise FileNotFoundError(f"No cache entry found for {entry.id}")
+            return str(record["digest"])
+
+        def _read_body(self, entry: "hishel.Entry") -> bytes:
+            return self._blob_path(self._read_digest(entry)).read_bytes()
+
+        def _replace_entry(self, previous: "hishel.Entry", entry: "hishel.Entry") -> None:
+            self._atomic_write(self._entries / entry.id.hex, self._pack_record(entry, self._read_digest(previous)))
+            if previous.cache_key != entry.cache_key:
+                (self._key_directory(previous.cache_key) / entry.id.hex).unlink(missing_ok=True)
+                key_directory = self._key_directory(entry.cache_key)
+                key_directory.mkdir(parents=True, exist_ok=True)
+                (key_directory / entry.id.hex).touch()
+
+        def _delete_entry(self, entry: "hishel.Entry") -> None:
+            (self._key_directory(entry.cache_key) / entry.id.hex).unlink(missing_ok=True)
+            (self._entries / entry.id.hex).unlink(missing_ok=True)
+
+        def _iter_entry_sizes(self) -> Iterator[Tuple["hishel.Entry", int]]:
+            for path in self._entries.iterdir():
+                record = self._unpack_record(path)
+                if record is None:
+                    continue
+                entry = unpack(record["entry"], kind="pair")
+                blob_path = self._blob_path(record["digest"])
+                if entry is not None and blob_path.exists():
+                    yield entry, blob_path.stat().st_size
+
+        def disk_usage(self) -> int:
+            """Size in bytes of every file below the cache directory."""
+            return sum(path.stat().st_size for path in self.database_path.rglob("*") if path.is_file())
+
+        def vacuum(self) -> None:
+            """Reclaim the space held by blobs no entry references anymore."""
+            self.collect_garbage()
+
+        def collect_garbage(self) -> int:
+            """Remove blobs that are no longer referenced by any entry. Returns the number of blobs removed."""
+            referenced = set()
+            for path in self._entries.iterdir():
+                record = self._unpack_record(path)
+                if record is not None:
+                    referenced.add(record["digest"])
+            removed = 0
+            for blob in self._blobs.glob("*/*"):
+                if blob.name not in referenced:
+                    blob.unlink(missing_ok=True)
+                    removed += 1
+            return removed
+
+        def hard_cleanup(self) -> None:
+            """Fully clear every entry and blob in the cache directory."""
+            for directory in (self._entries, self._keys, self._blobs, self._tmp):
+                shutil.rmtree(directory, ignore_errors=True)
+            self._ensure_directories()
+            logger.info("Successfully cleared cache entries")
+
+        def delete_database(self) -> None:
+            """Remove the entire cache directory."""
+            self.close()
+            shutil.rmtree(self.database_path, ignore_errors=True)
+
+    class BiothingsClientAsyncFileSystemStorage(BiothingsClientAsyncStorageAdapter):
+        """Content-addressed filesystem storage for the async biothings-client."""
+
+        def __init__(
+            self,
+            database_path: Union[str, Path],
+            default_ttl: Optional[float] = None,
+            executor: Optional[CacheIOExecutor] = None,
+        ) -> None:
+            super().__init__(
+                BiothingsClientSyncFileSystemStorage(database_path=database_path, default_ttl=default_ttl),
+                executor=executor,
+            )
+
+        async def collect_garbage(self) -> int:
+            """Remove blobs that are no longer referenced by any entry. Returns the number of blobs removed."""
+            return await self._run(self.storage.collect_garbage)
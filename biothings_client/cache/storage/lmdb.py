@@ -0,0 +1,171 @@
+"""
+Memory-mapped LMDB storage for our hishel cache instance
+
+The environment holds three named databases:
+    entries  entry id -> packed hishel entry
+    keys     sha256(cache key) -> entry id (sorted duplicates, one per entry)
+    bodies   entry id -> response body
+
+Reads are served straight from the memory map without going through a SQL
+layer, which keeps lookups cheap for caches holding millions of responses
+"""
+
+import hashlib
+import shutil
+from pathlib import Path
+from typing import Optional, Union
+
+from biothings_client._dependencies import _CACHING, _LMDB
+
+DEFAULT_MAP_SIZE: int = 1 << 30
+
+if _CACHING and _LMDB:  # noqa: MC0001
+    import logging
+    import os
+    import threading
+    import uuid
+    from typing import Iterator, List, Tuple
+
+    import hishel  # type: ignore[import-not-found]
+    import lmdb  # type: ignore[import-not-found]
+
+    from biothings_client.cache.executor import CacheIOExecutor
+    from biothings_client.cache.storage._hishel import pack, unpack
+    from biothings_client.cache.storage.base import (
+        BiothingsClientAsyncStorageAdapter,
+        BiothingsClientSyncKeyValueStorage,
+    )
+
+    logger = logging.getLogger("biothings.client")
+    logger.setLevel(logging.INFO)
+
+    class BiothingsClientSyncLMDBStorage(BiothingsClientSyncKeyValueStorage):
+        """LMDB storage for the sync biothings-client.
+
+        :param database_path: directory holding the LMDB environment
+        :param default_ttl: seconds before an entry expires, never expires if None
+        :param map_size: maximum size of the memory map in bytes. LMDB reserves the
+                         address space up front, the file only grows with the data
+        """
+
+        def __init__(
+            self,
+            database_path: Union[str, Path],
+            default_ttl: Optional[float] = None,
+            map_size: int = DEFAULT_MAP_SIZE,
+        ) -> None:
+            super().__init__(database_path=database_path, default_ttl=default_ttl)
+            self.map_size = map_size
+            self._environment: Optional["lmdb.Environment"] = None
+            self._lock = threading.Lock()
+
+        def _ensure_environment(self) -> "lmdb.Environment":
+            with self._lock:
+                if self._environment is None:
+                    self.database_path.mkdir(parents=True, exist_ok=True)
+                    environment = lmdb.open(str(self.database_path), map_size=self.map_size, max_dbs=3)
+                    self._entries = environment.open_db(b"entries")
+                    self._keys = environment.open_db(b"keys", dupsort=True)
+                    self._bodies = environment.open_db(b"bodies")
+                    self._environment = environment
+                return self._environment
+
+        @staticmethod
+        def _index_key(key: bytes) -> bytes:
+            return hashlib.sha256(key).digest()
+
+        def _write_entry(self, entry: "hishel.Entry", body: bytes) -> None:
+            with self._ensure_environment().begin(write=True) as transaction:
+                transaction.put(entry.id.bytes, pack(entry, kind="pair"), db=self._entries)
+                transaction.put(entry.id.bytes, body, db=self._bodies)
+                transaction.put(self._index_key(entry.cache_key), entry.id.bytes, db=self._keys)
+
+        def _read_entries(self, key: bytes) -> List["hishel.Entry"]:
+            entries = []
+            with self._ensure_environment().begin() as transaction:
+                cursor = transaction.cursor(db=self._keys)
+                if cursor.set_key(self._index_key(key)):
+                    for entry_id in cursor.iternext_dup():
+                        entry = unpack(transaction.get(entry_id, db=self._entries), kind="pair")
+                        if entry is not None:
+                            entries.append(entry)
+            return entries
+
+        def _read_entry(self, id: uuid.UUID) -> Optional["hishel.Entry"]:  # pylint: disable=W0622
+            with self._ensure_environment().begin() as transaction:
+                return unpack(transaction.get(id.bytes, db=self._entries), kind="pair")
+
+        def _read_body(self, entry: "hishel.Entry") -> bytes:
+            with self._ensure_environment().begin() as transaction:
+                body = transaction.get(entry.id.bytes, db=self._bodies)
+            if body is None:
+                raise KeyError(f"No cached body found for {entry.id}")
+            return bytes(body)
+
+        def _replace_entry(self, previous: "hishel.Entry", entry: "hishel.Entry") -> None:
+            with self._ensure_environment().begin(write=True) as transaction:
+                transaction.put(entry.id.bytes, pack(entry, kind="pair"), db=self._entries)
+                if previous.cache_key != entry.cache_key:
+                    transaction.delete(self._index_key(previous.cache_key), entry.id.bytes, db=self._keys)
+                    transaction.put(self._index_key(entry.cache_key), entry.id.bytes, db=self._keys)
+
+        def _delete_entry(self, entry: "hishel.Entry") -> None:
+            with self._ensure_environment().begin(write=True) as transaction:
+                transaction.delete(self._index_key(entry.cache_key), entry.id.bytes, db=self._keys)
+                transaction.delete(entry.id.bytes, db=self._entries)
+                transaction.delete(entry.id.bytes, db=self._bodies)
+
+        def _iter_entry_sizes(self) -> Iterator[Tuple["hishel.Entry", int]]:
+            with self._ensure_environment().begin() as transaction:
+                for entry_id, data in transaction.cursor(db=self._entries):
+                    entry = unpack(data, kind="pair")
+                    body = transaction.get(entry_id, db=self._bodies)
+                    if entry is not None and body is not None:
+                        yield entry, len(body)
+
+        def disk_usage(self) -> int:
+            """Size in bytes of the LMDB data and lock files."""
+            return sum(path.stat().st_size for path in self.database_path.glob("*.mdb") if path.is_file())
+
+        def vacuum(self) -> None:
+            """Rewrite the environment into a compacted copy, releasing the free pages left by deleted entries."""
+            environment = self._ensure_environment()
+            compacted_path = self.database_path.with_name(self.database_path.name + ".compact")
+            compacted_path.mkdir(parents=True, exist_ok=True)
+            environment.copy(str(compacted_path), compact=True)
+            self.close()
+            os.replace(compacted_path / "data.mdb", self.database_path / "data.mdb")
+            shutil.rmtree(compacted_path, ignore_errors=True)
+
+        def hard_cleanup(self) -> None:
+            """Fully clear every entry in the LMDB environment."""
+            with self._ensure_environment().begin(write=True) as transaction:
+                for database in (self._entries, self._keys, self._bodies):
+                    transaction.drop(database, delete=False)
+            logger.info("Successfully cleared cache entries")
+
+        def close(self) -> None:
+            with self._lock:
+                if self._environment is not None:
+                    self._environment.close()
+                    self._environment = None
+
+        def delete_database(self) -> None:
+            """Close the environment and remove its directory."""
+            self.close()
+            shutil.rmtree(self.database_path, ignore_errors=True)
+
+    class BiothingsClientAsyncLMDBStorage(BiothingsClientAsyncStorageAdapter):
+        """LMDB storage for the async biothings-client."""
+
+        def __init__(
+            self,
+            database_path: Union[str, Path],
+            default_ttl: Optional[float] = None,
+            map_size: int = DEFAULT_MAP_SIZE,
+            executor: Optional[CacheIOExecutor] = None,
+        ) -> None:
+            super().__init__(
+                BiothingsClientSyncLMDBStorage(database_path=database_path, default_ttl=default_ttl, map_size=map_size),
+                executor=executor,
+            )
@@ -2,20 +2,31 @@
 Overridden sqlite3 storage for our hishel cache instance
 
 Primarily so we can support hard-deleting our cache without having
-to wait for the TTL expiration
+to wait for the TTL expiration. The async storage runs the sync storage
+on a dedicated executor to keep the sqlite3 I/O off the event loop
 """
 
 import sqlite3
-from typing import Any
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple, Union
 
 from biothings_client._dependencies import _CACHING
+from biothings_client.cache.inspection import CacheRecord
+
+INSPECTION_CHUNK_SIZE: int = 1000
+# Size of the stream rows written by `write_stream`, matches hishel's own re-chunking
+STREAM_CHUNK_SIZE: int = 131072
 
 if _CACHING:  # noqa: MC0001
     import logging
     import uuid
+    from dataclasses import replace
 
     import hishel  # type: ignore[import-not-found]
-    from hishel._core._storages._packing import unpack  # type: ignore[import-not-found]
+
+    from biothings_client.cache.executor import CacheIOExecutor
+    from biothings_client.cache.storage._hishel import STREAM_COMPLETE_CHUNK_NUMBER, unpack
+    from biothings_client.cache.storage.base import BiothingsClientAsyncStorageAdapter, is_entry_expired
 
     logger = logging.getLogger("biothings.client")
     logger.setLevel(logging.INFO)
@@ -81,68 +92,191 @@ if _CACHING:  # noqa: MC0001
                         self._hard_delete_pair(pair, cursor)
                         connection.commit()
 
-    class BiothingsClientAsyncSqliteStorage(hishel.AsyncSqliteStorage):
-        """Overriden AsyncSqliteStorage instance for biothings-client."""
+        def delete_database(self) -> None:
+            """Close the connection and remove the sqlite3 database file."""
+            self.close()
+            self.database_path.unlink(missing_ok=True)
 
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, **kwargs)
+        def _iter_pairs(self) -> Iterator[Tuple[bytes, "hishel.Entry", int]]:
+            """Yield the id, entry and body size of every entry, paging through the table by id."""
+            last_id = b""
+            while True:
+                with self._lock:
+                    connection = self._ensure_connection()
+                    cursor = connection.cursor()
+                    cursor.execute(
+                        "SELECT entries.id, entries.data, COALESCE(SUM(LENGTH(streams.chunk_data)), 0) "
+                        "FROM entries LEFT JOIN streams ON streams.entry_id = entries.id "
+                        "WHERE entries.id > ? GROUP BY entries.id ORDER BY entries.id LIMIT ?",
+                        (last_id, INSPECTION_CHUNK_SIZE),
+                    )
+                    rows = cursor.fetchall()
+                if not rows:
+                    return
+                for entry_id, data, size in rows:
+                    pair = unpack(data, kind="pair")
+                    if pair is not None:
+                        yield entry_id, pair, size
+                last_id = rows[-1][0]
+
+        def iter_records(self) -> Iterator[CacheRecord]:
+            """Yield the metadata and body size of every entry, paging through the table by id."""
+            for entry_id, pair, size in self._iter_pairs():
+                yield CacheRecord(
+                    id=uuid.UUID(bytes=entry_id).hex,
+                    method=pair.request.method,
+                    url=str(pair.request.url),
+                    status_code=pair.response.status_code,
+                    size=size,
+                    created_at=pair.meta.created_at,
+                    deleted_at=pair.meta.deleted_at,
+                )
+
+        def read_stream(self, entry_id: bytes) -> Optional[bytes]:
+            """Return the full response body of an entry, None if the entry is missing or incomplete."""
+            with self._lock:
+                connection = self._ensure_connection()
+                cursor = connection.cursor()
+                cursor.execute(
+                    "SELECT chunk_number, chunk_data FROM streams WHERE entry_id = ? ORDER BY chunk_number",
+                    (entry_id,),
+                )
+                rows = cursor.fetchall()
+            if not rows or rows[0][0] != STREAM_COMPLETE_CHUNK_NUMBER:
+                return None
+            return b"".join(chunk_data for _, chunk_data in rows[1:])
+
+        def read_body(self, id: str) -> Optional[bytes]:  # pylint: disable=W0622
+            """Return the full response body of an entry, None if the entry is missing or incomplete."""
+            return self.read_stream(uuid.UUID(hex=id).bytes)
+
+        def disk_usage(self) -> int:
+            """Size in bytes of the database file along with its write-ahead log."""
+            write_ahead_log = self.database_path.with_name(self.database_path.name + "-wal")
+            return sum(path.stat().st_size for path in (self.database_path, write_ahead_log) if path.exists())
+
+        def prune(self) -> int:
+            """Hard delete expired and soft deleted entries. Returns the number of removed entries."""
+            stale_pairs = [
+                entry_id
+                for entry_id, pair, _ in self._iter_pairs()
+                if pair.meta.deleted_at or is_entry_expired(pair, self.default_ttl)
+            ]
+            for entry_id in stale_pairs:
+                self.hard_remove_entry(uuid.UUID(bytes=entry_id))
+            return len(stale_pairs)
+
+        def write_stream(self, entry_id: uuid.UUID, body: bytes) -> None:
+            """Store a complete response body along with its completion marker in a single transaction."""
+            view = memoryview(body)
+            chunks = [
+                (entry_id.bytes, chunk_number, view[offset : offset + STREAM_CHUNK_SIZE])
+                for chunk_number, offset in enumerate(range(0, len(body), STREAM_CHUNK_SIZE))
+            ]
+            chunks.append((entry_id.bytes, STREAM_COMPLETE_CHUNK_NUMBER, b""))
+            with self._lock:
+                connection = self._ensure_connection()
+                connection.executemany(
+                    "INSERT INTO streams (entry_id, chunk_number, chunk_data) VALUES (?, ?, ?)", chunks
+                )
+                connection.commit()
+
+        def vacuum(self) -> None:
+            """Reclaim the space left behind by deleted entries."""
+            self.rebuild_cache_database()
+            with self._lock:
+                # VACUUM goes through the write-ahead log, fold it back into the database file
+                self._ensure_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    class BiothingsClientAsyncSqliteCursor:
+        """Async view over a sqlite3 cursor, fetching rows on the storage executor."""
+
+        def __init__(self, cursor: sqlite3.Cursor, executor: CacheIOExecutor) -> None:
+            self._cursor = cursor
+            self._executor = executor
+
+        async def fetchone(self) -> Optional[Any]:
+            return await self._executor.run(self._cursor.fetchone)
+
+        async def fetchmany(self, size: int = INSPECTION_CHUNK_SIZE) -> List[Any]:
+            return await self._executor.run(self._cursor.fetchmany, size)
+
+        async def fetchall(self) -> List[Any]:
+            return await self._executor.run(self._cursor.fetchall)
+
+    class BiothingsClientAsyncSqliteStorage(BiothingsClientAsyncStorageAdapter):
+        """sqlite3 storage for the async biothings-client.
+
+        Wraps BiothingsClientSyncSqliteStorage and runs every database call on a
+        dedicated bounded executor. Opposed to hishel's AsyncSqliteStorage, the
+        packing and unpacking of entries, the writes of large response bodies and
+        VACUUM never touch the event loop thread. The response body is buffered
+        while the client reads it and written with a single executor job once the
+        stream is exhausted
+
+        :param database_path: path to the sqlite3 database file
+        :param default_ttl: seconds before an entry expires, never expires if None
+        :param executor: executor running the database calls, a single worker
+                         executor owned by the storage if None
+        """
+
+        def __init__(
+            self,
+            database_path: Union[str, Path] = "hishel_cache.db",
+            default_ttl: Optional[float] = None,
+            executor: Optional[CacheIOExecutor] = None,
+        ) -> None:
+            super().__init__(
+                BiothingsClientSyncSqliteStorage(database_path=database_path, default_ttl=default_ttl),
+                executor=executor,
+            )
+
+        @property
+        def default_ttl(self) -> Optional[float]:
+            return self.storage.default_ttl
 
-        def _get_database_lock(self) -> Any:
-            """Return Hishel's async SQLite lock (`_lock` before 1.2, `_write_lock` since 1.2)."""
-            lock = getattr(self, "_write_lock", None)
-            return lock if lock is not None else self._lock
+        def _read_body(self, entry: "hishel.Entry") -> bytes:
+            return self.storage.read_stream(entry.id.bytes) or b""
 
-        async def hard_cleanup(self):
+        async def _save_stream(self, stream: AsyncIterator[bytes], entry: "hishel.Entry") -> AsyncIterator[bytes]:
+            body = bytearray()
+            async for chunk in stream:
+                body += chunk
+                yield chunk
+            await self._run(self.storage.write_stream, entry.id, bytes(body))
+
+        async def _stream_body(self, entry: "hishel.Entry") -> AsyncIterator[bytes]:
+            yield await self._run(self._read_body, entry)
+
+        async def create_entry(
+            self,
+            request: "hishel.Request",
+            response: "hishel.Response",
+            key: str,
+            id_: Optional[uuid.UUID] = None,
+        ) -> "hishel.Entry":
+            # the sync storage only inserts the entry row here, the body is written by our _save_stream
+            entry = await self._run(self.storage.create_entry, request, replace(response, stream=iter(())), key, id_)
+            return replace(entry, response=replace(response, stream=self._save_stream(response.stream, entry)))
+
+        async def get_entries(self, key: str) -> List["hishel.Entry"]:
+            entries = await self._run(self.storage.get_entries, key)
+            return [
+                replace(entry, response=replace(entry.response, stream=self._stream_body(entry))) for entry in entries
+            ]
+
+        async def hard_cleanup(self) -> None:
             """Fully clear everything in the entries table for our cache.
 
-            Mirrors the _batch_cleanup method, but we pay no attention to
-            the TTL and instead simply wipe the entire table. Hard resets
-            our cache
+            See BiothingsClientSyncSqliteStorage.hard_cleanup
             """
-            try:
-                entry_identifiers = await self.get_entries_table()
-                if entry_identifiers is not None:
-                    entry_id = await entry_identifiers.fetchone()
-                    while entry_id is not None:
-                        entry_uuid = uuid.UUID(bytes=entry_id[0])
-                        await self.hard_remove_entry(entry_uuid)
-                        entry_id = await entry_identifiers.fetchone()
-                    logger.info("Successfully cleared cache entries")
-                await self.rebuild_cache_database()
-            except Exception as gen_exc:
-                raise gen_exc
+            await self._run(self.storage.hard_cleanup)
 
-        async def get_entries_table(self) -> Any:
+        async def get_entries_table(self) -> BiothingsClientAsyncSqliteCursor:
             """Get all rows in the `entries` cache table."""
-            entry_identifiers = None
-            async with self._get_database_lock():
-                cache_entries_table = "entries"
-                connection = await self._ensure_connection()
-                cursor = await connection.cursor()
-                entry_identifiers = await cursor.execute(f'SELECT id FROM "{cache_entries_table}"')
-            return entry_identifiers
+            cursor = await self._run(self.storage.get_entries_table)
+            return BiothingsClientAsyncSqliteCursor(cursor, self.executor)
 
         async def rebuild_cache_database(self) -> None:
             """Runs the VACUUM directive to rebuild our database after wipe."""
-            async with self._get_database_lock():
-                connection = await self._ensure_connection()
-                cursor = await connection.cursor()
-                await cursor.execute("VACUUM")
-
-        async def hard_remove_entry(self, id: uuid.UUID) -> None:  # pylint: disable=W0622
-            """Hard delete entry in the entry database rather than soft delete.
-
-            Identical implementation to remove_entry, except we call _hard_delete_pair
-            at the end instead of _soft_delete_pair
-            """
-            async with self._get_database_lock():
-                connection = await self._ensure_connection()
-                cursor = await connection.cursor()
-                await cursor.execute("SELECT data FROM entries WHERE id = ?", (id.bytes,))
-                result = await cursor.fetchone()
-
-                if result is not None:
-                    pair = unpack(result[0], kind="pair")
-                    if pair is not None:
-                        await self._hard_delete_pair(pair, cursor)
-                        await connection.commit()
+            await self._run(self.storage.rebuild_cache_database)
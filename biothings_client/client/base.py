@@ -2,19 +2,24 @@
 Synchronous Python Client for generic Biothings API services
 """
 
+import concurrent.futures
+import itertools
 import logging
 import platform
 import time
 import warnings
+from array import array
 from copy import copy
 from pathlib import Path
-from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple, Type, Union, cast
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Set, Tuple, Type, Union, cast
 
 import httpx
 
 from biothings_client.__version__ import __version__
-from biothings_client._dependencies import _CACHING, _CACHING_NOT_SUPPORTED, _PANDAS
+from biothings_client._dependencies import _CACHING, _CACHING_NOT_SUPPORTED, _PANDAS, _POLARS, _PYARROW
 from biothings_client.cache.httpx.transport import ForcedCacheTransport
+from biothings_client.cache.inspection import BiothingsClientInspectableStorage, CacheStatistics, CacheStats, summarize
+from biothings_client.cache.storage.base import BiothingsClientSyncStorage
 from biothings_client.client.exceptions import CachingNotSupportedError, OptionalDependencyImportError
 from biothings_client.client.settings import (
     COMMON_ALIASES,
@@ -36,14 +41,32 @@ from biothings_client.client.settings import (
 )
 from biothings_client.mixins.gene import MyGeneClientMixin
 from biothings_client.mixins.variant import MyVariantClientMixin
+from biothings_client.utils.accounting import AccountedHits, QueryAccounting
+from biothings_client.utils.arrow import ArrowBatchBuilder
 from biothings_client.utils.copy import copy_func
-from biothings_client.utils.iteration import concatenate_list, iter_n, list_itemcnt
+from biothings_client.utils.decoding import decode_json
+from biothings_client.utils.dedupe import distinct_terms, fan_out
+from biothings_client.utils.encoding import ACCEPT_ENCODING, encode_request_body
+from biothings_client.utils.fields import HIT_METADATA_FIELDS, FieldExtractor, projection_fields
+from biothings_client.utils.frames import DataFrameChunker, concat_polars_frames, polars_frame
+from biothings_client.utils.iteration import concatenate_list, iter_n, safe_str
+from biothings_client.utils.options import COMPATIBLE_OUTPUTS, check_output_options
+from biothings_client.utils.planner import split_query, union_responses, unique_hits
+from biothings_client.utils.positions import BatchPositions, batch_positions
+from biothings_client.utils.records import RecordDecoder, record_type
+from biothings_client.utils.singleflight import SingleFlight, request_key
+from biothings_client.utils.sinks import BiothingsClientSink, export_sink
+from biothings_client.utils.sizing import AdaptiveStep, BatchMeter, record_response_bytes
+from biothings_client.utils.streaming import JsonStream
 
 if _PANDAS:
     import pandas
 else:
     pandas: Any = None  # type: ignore[no-redef]
 
+if _POLARS:
+    import polars
+
 if _CACHING:
     import hishel  # type: ignore
     import hishel.httpx  # type: ignore
@@ -138,6 +161,44 @@ class BiothingClient:
         self.http_cache_client_setup: bool = False
         self.cache_storage: Any = None
         self.caching_enabled: bool = False
+        self.cache_statistics = CacheStatistics()
+
+        # opt-in coalescing of identical requests issued concurrently from several
+        #   threads into a single network call, the callers sharing its response
+        self.coalesce_requests: bool = False
+        self._request_coalescer = SingleFlight()
+
+        # opt-in incremental parsing of the responses of as_generator and fetch_all
+        #   queries: hits are yielded as soon as they are received instead of once
+        #   the whole response body is downloaded and decoded
+        self.stream_responses: bool = False
+
+        # number of batches of querymany and getannotations sent at once with
+        #   unordered=True, the hits being returned in the order they are received
+        self.max_concurrent_batches: int = 4
+
+        # opt-in sizing of the batches of querymany and getannotations from the latency and
+        #   the response size measured for the previous batches, to fit both budgets within
+        #   max_query inputs (see biothings_client.utils.sizing)
+        self.adaptive_step: bool = False
+        self.step_latency_budget: float = 5.0
+        self.step_size_budget: int = 8 * 2**20
+
+        # encoding of the bodies of the POST batch queries: "form" (the ids or query terms
+        #   quoted and comma-joined) or "json" (the ids or query terms as a JSON array), gzip
+        #   compressed from request_compression_threshold bytes with request_compression="gzip"
+        #   (see biothings_client.utils.encoding)
+        self.request_body_format: str = "form"
+        self.request_compression: Optional[str] = None
+        self.request_compression_threshold: int = 1024
+
+        # query strings of query() longer than this once URL-encoded are split into
+        #   sub-queries when they are OR-disjunctions (see biothings_client.utils.planner)
+        self.max_query_length: int = 4000
+
+        # the field names of the get_fields() metadata and their parent objects, fetched
+        #   once to verify the columns requested with the columns= projection
+        self._field_names: Optional[Set[str]] = None
 
     def _set_http_client(self, cache_db: Optional[Union[str, Path]] = None) -> None:
         """Setter for determining what http client we build based on if caching is enabled."""
@@ -185,12 +246,13 @@ class BiothingClient:
         if not self.http_cache_client_setup:
             assert hishel is not None  # noqa: S101
             assert BiothingsClientSyncSqliteStorage is not None  # noqa: S101
-            if cache_db is None:
-                cache_db = self._default_cache_file
+            if self.cache_storage is None:
+                if cache_db is None:
+                    cache_db = self._default_cache_file
 
-            assert cache_db is not None  # noqa: S101
-            cache_db = Path(cache_db).resolve().absolute()
-            self.cache_storage = BiothingsClientSyncSqliteStorage(database_path=cache_db)
+                assert cache_db is not None  # noqa: S101
+                cache_db = Path(cache_db).resolve().absolute()
+                self.cache_storage = BiothingsClientSyncSqliteStorage(database_path=cache_db)
 
             # We have to apply the SpecificationPolicy for both the SyncCacheTransport
             # and the SyncCacheClient
@@ -265,10 +327,16 @@ class BiothingClient:
             self.url = self.url.replace("http://", "https://")
 
     @staticmethod
-    def _dataframe(obj: Union[JsonDict, JsonList], dataframe: int, df_index: bool = True) -> Any:
+    def _dataframe(obj: Union[JsonDict, JsonList], dataframe: Union[int, str], df_index: bool = True) -> Any:
         """
-        Converts object to DataFrame (pandas)
+        Converts object to DataFrame (pandas). With dataframe="polars", obj is
+        either a query response or the polars frames of the batches of hits,
+        concatenated into one frame
         """
+        if dataframe == "polars":
+            if isinstance(obj, dict) and "hits" in obj:
+                return polars_frame(obj["hits"])
+            return concat_polars_frames(obj)
         if _PANDAS:
             assert pandas is not None  # noqa: S101
             if dataframe not in [1, 2]:
@@ -295,6 +363,35 @@ class BiothingClient:
             )
             raise dataframe_library_error
 
+    @staticmethod
+    def _dataframe_chunker(
+        size: int, fields: Optional[str], df_index: bool, projection: Optional[FieldExtractor] = None
+    ) -> DataFrameChunker:
+        """
+        Splits the hits into pandas DataFrames of **size** rows, which all have a
+        column for each of the requested fields, or only the projected columns
+        """
+        if projection is not None:
+            return DataFrameChunker(size, index="query" if df_index else None, projection=projection)
+        columns = fields.split(",") if isinstance(fields, str) and fields != "all" else None
+        return DataFrameChunker(size, columns=columns, index="query" if df_index else None)
+
+    @staticmethod
+    def _arrow_builder(as_arrow: Any) -> ArrowBatchBuilder:
+        """
+        Converts batches of hits to Arrow record batches (pyarrow). **as_arrow** is
+        True to infer the schema from the first batch of hits or a pyarrow.Schema
+        """
+        if _PYARROW:
+            return ArrowBatchBuilder(schema=None if as_arrow in [True, 1] else as_arrow)
+        else:
+            arrow_library_error = OptionalDependencyImportError(
+                optional_function_access="enable arrow conversion",
+                optional_group="arrow",
+                libraries=["pyarrow"],
+            )
+            raise arrow_library_error
+
     def _get(
         self,
         url: str,
@@ -312,16 +409,28 @@ class BiothingClient:
 
         debug = params.pop("debug", False)
         return_raw = params.pop("return_raw", False)
-        headers = {"user-agent": self.default_user_agent}
-        response = self.http_client.get(
-            url=url,
-            params=params,
-            headers=headers,
-            extensions={"cache_disabled": not self.caching_enabled},
-        )
+        headers = {"user-agent": self.default_user_agent, "accept-encoding": ACCEPT_ENCODING}
+        http_client = self.http_client
+
+        def send_request() -> httpx.Response:
+            # the cache statistics are recorded by the caller sending the request, once per lookup
+            lookup_start = time.perf_counter()
+            response = http_client.get(
+                url=url,
+                params=params,
+                headers=headers,
+                extensions={"cache_disabled": not self.caching_enabled},
+            )
+            if self.caching_enabled:
+                self.cache_statistics.record(response.extensions, time.perf_counter() - lookup_start)
+            return response
 
-        response_extensions = response.extensions
-        from_cache = response_extensions.get("hishel_from_cache", False)
+        if self.coalesce_requests:
+            response = self._request_coalescer.do(request_key("GET", url, params), send_request)
+        else:
+            response = send_request()
+
+        from_cache = response.extensions.get("hishel_from_cache", False)
 
         if from_cache:
             logger.debug("Cached response %s from %s", response, url)
@@ -331,7 +440,7 @@ class BiothingClient:
             if debug or return_raw:
                 get_response = (from_cache, response)
             else:
-                get_response = (from_cache, response.json())
+                get_response = (from_cache, decode_json(response.content))
         else:
             if none_on_404 and response.status_code == 404:
                 get_response = (from_cache, None)
@@ -347,17 +456,32 @@ class BiothingClient:
         assert self.http_client is not None  # noqa: S101
         if params is None:
             params = {}
+        if params.pop("stream", False):
+            return self._stream("POST", url, params, verbose=verbose)
         return_raw = params.pop("return_raw", False)
-        headers = {"user-agent": self.default_user_agent}
-        response = self.http_client.post(
-            url=url,
-            data=params,
-            headers=headers,
-            extensions={"cache_disabled": not self.caching_enabled},
-        )
+        body, body_headers = self._request_body(params)
+        headers = {"user-agent": self.default_user_agent, "accept-encoding": ACCEPT_ENCODING, **body_headers}
+        http_client = self.http_client
+
+        def send_request() -> httpx.Response:
+            # the cache statistics are recorded by the caller sending the request, once per lookup
+            lookup_start = time.perf_counter()
+            response = http_client.post(
+                url=url,
+                headers=headers,
+                extensions={"cache_disabled": not self.caching_enabled},
+                **body,
+            )
+            if self.caching_enabled:
+                self.cache_statistics.record(response.extensions, time.perf_counter() - lookup_start)
+            return response
 
-        response_extensions = response.extensions
-        from_cache = response_extensions.get("hishel_from_cache", False)
+        if self.coalesce_requests:
+            response = self._request_coalescer.do(request_key("POST", url, params), send_request)
+        else:
+            response = send_request()
+
+        from_cache = response.extensions.get("hishel_from_cache", False)
 
         if from_cache:
             logger.debug("Cached response %s from %s", response, url)
@@ -368,7 +492,8 @@ class BiothingClient:
                 post_response = (from_cache, response)
             else:
                 response.read()
-                post_response = (from_cache, response.json())
+                record_response_bytes(len(response.content))
+                post_response = (from_cache, decode_json(response.content))
         else:
             if self.raise_for_status:
                 response.raise_for_status()
@@ -376,6 +501,55 @@ class BiothingClient:
                 post_response = (from_cache, response)
         return post_response
 
+    def _stream(
+        self, method: str, url: str, params: JsonDict, key: Optional[str] = None, verbose: bool = True
+    ) -> Tuple[bool, Union[JsonStream, httpx.Response]]:
+        """
+        Send a request and return a JsonStream parsing the hits of the response
+        incrementally, the hits are under **key** when the response is an object.
+        Streamed requests are never coalesced
+        """
+        self._set_http_client()
+        assert self.http_client is not None  # noqa: S101
+        body, body_headers = self._request_body(params) if method == "POST" else ({"params": params}, {})
+        request = self.http_client.build_request(
+            method,
+            url,
+            headers={"user-agent": self.default_user_agent, "accept-encoding": ACCEPT_ENCODING, **body_headers},
+            extensions={"cache_disabled": not self.caching_enabled},
+            **body,
+        )
+        lookup_start = time.perf_counter()
+        response = self.http_client.send(request, stream=True)
+
+        response_extensions = response.extensions
+        if self.caching_enabled:
+            self.cache_statistics.record(response_extensions, time.perf_counter() - lookup_start)
+        from_cache = response_extensions.get("hishel_from_cache", False)
+
+        if from_cache:
+            logger.debug("Cached response %s from %s", response, url)
+
+        if response.is_success:
+            return from_cache, JsonStream(response, key=key)
+        response.read()
+        if self.raise_for_status:
+            response.raise_for_status()
+        return from_cache, response
+
+    def _request_body(self, params: JsonDict) -> Tuple[JsonDict, Dict[str, str]]:
+        """
+        The httpx arguments of the body of a POST request and its headers, the
+        parameters being form-encoded by httpx unless request_body_format or
+        request_compression are set
+        """
+        if self.request_body_format == "form" and self.request_compression is None:
+            return {"data": params}, {}
+        content, headers = encode_request_body(
+            params, self.request_body_format, self.request_compression, self.request_compression_threshold
+        )
+        return {"content": content}, headers
+
     def _handle_common_kwargs(self, kwargs: JsonDict) -> JsonDict:
         # handle these common parameters accept field names as the value
         for kw in ["fields", "always_list", "allow_null"]:
@@ -383,31 +557,174 @@ class BiothingClient:
                 kwargs[kw] = concatenate_list(kwargs[kw], quoted=False)
         return kwargs
 
+    @staticmethod
+    def _batching(
+        kwargs: JsonDict, return_raw: bool = False, export: bool = False, chunks: bool = False
+    ) -> Tuple[JsonDict, bool]:
+        """
+        Pop the dedupe, unordered and with_positions options of the batch queries,
+        returns the options of _repeated_query and with_positions
+        """
+        dedupe = kwargs.pop("dedupe", False)
+        unordered = kwargs.pop("unordered", False)
+        with_positions = kwargs.pop("with_positions", False)
+        if dedupe and (return_raw or export):
+            raise ValueError("dedupe can't be combined with return_raw, to_parquet or to_ndjson")
+        if dedupe and (unordered or with_positions):
+            raise ValueError("dedupe can't be combined with unordered or with_positions")
+        if unordered and export:
+            raise ValueError("unordered can't be combined with to_parquet or to_ndjson")
+        if with_positions and (return_raw or export or chunks):
+            raise ValueError(
+                "with_positions can't be combined with return_raw, to_parquet, to_ndjson or as_dataframe_chunks"
+            )
+        return {"dedupe": dedupe, "unordered": unordered}, with_positions
+
     def _repeated_query(
         self,
         query_fn: Callable[..., Tuple[bool, Any]],
         query_li: Iterable[Any],
         verbose: bool = True,
+        dedupe: bool = False,
+        unordered: bool = False,
+        with_batches: bool = False,
         **fn_kwargs: Any,
     ) -> Generator[Any, None, None]:
         """
         Run query_fn for input query_li in a batch (self.step).
         return a generator of query_result in each batch.
-        input query_li can be a list/tuple/iterable
+        input query_li can be a list/tuple/iterable.
+        With dedupe, every distinct input of a batch is queried once and the results
+        are lists of hits fanned back out to the input positions of the batch.
+        With unordered, up to self.max_concurrent_batches batches are sent at once
+        from a thread pool and the results are yielded as they are received.
+        With with_batches, (start, batch, query_result) are yielded, start being the
+        position of the first input of the batch.
+        With self.adaptive_step, the batches are sized from the latency and the
+        response size measured for the previous ones
         """
+        if dedupe:
+            query_fn = self._deduped(query_fn)
         step = min(self.step, self.max_query)
+        sizer = None
+        if self.adaptive_step:
+            sizer = AdaptiveStep(step, self.max_query, self.step_latency_budget, self.step_size_budget)
+        batches = self._batches(query_li, sizer or step, verbose=verbose)
+        if unordered:
+            results = self._concurrent_batches(query_fn, batches, fn_kwargs, sizer)
+        else:
+            results = self._sequential_batches(query_fn, batches, fn_kwargs, sizer)
+        for start, batch, query_result in results:
+            yield (start, batch, query_result) if with_batches else query_result
+
+    @staticmethod
+    def _deduped(query_fn: Callable[..., Tuple[bool, Any]]) -> Callable[..., Tuple[bool, Any]]:
+        """
+        Wrap query_fn to send the distinct inputs of a batch once, the hits being
+        fanned back out to the input positions of the batch
+        """
+
+        def query_distinct(batch: Tuple[Any, ...], **fn_kwargs: Any) -> Tuple[bool, Any]:
+            from_cache, query_result = query_fn(distinct_terms(batch), **fn_kwargs)
+            return from_cache, fan_out(batch, query_result)
+
+        return query_distinct
+
+    @staticmethod
+    def _batches(
+        query_li: Iterable[Any], step: Union[int, AdaptiveStep], verbose: bool = True
+    ) -> Generator[Tuple[int, Tuple[Any, ...]], None, None]:
+        """
+        Split query_li in batches of step inputs, the size of an adaptive step
+        being read as every batch is taken
+        """
         i = 0
-        for batch, cnt in iter_n(query_li, step, with_cnt=True):
+        query_li = iter(query_li)
+        while True:
+            batch = tuple(itertools.islice(query_li, step if isinstance(step, int) else step.size))
+            if not batch:
+                return
+            cnt = i + len(batch)
             if verbose:
                 logger.info("querying %s-%s ...", i + 1, cnt)
+            yield i, batch
             i = cnt
-            from_cache, query_result = query_fn(batch, **fn_kwargs)
-            yield query_result
+
+    def _sequential_batches(
+        self,
+        query_fn: Callable[..., Tuple[bool, Any]],
+        batches: Iterable[Tuple[int, Tuple[Any, ...]]],
+        fn_kwargs: JsonDict,
+        sizer: Optional[AdaptiveStep] = None,
+    ) -> Generator[Tuple[int, Tuple[Any, ...], Any], None, None]:
+        for start, batch in batches:
+            meter = BatchMeter()
+            from_cache, query_result = meter.run(query_fn, batch, **fn_kwargs)
+            if sizer is not None and not from_cache:
+                sizer.observe(len(batch), meter)
+            yield start, batch, query_result
 
             if not from_cache and self.delay:
                 # no need to delay if requests are from cache.
                 time.sleep(self.delay)
 
+    def _concurrent_batches(
+        self,
+        query_fn: Callable[..., Tuple[bool, Any]],
+        batches: Iterable[Tuple[int, Tuple[Any, ...]]],
+        fn_kwargs: JsonDict,
+        sizer: Optional[AdaptiveStep] = None,
+    ) -> Generator[Tuple[int, Tuple[Any, ...], Any], None, None]:
+        # the HTTP client is shared by the threads, built once beforehand
+        self._set_http_client()
+        batches = iter(batches)
+        pending: Dict["concurrent.futures.Future[Tuple[bool, Any]]", Tuple[int, Tuple[Any, ...], BatchMeter]] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrent_batches) as executor:
+            try:
+                while True:
+                    for start, batch in itertools.islice(batches, self.max_concurrent_batches - len(pending)):
+                        meter = BatchMeter()
+                        pending[executor.submit(meter.run, query_fn, batch, **fn_kwargs)] = (start, batch, meter)
+                    if not pending:
+                        return
+                    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        start, batch, meter = pending.pop(future)
+                        from_cache, query_result = future.result()
+                        if sizer is not None and not from_cache:
+                            sizer.observe(len(batch), meter)
+                        yield start, batch, query_result
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _export(
+        self,
+        sink: BiothingsClientSink,
+        query_fn: Callable[..., Tuple[bool, Any]],
+        query_li: Iterable[Any],
+        verbose: bool = True,
+    ) -> List[Path]:
+        """
+        Write the hits of every batch of query_li to an export sink, saving the
+        number of inputs exported after every batch so an interrupted export can
+        be resumed. Returns the files written
+        """
+        position = sink.resume_position
+        if position and verbose:
+            logger.info("Resuming the export after %s inputs ...", position)
+
+        def export_fn(batch: Tuple[Any, ...]) -> Tuple[bool, Any]:
+            nonlocal position
+            position += len(batch)
+            return query_fn(batch)
+
+        with sink:
+            for hits in self._repeated_query(export_fn, itertools.islice(query_li, position, None), verbose=verbose):
+                sink.write(hits)
+                sink.checkpoint(position)
+        return sink.paths
+
     def _metadata(self, verbose: bool = True, **kwargs: Any) -> JsonDict:
         """
         Return a dictionary of Biothing metadata.
@@ -416,7 +733,9 @@ class BiothingClient:
         _, ret = self._get(_url, params=kwargs, verbose=verbose)
         return ret
 
-    def _set_caching(self, cache_db: Optional[Union[str, Path]] = None, **kwargs: Any) -> None:
+    def _set_caching(
+        self, cache_db: Optional[Union[str, Path]] = None, storage: Optional[Any] = None, **kwargs: Any
+    ) -> None:
         """
         Enable the client caching and creates a local cache database
         for all future requests
@@ -425,6 +744,10 @@ class BiothingClient:
 
         Inputs:
         :param cache_db: pathlike object to the local sqlite3 cache database file
+        :param storage: cache storage instance to use instead of the default sqlite3 database.
+                        Must be a hishel.SyncBaseStorage that also implements the
+                        biothings_client.cache.storage.base.BiothingsClientSyncStorage protocol,
+                        e.g. BiothingsClientSyncFileSystemStorage or BiothingsClientSyncLMDBStorage
 
         Outputs:
         :return: None
@@ -433,11 +756,21 @@ class BiothingClient:
             raise CachingNotSupportedError("Caching is only supported for Python 3.8+")
 
         if _CACHING:
+            if storage is not None and not (
+                isinstance(storage, hishel.SyncBaseStorage) and isinstance(storage, BiothingsClientSyncStorage)
+            ):
+                raise TypeError(
+                    "Cache storage must be a hishel.SyncBaseStorage implementing the BiothingsClientSyncStorage protocol"
+                )
             if not self.caching_enabled:
                 try:
+                    if storage is not None and storage is not self.cache_storage:
+                        if self.cache_storage is not None:
+                            self.cache_storage.close()
+                        self.cache_storage = storage
                     self.caching_enabled = True
                     self.http_client_setup = False
-                    self._build_cache_http_client()
+                    self._build_cache_http_client(cache_db)
                     logger.debug("Reset the HTTP client to leverage caching %s", self.http_client)
                     logger.info(
                         (
@@ -546,9 +879,8 @@ class BiothingClient:
                 cache_db = self.cache_storage.database_path
                 if self.caching_enabled:
                     self._stop_caching()
-                self.cache_storage.close()
+                self.cache_storage.delete_database()
                 self.cache_storage = None
-                cache_db.unlink(missing_ok=True)
                 logger.info("Deleted cache file: %s", cache_db)
             else:
                 logger.warning("No cache storage found. Skipping delete ...")
@@ -560,6 +892,52 @@ class BiothingClient:
             )
             raise caching_library_error
 
+    def _cache_stats(self, top: int = 10) -> CacheStats:
+        """
+        Summarize the local cache along with the hit / miss counters
+        recorded by this client instance
+
+        Inputs:
+        :param top: number of endpoints to report, ranked by cached bytes
+
+        Outputs:
+        :return: dictionary with the entries, deleted_entries, bytes_on_disk,
+                 top_endpoints, hits, misses, stale and average_lookup_latency
+                 (seconds) of the cache
+        """
+        if _CACHING_NOT_SUPPORTED:
+            raise CachingNotSupportedError("Caching is only supported for Python 3.8+")
+
+        if _CACHING:
+            if self.cache_storage is None:
+                raise RuntimeError("No cache storage found. Enable caching with set_caching() first")
+            if not isinstance(self.cache_storage, BiothingsClientInspectableStorage):
+                raise TypeError(f"Cache storage {type(self.cache_storage).__name__} does not support inspection")
+            summary = summarize(self.cache_storage, top=top, endpoints=self._cache_endpoints())
+            return {
+                **summary,
+                "hits": self.cache_statistics.hits,
+                "misses": self.cache_statistics.misses,
+                "stale": self.cache_statistics.stale,
+                "average_lookup_latency": self.cache_statistics.average_lookup_latency,
+            }
+        else:
+            caching_library_error = OptionalDependencyImportError(
+                optional_function_access="inspect biothings-client cache",
+                optional_group="caching",
+                libraries=["anysqlite", "hishel"],
+            )
+            raise caching_library_error
+
+    def _cache_endpoints(self) -> List[str]:
+        """
+        Endpoints used to group cached urls in the cache statistics
+        """
+        endpoints = [self._metadata_fields_endpoint, self._metadata_endpoint, self._query_endpoint]
+        if self._annotation_endpoint:
+            endpoints.append(self._annotation_endpoint)
+        return endpoints
+
     def _get_fields(self, search_term: Optional[str] = None, verbose: bool = True) -> JsonDict:
         """
         Wrapper for /metadata/fields
@@ -583,6 +961,71 @@ class BiothingClient:
                 del v["notes"]
         return ret
 
+    def _record_decoder(self, as_records: Any, kwargs: JsonDict) -> RecordDecoder:
+        """
+        Resolve the as_records parameter into a record decoder and restrict
+        the fields returned by the server to the fields of the records
+
+        :param as_records: a record type generated by biothings_client.utils.records.record_type,
+                           a list or a comma-separated string of dotted fields, or True to
+                           use the **fields** parameter (all the leaf fields from get_fields()
+                           if it is not provided)
+        """
+        if kwargs.get("return_raw", False):
+            raise ValueError("as_records can't be combined with return_raw")
+        if isinstance(as_records, type) and hasattr(as_records, "_paths"):
+            record_class = as_records
+        elif as_records is True:
+            fields = kwargs.get("fields", None)
+            if not fields or fields == "all":
+                fields = [
+                    field
+                    for field, description in self._get_fields(verbose=False).items()
+                    if description.get("type") != "object"
+                ]
+            record_class = record_type(fields)
+        else:
+            record_class = record_type(as_records)
+        record_decoder = RecordDecoder(record_class)
+        kwargs["fields"] = concatenate_list(record_decoder.fields, quoted=False)
+        return record_decoder
+
+    def _projection(self, columns: Any, kwargs: JsonDict) -> FieldExtractor:
+        """
+        Resolve the columns parameter into the field extractor projecting the hits
+        and, unless **fields** is given, restrict the fields returned by the server
+        to the minimal set covering the columns
+
+        :param columns: a list or a comma-separated string of dotted fields, or a
+                        biothings_client.utils.fields.FieldExtractor
+        """
+        projection = columns if isinstance(columns, FieldExtractor) else FieldExtractor(columns)
+        fields = kwargs.get("fields", None)
+        if not fields or fields == "all":
+            kwargs["fields"] = concatenate_list(projection_fields(projection.fields), quoted=False)
+        self._verify_fields(projection.fields)
+        return projection
+
+    def _verify_fields(self, fields: Iterable[str]) -> None:
+        """
+        Warn about the fields which aren't in the get_fields() metadata, their
+        columns would be empty. The metadata is fetched once per client
+        """
+        if self._field_names is None:
+            try:
+                metadata_fields = self._get_fields(verbose=False)
+            except httpx.HTTPError as http_error:
+                logger.debug("Unable to verify the fields against the metadata: %s", http_error)
+                return
+            field_names = set(HIT_METADATA_FIELDS)
+            for field in metadata_fields:
+                parts = field.split(".")
+                field_names.update(".".join(parts[:depth]) for depth in range(1, len(parts) + 1))
+            self._field_names = field_names
+        unknown = [field for field in fields if field not in self._field_names]
+        if unknown:
+            logger.warning("Fields not found in the get_fields() metadata, their columns will be empty: %s", unknown)
+
     def _getannotation(
         self,
         _id: Any,
@@ -611,7 +1054,7 @@ class BiothingClient:
     def _getannotations_inner(
         self, ids: Iterable[Any], verbose: bool = True, **kwargs: Any
     ) -> Tuple[bool, ResponsePayload]:
-        id_collection = concatenate_list(ids)
+        id_collection = [safe_str(_id) for _id in ids] if self.request_body_format == "json" else concatenate_list(ids)
         _kwargs = {"ids": id_collection}
         _kwargs.update(kwargs)
         _url = self.url + self._annotation_endpoint
@@ -622,13 +1065,28 @@ class BiothingClient:
         query_fn: Callable[..., Tuple[bool, Iterable[JsonDict]]],
         ids: Iterable[Any],
         verbose: bool = True,
+        dedupe: bool = False,
+        unordered: bool = False,
+        with_positions: bool = False,
+        on_batch: Optional[Callable[[Tuple[Any, ...]], None]] = None,
         **kwargs: Any,
-    ) -> Generator[JsonDict, None, None]:
+    ) -> Generator[Any, None, None]:
         """
-        Function to yield a batch of hits one at a time
+        Function to yield a batch of hits one at a time, or (input position, hit)
+        with with_positions. on_batch is called with the inputs of every batch
+        before its hits are yielded
         """
-        for hits in self._repeated_query(query_fn, ids, verbose=verbose):
-            yield from hits
+        for start, batch, hits in self._repeated_query(
+            query_fn, ids, verbose=verbose, dedupe=dedupe, unordered=unordered, with_batches=True
+        ):
+            if on_batch is not None:
+                on_batch(batch)
+            if with_positions:
+                positions = BatchPositions(batch, start)
+                for hit in hits:
+                    yield positions.position(hit), hit
+            else:
+                yield from hits
 
     def _getannotations(
         self,
@@ -644,15 +1102,52 @@ class BiothingClient:
         :param fields: fields to return, a list or a comma-separated string.
                        If not provided or **fields="all"**, all available fields
                        are returned.
-        :param as_generator: if True, will yield the results in a generator.
+        :param dedupe: if True, send every distinct id of a batch once. The hits are fanned back out
+                       so the output still holds the hits of every input position, in input order.
+                       An id repeated in a later batch is sent again. Can't be combined with **return_raw**,
+                       **to_parquet** or **to_ndjson**.
+        :param unordered: if True, send up to **max_concurrent_batches** (a client attribute) batches at once
+                          and return the hits in the order they are received, fastest batch first. Can't be
+                          combined with **dedupe**, **to_parquet** or **to_ndjson**.
+        :param with_positions: if True, also return the input position of every hit, as an array aligned with
+                               the hits (or the rows of the DataFrame or Arrow table): ``(out, positions)``.
+                               With **as_generator**, (position, hit) pairs are yielded instead. See
+                               biothings_client.utils.positions.input_order to restore the input order of the
+                               hits of **unordered**.
+        :param as_generator: if True, will yield the results in a generator. When the client
+                             **stream_responses** attribute is True, the hits of every batch
+                             are yielded while the response is being received.
         :param as_dataframe: if True or 1 or 2, return object as DataFrame (requires Pandas).
                                   True or 1: using json_normalize
                                   2        : using DataFrame.from_dict
+                                  "polars" : as a polars DataFrame (requires polars), every batch of
+                                             hits is converted as soon as it is received, nested
+                                             objects flattened into dotted columns
                                   otherwise: return original json
         :param df_index: if True (default), index returned DataFrame by 'query',
                          otherwise, index by number. Only applicable if as_dataframe=True.
-
-        :return: a list of objects or a pandas DataFrame object (when **as_dataframe** is True)
+        :param as_dataframe_chunks: return a generator of pandas DataFrames of this many rows (requires Pandas),
+                                    converted as the batches of hits are received. All the chunks have the
+                                    columns of the first chunk and of the requested **fields**, a column
+                                    first found in a later chunk is added to it and to the following chunks.
+        :param as_records: decode the hits into compact NamedTuple records instead of dicts.
+                           Either a record type from biothings_client.utils.records.record_type,
+                           a list of dotted fields, or True to use **fields**. Only the record
+                           fields are requested from the server.
+        :param as_arrow: if True, return a pyarrow.Table (requires pyarrow), or a pyarrow.RecordBatchReader
+                         when **as_generator** is True. Every batch of hits is converted as soon as it is
+                         received, using a schema inferred from the first batch or the pyarrow.Schema
+                         passed as **as_arrow**.
+        :param to_parquet: export the hits to a Parquet file (requires pyarrow) instead of returning them,
+                           writing every batch as soon as it is received. Either the path of the file or a
+                           biothings_client.utils.sinks.ParquetSink, to roll the output over several files
+                           or resume an interrupted export.
+        :param to_ndjson: export the hits to a newline delimited JSON file, gzip or zstd compressed when its
+                          name ends with .gz or .zst. Either the path of the file or a
+                          biothings_client.utils.sinks.NDJSONSink, see **to_parquet**.
+
+        :return: a list of objects or a pandas DataFrame object (when **as_dataframe** is True),
+                 or the list of files written (when **to_parquet** or **to_ndjson** is given)
 
         .. Hint:: A large list of more than 1000 input ids will be sent to the backend
                   web service in batches (1000 at a time), and then the results will be
@@ -676,27 +1171,96 @@ class BiothingClient:
         generator = kwargs.pop("as_generator", False)
         if dataframe in [True, 1]:
             dataframe = 1
-        elif dataframe != 2:
+        elif dataframe not in [2, "polars"]:
             dataframe = None
         return_raw = kwargs.get("return_raw", False)
         if return_raw:
             dataframe = None
+        as_records = kwargs.pop("as_records", None)
+        as_arrow = kwargs.pop("as_arrow", None)
+        to_parquet, to_ndjson = kwargs.pop("to_parquet", None), kwargs.pop("to_ndjson", None)
+        chunk_size = kwargs.pop("as_dataframe_chunks", None)
+        check_output_options(
+            as_dataframe=bool(dataframe),
+            as_records=bool(as_records),
+            as_arrow=bool(as_arrow),
+            return_raw=bool(return_raw),
+            to_parquet=to_parquet is not None,
+            to_ndjson=to_ndjson is not None,
+            as_dataframe_chunks=bool(chunk_size),
+            as_generator=bool(generator),
+        )
+        record_decoder = self._record_decoder(as_records, kwargs) if as_records else None
+        arrow_builder = self._arrow_builder(as_arrow) if as_arrow else None
+        sink = export_sink(to_parquet, to_ndjson)
+        columns = kwargs.pop("columns", None)
+        projection = self._projection(columns, kwargs) if columns else None
+        chunker = (
+            self._dataframe_chunker(chunk_size, kwargs.get("fields"), df_index, projection=projection)
+            if chunk_size
+            else None
+        )
+        if projection is not None and not (dataframe or chunker is not None):
+            raise ValueError("columns requires as_dataframe or as_dataframe_chunks")
+        batching, with_positions = self._batching(
+            kwargs, return_raw=return_raw, export=sink is not None, chunks=chunker is not None
+        )
+        if with_positions and generator and arrow_builder is not None:
+            raise ValueError("with_positions can't be combined with as_arrow and as_generator")
+        # the hits of a batch are buffered anyway to be fanned out
+        stream = (
+            (generator or chunker is not None) and self.stream_responses and not return_raw and not batching["dedupe"]
+        )
 
         def query_fn(ids: Iterable[Any]) -> Tuple[bool, ResponsePayload]:
+            if stream:
+                from_cache, hits = self._getannotations_inner(ids, verbose=verbose, stream=True, **kwargs)
+                if record_decoder is not None and isinstance(hits, JsonStream):
+                    hits.convert = record_decoder.from_hit
+                return from_cache, hits
+            if record_decoder is not None:
+                from_cache, response = self._getannotations_inner(ids, verbose=verbose, return_raw=True, **kwargs)
+                return from_cache, record_decoder.decode_hits(response.content)
             return self._getannotations_inner(ids, verbose=verbose, **kwargs)
 
+        if sink is not None:
+            return self._export(sink, query_fn, ids, verbose=verbose)
+        if chunker is not None:
+            return chunker.chunks(self._annotations_generator(query_fn, ids, verbose=verbose, **batching))
         if generator:
-            return self._annotations_generator(query_fn, ids, verbose=verbose, **kwargs)
+            if arrow_builder is not None:
+                return arrow_builder.reader(
+                    list(hits) for hits in self._repeated_query(query_fn, ids, verbose=verbose, **batching)
+                )
+            return self._annotations_generator(
+                query_fn, ids, verbose=verbose, with_positions=with_positions, **batching
+            )
         out = []
-        for hits in self._repeated_query(query_fn, ids, verbose=verbose):
+        arrow_batches = []
+        positions = array("q") if with_positions else None
+        for start, batch, hits in self._repeated_query(query_fn, ids, verbose=verbose, with_batches=True, **batching):
+            if positions is not None:
+                positions.extend(batch_positions(batch, hits, start))
             if return_raw:
                 out.append(hits)  # hits is the raw response text
+            elif arrow_builder is not None:
+                if hits:
+                    arrow_batches.append(arrow_builder.record_batch(hits))
             else:
-                out.extend(hits)
+                if projection is not None:
+                    hits = projection.project(hits)
+                if dataframe == "polars":
+                    out.append(polars_frame(hits))
+                else:
+                    out.extend(hits)
         if return_raw and len(out) == 1:
             out = out[0]
-        if dataframe:
+        if arrow_builder is not None:
+            out = arrow_builder.table(arrow_batches)
+        elif dataframe:
             out = self._dataframe(out, dataframe, df_index=df_index)
+        if positions is not None:
+            return out, positions
         return out
 
     def _query(self, q: str, **kwargs: Any) -> Any:
@@ -704,7 +1268,10 @@ class BiothingClient:
         Return the query result.
         This is a wrapper for GET query of biothings query service.
 
-        :param q: a query string.
+        :param q: a query string. A query string longer than the client **max_query_length** attribute
+                  once URL-encoded is split into sub-queries run at once when it is an OR-disjunction,
+                  alone or within an AND-conjunction, the hits being deduplicated by _id in the
+                  order of the sub-queries, each one sorted on its own. The total is then an upper bound.
         :param fields: fields to return, a list or a comma-separated string.
                        If not provided or **fields="all"**, all available fields
                        are returned.
@@ -713,17 +1280,38 @@ class BiothingClient:
         :param skip:   the number of results to skip. Default: 0.
         :param sort:   Prefix with "-" for descending order, otherwise in ascending order.
                        Default: sort by matching scores in decending order.
+        :param parallel_pages: with a **size** larger than one page (**max_query** hits), request up to this
+                               many pages at once, the hits being returned in the order of the query like
+                               the hits of a single page. The pages past the **total** number of hits of the
+                               query aren't requested.
         :param as_dataframe: if True or 1 or 2, return object as DataFrame (requires Pandas).
                                   True or 1: using json_normalize
                                   2        : using DataFrame.from_dict
+                                  "polars" : as a polars DataFrame (requires polars)
                                   otherwise: return original json
         :param fetch_all: if True, return a generator to all query results (unsorted).  This can provide a very fast
-                          return of all hits from a large query.
+                          return of all hits from a large query. With **as_dataframe="polars"**, return one polars
+                          DataFrame of all the hits instead, built batch by batch. The other **as_dataframe** values
+                          are ignored.
                           Server requests are done in blocks of 1000 and yielded individually.  Each 1000 block of
                           results must be yielded within 1 minute, otherwise the request will expire at server side.
+                          When the client **stream_responses** attribute is True, the hits of every block are
+                          yielded while the block is being received.
+        :param as_dataframe_chunks: with **fetch_all**, return a generator of pandas DataFrames of this many
+                                    rows, see :py:meth:`getannotations`.
+        :param as_records: return the hits as compact NamedTuple records instead of dicts, see
+                           :py:meth:`getannotations`.
+        :param as_arrow: if True, return the hits as a pyarrow.Table (requires pyarrow), or a
+                         pyarrow.RecordBatchReader when **fetch_all** is True, see :py:meth:`getannotations`.
+        :param to_parquet: with **fetch_all**, export all the hits to a Parquet file, see
+                           :py:meth:`getannotations`. A scroll can't be resumed, an interrupted export
+                           starts over.
+        :param to_ndjson: with **fetch_all**, export all the hits to a newline delimited JSON file, see
+                          :py:meth:`getannotations`.
 
         :return: a dictionary with returned variant hits or a pandas DataFrame object (when **as_dataframe** is True)
                  or a generator of all hits (when **fetch_all** is True)
+                 or the list of files written (when **to_parquet** or **to_ndjson** is given)
 
         .. Hint:: By default, **query** method returns the first 10 hits if the matched hits are >10.
                   If the total number of hits are less than 1000, you can increase the value for
@@ -736,28 +1324,157 @@ class BiothingClient:
         kwargs = self._handle_common_kwargs(kwargs)
         kwargs.update({"q": q})
         fetch_all = kwargs.get("fetch_all")
+        return_raw = kwargs.get("return_raw", False)
+        as_records = kwargs.pop("as_records", None)
+        as_arrow = kwargs.pop("as_arrow", None)
+        to_parquet, to_ndjson = kwargs.pop("to_parquet", None), kwargs.pop("to_ndjson", None)
+        chunk_size = kwargs.pop("as_dataframe_chunks", None)
+        check_output_options(
+            # as_dataframe is ignored with return_raw, and by the fetch_all queries but for polars
+            as_dataframe=kwargs.get("as_dataframe", None) in [True, 1, 2, "polars"]
+            and (fetch_all not in [True, 1] or kwargs.get("as_dataframe") == "polars")
+            and not return_raw,
+            as_records=bool(as_records),
+            as_arrow=bool(as_arrow),
+            return_raw=bool(return_raw),
+            to_parquet=to_parquet is not None,
+            to_ndjson=to_ndjson is not None,
+            as_dataframe_chunks=bool(chunk_size),
+        )
+        record_decoder = self._record_decoder(as_records, kwargs) if as_records else None
+        arrow_builder = self._arrow_builder(as_arrow) if as_arrow else None
+        parallel_pages = kwargs.pop("parallel_pages", None)
+        if parallel_pages and (fetch_all in [True, 1] or kwargs.get("return_raw") or kwargs.get("debug")):
+            raise ValueError("parallel_pages can't be combined with fetch_all, return_raw or debug")
+        columns = kwargs.pop("columns", None)
+        projection = self._projection(columns, kwargs) if columns else None
+        if chunk_size:
+            if fetch_all not in [True, 1]:
+                raise ValueError("as_dataframe_chunks requires fetch_all")
+            chunker = self._dataframe_chunker(chunk_size, kwargs.get("fields"), df_index=False, projection=projection)
+            kwargs.pop("as_dataframe", None)
+            return chunker.chunks(self._fetch_all(url=_url, verbose=verbose, **kwargs))
+        sink = export_sink(to_parquet, to_ndjson)
+        if sink is not None:
+            if fetch_all not in [True, 1]:
+                raise ValueError("to_parquet and to_ndjson require fetch_all")
+            if sink.resume_position:
+                warnings.warn("A fetch_all export can't be resumed, starting over.")
+                sink.restart()
+            with sink:
+                for hits in iter_n(self._fetch_all(url=_url, verbose=verbose, **kwargs), self.step):
+                    sink.write(hits)
+                    sink.checkpoint()
+            return sink.paths
+        if projection is not None and (
+            (fetch_all in [True, 1] and kwargs.get("as_dataframe") != "polars") or not kwargs.get("as_dataframe", None)
+        ):
+            raise ValueError("columns requires as_dataframe, or as_dataframe_chunks or polars with fetch_all")
         if fetch_all in [True, 1]:
-            if kwargs.get("as_dataframe", None) in [True, 1]:
+            dataframe = kwargs.pop("as_dataframe", None)
+            if dataframe in [True, 1, 2]:
                 warnings.warn(
                     "Ignored 'as_dataframe' because 'fetch_all' is specified. "
-                    "Too many documents to return as a Dataframe."
+                    "Too many documents to return as a Dataframe, pass as_dataframe_chunks=N "
+                    "to get DataFrames of N rows instead."
                 )
-            return self._fetch_all(url=_url, verbose=verbose, **kwargs)
+            hits = self._fetch_all(url=_url, verbose=verbose, record_decoder=record_decoder, **kwargs)
+            if arrow_builder is not None:
+                return arrow_builder.reader(iter_n(hits, self.step))
+            if dataframe == "polars":
+                # only the frames of the batches of hits are held, not the hits
+                frames = (
+                    polars_frame(batch if projection is None else projection.project(batch))
+                    for batch in iter_n(hits, self.step)
+                )
+                return self._dataframe(frames, dataframe)
+            return hits
         dataframe = kwargs.pop("as_dataframe", None)
         if dataframe in [True, 1]:
             dataframe = 1
-        elif dataframe != 2:
+        elif dataframe not in [2, "polars"]:
             dataframe = None
-        _, out = self._get(_url, kwargs, verbose=verbose)
+        queries = split_query(q, self.max_query_length)
+        if len(queries) > 1:
+            out = self._query_split(_url, kwargs, queries, parallel_pages, verbose=verbose)
+        elif parallel_pages:
+            out = self._query_pages(_url, kwargs, parallel_pages, verbose=verbose)
+        else:
+            _, out = self._get(_url, kwargs, verbose=verbose)
+        if record_decoder is not None and isinstance(out, dict) and "hits" in out:
+            out["hits"] = [record_decoder.from_hit(hit) for hit in out["hits"]]
+        if arrow_builder is not None and isinstance(out, dict) and "hits" in out:
+            return arrow_builder.table([arrow_builder.record_batch(out["hits"])] if out["hits"] else [])
+        if projection is not None and isinstance(out, dict) and "hits" in out:
+            out["hits"] = projection.project(out["hits"])
         if dataframe:
             out = self._dataframe(out, dataframe, df_index=False)
         return out
 
-    def _fetch_all(self, url: str, verbose: bool = True, **kwargs: Any) -> Generator[JsonDict, None, None]:
+    def _query_split(
+        self, url: str, params: JsonDict, queries: List[str], parallel_pages: Optional[int] = None, verbose: bool = True
+    ) -> Any:
+        """
+        Run the sub-queries of a query string too long for a URL at once from a thread
+        pool, returns the union of their hits deduplicated by _id, in the order of the
+        sub-queries. A sub-query needing more hits than one request returns is read page
+        by page
+        """
+        size = int(params.pop("size", 10))
+        skip = int(params.pop("skip", 0))
+        if verbose:
+            logger.info("splitting the query in %s sub-queries ...", len(queries))
+
+        def run_query(query: str) -> Any:
+            query_params = {**params, "q": query, "skip": 0, "size": skip + size}
+            if parallel_pages or skip + size > self.max_query:
+                return self._query_pages(url, query_params, parallel_pages or 1, verbose=verbose)
+            return self._get(url, query_params, verbose=verbose)[1]
+
+        # the HTTP client is shared by the threads, built once beforehand
+        self._set_http_client()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrent_batches) as executor:
+            responses = list(executor.map(run_query, queries))
+        return union_responses(responses, size, skip)
+
+    def _query_pages(self, url: str, params: JsonDict, parallel_pages: int, verbose: bool = True) -> Any:
+        """
+        Get the hits of a query larger than one page, requesting up to parallel_pages
+        pages at once from a thread pool. The first page is requested alone to read
+        the total number of hits, so that no page past the last hit is requested, and
+        the hits of the pages are stitched together in page order, the order of the query
+        """
+        size = int(params.pop("size", 10))
+        skip = int(params.pop("skip", 0))
+        page_size = min(size, self.max_query)
+        _, out = self._get(url, {**params, "skip": skip, "size": page_size}, verbose=verbose)
+        if not isinstance(out, dict) or "hits" not in out:
+            return out
+        end = skip + max(min(size, out.get("total", 0) - skip), 0)
+        pages = [
+            {**params, "skip": start, "size": min(page_size, end - start)}
+            for start in range(skip + page_size, end, page_size)
+        ]
+        if not pages:
+            return out
+        if verbose:
+            logger.info("querying %s more pages of up to %s hits ...", len(pages), page_size)
+        # the HTTP client is shared by the threads, built once beforehand
+        self._set_http_client()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_pages) as executor:
+            for _, page in executor.map(lambda page_params: self._get(url, page_params, verbose=verbose), pages):
+                out["hits"].extend(page["hits"])
+        return out
+
+    def _fetch_all(
+        self, url: str, verbose: bool = True, record_decoder: Optional[RecordDecoder] = None, **kwargs: Any
+    ) -> Generator[Any, None, None]:
         """
         Function that returns a generator to results. Assumes that 'q' is in kwargs.
         Implicitly disables caching to ensure we actually hit the endpoint rather than
         pulling from local cache
+
+        The hits are converted into records when a record_decoder is given
         """
         logger.warning("fetch_all implicitly disables HTTP request caching")
         restore_caching = False
@@ -774,26 +1491,14 @@ class BiothingClient:
                 raise gen_exc
 
         try:
-            _, response = self._get(url, params=kwargs, verbose=verbose)
-
-            if verbose:
-                logger.info("Fetching {0} {1} . . .".format(response["total"], self._optionally_plural_object_type))
-
-            for key in ["q", "fetch_all"]:
-                kwargs.pop(key)
-
-            while not response.get("error", "").startswith("No results to return"):
-                if "error" in response:
-                    logger.error(response["error"])
-                    break
-
-                if "_warning" in response and verbose:
-                    logger.warning(response["_warning"])
-
-                yield from response["hits"]
-
-                kwargs.update({"scroll_id": response["_scroll_id"]})
-                _, response = self._get(url, params=kwargs, verbose=verbose)
+            queries = split_query(kwargs["q"], self.max_query_length)
+            if len(queries) > 1:
+                if verbose:
+                    logger.info("splitting the query in %s sub-queries ...", len(queries))
+                hits = unique_hits(self._scroll(url, verbose=verbose, **{**kwargs, "q": query}) for query in queries)
+                yield from hits if record_decoder is None else map(record_decoder.from_hit, hits)
+            else:
+                yield from self._scroll(url, verbose=verbose, record_decoder=record_decoder, **kwargs)
 
         except Exception as gen_exc:
             logger.exception(gen_exc)
@@ -812,15 +1517,115 @@ class BiothingClient:
                     logger.error("Unknown error occured while attempting to disable caching")
                     raise gen_exc
 
+    def _scroll(
+        self, url: str, verbose: bool = True, record_decoder: Optional[RecordDecoder] = None, **kwargs: Any
+    ) -> Generator[Any, None, None]:
+        """
+        Scroll through the results of the query of kwargs, see _fetch_all
+        """
+        if self.stream_responses:
+            yield from self._fetch_all_streamed(url, verbose=verbose, record_decoder=record_decoder, **kwargs)
+            return
+
+        _, response = self._get(url, params=kwargs, verbose=verbose)
+
+        if verbose:
+            logger.info("Fetching {0} {1} . . .".format(response["total"], self._optionally_plural_object_type))
+
+        for key in ["q", "fetch_all"]:
+            kwargs.pop(key)
+
+        while not response.get("error", "").startswith("No results to return"):
+            if "error" in response:
+                logger.error(response["error"])
+                break
+
+            if "_warning" in response and verbose:
+                logger.warning(response["_warning"])
+
+            if record_decoder is None:
+                yield from response["hits"]
+            else:
+                for hit in response["hits"]:
+                    yield record_decoder.from_hit(hit)
+
+            kwargs.update({"scroll_id": response["_scroll_id"]})
+            _, response = self._get(url, params=kwargs, verbose=verbose)
+
+    def _fetch_all_streamed(
+        self, url: str, verbose: bool = True, record_decoder: Optional[RecordDecoder] = None, **kwargs: Any
+    ) -> Generator[Any, None, None]:
+        """
+        Scroll through the query results like _fetch_all, parsing the hits of
+        every block incrementally
+        """
+        first_block = True
+        while True:
+            _, hits = self._stream("GET", url, kwargs, key="hits", verbose=verbose)
+            if not isinstance(hits, JsonStream):
+                logger.error(hits.text)
+                break
+            if record_decoder is not None:
+                hits.convert = record_decoder.from_hit
+            yield from hits
+            response = hits.envelope
+
+            if first_block:
+                if verbose and "total" in response:
+                    logger.info("Fetching {0} {1} . . .".format(response["total"], self._optionally_plural_object_type))
+                for key in ["q", "fetch_all"]:
+                    kwargs.pop(key)
+                first_block = False
+
+            if "error" in response:
+                if not response["error"].startswith("No results to return"):
+                    logger.error(response["error"])
+                break
+
+            if "_warning" in response and verbose:
+                logger.warning(response["_warning"])
+
+            kwargs.update({"scroll_id": response["_scroll_id"]})
+
     def _querymany_inner(
         self, qterms: Iterable[Any], verbose: bool = True, **kwargs: Any
     ) -> Tuple[bool, ResponsePayload]:
-        query_term_collection = concatenate_list(qterms)
+        query_term_collection = (
+            [safe_str(qterm) for qterm in qterms] if self.request_body_format == "json" else concatenate_list(qterms)
+        )
         _kwargs = {"q": query_term_collection}
         _kwargs.update(kwargs)
         _url = self.url + self._query_endpoint
         return self._post(_url, params=_kwargs, verbose=verbose)
 
+    def _querymany_generator(
+        self,
+        query_fn: Callable[..., Tuple[bool, Iterable[Any]]],
+        qterms: Iterable[Any],
+        accounting: QueryAccounting,
+        records: bool = False,
+        verbose: bool = True,
+        with_positions: bool = False,
+        **batching: Any,
+    ) -> Generator[Any, None, None]:
+        """
+        Function to yield the hits of querymany one at a time, counting the
+        hits of every query term into accounting
+        """
+        for item in self._annotations_generator(
+            query_fn, qterms, verbose=verbose, with_positions=with_positions, on_batch=accounting.add_inputs, **batching
+        ):
+            hit = item[1] if with_positions else item
+            if records:
+                accounting.add_hit(hit.query, found=hit.id is not None)
+            else:
+                accounting.add_hit(hit["query"], found=not hit.get("notfound", False))
+            yield item
+
+        if verbose:
+            logger.info("Finished.")
+            accounting.log_summary(logger)
+
     def _querymany(  # noqa: MC0001
         self,
         qterms: Union[str, Iterable[Any]],
@@ -837,15 +1642,43 @@ class BiothingClient:
         :param fields: fields to return, a list or a comma-separated string.
                        If not provided or **fields="all"**, all available fields
                        are returned.
+        :param dedupe: if True, send every distinct query term of a batch once, a term repeated in a
+                       later batch being sent again. The hits are fanned back out so the output still
+                       holds the hits of every input position, in input order, and a repeated term is
+                       still reported as a duplicate. Can't be combined with **return_raw**,
+                       **to_parquet** or **to_ndjson**.
+        :param unordered: if True, send several batches at once and return the hits in the order they are
+                          received, see :py:meth:`getannotations`.
+        :param with_positions: if True, also return the input position of every hit, see
+                               :py:meth:`getannotations`. The positions are added to the **returnall** dict.
         :param returnall:   if True, return a dict of all related data, including dup. and missing qterms
         :param verbose:     if True (default), print out information about dup and missing qterms
+        :param as_generator: if True, return an iterator yielding the hits as they are received instead of a
+                             list, streamed when the client **stream_responses** attribute is True. The hits
+                             aren't kept: the duplicate and missing query terms are counted over the input
+                             positions and can be read from its **dup** and **missing** attributes once it
+                             is exhausted. Can't be combined with **returnall**.
         :param as_dataframe: if True or 1 or 2, return object as DataFrame (requires Pandas).
                                   True or 1: using json_normalize
                                   2        : using DataFrame.from_dict
+                                  "polars" : as a polars DataFrame (requires polars), every batch of
+                                             hits is converted as soon as it is received, nested
+                                             objects flattened into dotted columns
                                   otherwise: return original json
         :param df_index: if True (default), index returned DataFrame by 'query',
                          otherwise, index by number. Only applicable if as_dataframe=True.
-        :return: a list of matching objects or a pandas DataFrame object.
+        :param as_dataframe_chunks: return a generator of pandas DataFrames of this many rows, see
+                                    :py:meth:`getannotations`. Can't be combined with **returnall**.
+        :param as_records: return the hits as compact NamedTuple records instead of dicts, see
+                           :py:meth:`getannotations`. Query terms without a match get a record
+                           whose id is None.
+        :param as_arrow: if True, return the hits as a pyarrow.Table (requires pyarrow), see
+                         :py:meth:`getannotations`.
+        :param to_parquet: export the hits to a Parquet file (requires pyarrow), see :py:meth:`getannotations`.
+                           The hits of the query terms without a match are written with notfound=True.
+        :param to_ndjson: export the hits to a newline delimited JSON file, see :py:meth:`getannotations`.
+        :return: a list of matching objects or a pandas DataFrame object,
+                 or the list of files written (when **to_parquet** or **to_ndjson** is given).
 
         .. Hint:: Passing a large list of ids (>1000) to :py:meth:`querymany` is perfectly fine.
 
@@ -866,31 +1699,104 @@ class BiothingClient:
         dataframe = kwargs.pop("as_dataframe", None)
         if dataframe in [True, 1]:
             dataframe = 1
-        elif dataframe != 2:
+        elif dataframe not in [2, "polars"]:
             dataframe = None
         df_index = kwargs.pop("df_index", True)
         return_raw = kwargs.get("return_raw", False)
         if return_raw:
             dataframe = None
+        as_records = kwargs.pop("as_records", None)
+        as_arrow = kwargs.pop("as_arrow", None)
+        to_parquet, to_ndjson = kwargs.pop("to_parquet", None), kwargs.pop("to_ndjson", None)
+        chunk_size = kwargs.pop("as_dataframe_chunks", None)
+        generator = kwargs.pop("as_generator", False)
+        check_output_options(
+            # the generator of querymany yields hits, not the record batches of as_arrow
+            COMPATIBLE_OUTPUTS - {frozenset(["as_generator", "as_arrow"])},
+            as_dataframe=bool(dataframe),
+            as_records=bool(as_records),
+            as_arrow=bool(as_arrow),
+            return_raw=bool(return_raw),
+            to_parquet=to_parquet is not None,
+            to_ndjson=to_ndjson is not None,
+            as_dataframe_chunks=bool(chunk_size),
+            as_generator=bool(generator),
+            returnall=bool(returnall),
+        )
+        record_decoder = self._record_decoder(as_records, kwargs) if as_records else None
+        arrow_builder = self._arrow_builder(as_arrow) if as_arrow else None
+        sink = export_sink(to_parquet, to_ndjson)
+        columns = kwargs.pop("columns", None)
+        projection = self._projection(columns, kwargs) if columns else None
+        chunker = (
+            self._dataframe_chunker(chunk_size, kwargs.get("fields"), df_index, projection=projection)
+            if chunk_size
+            else None
+        )
+        if projection is not None and not (dataframe or chunker is not None):
+            raise ValueError("columns requires as_dataframe or as_dataframe_chunks")
+        batching, with_positions = self._batching(
+            kwargs, return_raw=return_raw, export=sink is not None, chunks=chunker is not None
+        )
+        # the hits of a batch are buffered anyway to be fanned out
+        stream = generator and self.stream_responses and not batching["dedupe"]
 
         out = []
-        li_missing = []
-        li_dup = []
-        li_query = []
+        arrow_batches = []
+        accounting = QueryAccounting()
 
         def query_fn(qterms: Iterable[Any]) -> Tuple[bool, ResponsePayload]:
+            if stream:
+                from_cache, hits = self._querymany_inner(qterms, verbose=verbose, stream=True, **kwargs)
+                if record_decoder is not None and isinstance(hits, JsonStream):
+                    hits.convert = record_decoder.from_hit
+                return from_cache, hits
+            if record_decoder is not None:
+                from_cache, response = self._querymany_inner(qterms, verbose=verbose, return_raw=True, **kwargs)
+                return from_cache, record_decoder.decode_hits(response.content)
             return self._querymany_inner(qterms, verbose=verbose, **kwargs)
 
-        for hits in self._repeated_query(query_fn, qterms, verbose=verbose):
+        if sink is not None:
+            return self._export(sink, query_fn, qterms, verbose=verbose)
+        if chunker is not None:
+            return chunker.chunks(self._annotations_generator(query_fn, qterms, verbose=verbose, **batching))
+        if generator:
+            return AccountedHits(
+                self._querymany_generator(
+                    query_fn,
+                    qterms,
+                    accounting,
+                    records=record_decoder is not None,
+                    verbose=verbose,
+                    with_positions=with_positions,
+                    **batching,
+                ),
+                accounting,
+            )
+
+        positions = array("q") if with_positions else None
+        for start, batch, hits in self._repeated_query(
+            query_fn, qterms, verbose=verbose, with_batches=True, **batching
+        ):
+            accounting.add_inputs(batch)
+            if positions is not None:
+                positions.extend(batch_positions(batch, hits, start))
             if return_raw:
                 out.append(hits)  # hits is the raw response text
-            else:
+            elif record_decoder is not None:
                 out.extend(hits)
+                for record in hits:
+                    accounting.add_hit(record.query, found=record.id is not None)
+            else:
+                if arrow_builder is not None:
+                    if hits:
+                        arrow_batches.append(arrow_builder.record_batch(hits))
+                elif dataframe == "polars":
+                    out.append(polars_frame(hits if projection is None else projection.project(hits)))
+                else:
+                    out.extend(hits if projection is None else projection.project(hits))
                 for hit in hits:
-                    if hit.get("notfound", False):
-                        li_missing.append(hit["query"])
-                    else:
-                        li_query.append(hit["query"])
+                    accounting.add_hit(hit["query"], found=not hit.get("notfound", False))
 
         if verbose:
             logger.info("Finished.")
@@ -898,38 +1804,40 @@ class BiothingClient:
             if len(out) == 1:
                 out = out[0]
             return out
-
-        # check dup hits
-        if li_query:
-            li_dup = [(query, cnt) for query, cnt in list_itemcnt(li_query) if cnt > 1]
-            del li_query
-
-        li_dup_df = None
-        li_missing_df = None
-        if dataframe:
-            assert pandas is not None  # noqa: S101
-            out = self._dataframe(out, dataframe, df_index=df_index)
-            li_dup_df = pandas.DataFrame.from_records(li_dup, columns=["query", "duplicate hits"])
-            li_missing_df = pandas.DataFrame(li_missing, columns=["query"])
+        if arrow_builder is not None:
+            out = arrow_builder.table(arrow_batches)
 
         if verbose:
-            if li_dup:
-                logger.warning("{0} input query terms found dup hits:".format(len(li_dup)) + "\t" + str(li_dup)[:100])
-            if li_missing:
-                logger.warning(
-                    "{0} input query terms found no hit:".format(len(li_missing)) + "\t" + str(li_missing)[:100]
-                )
-
-        if returnall:
-            if dataframe:
-                return {"out": out, "dup": li_dup_df, "missing": li_missing_df}
-            else:
-                return {"out": out, "dup": li_dup, "missing": li_missing}
-        else:
-            if verbose and (li_dup or li_missing):
+            accounting.log_summary(logger)
+        if not returnall:
+            if verbose and (accounting.duplicate_count or accounting.missing_count):
                 logger.info('Pass "returnall=True" to return complete lists of duplicate or missing query terms.')
+            if dataframe:
+                out = self._dataframe(out, dataframe, df_index=df_index)
+            if positions is not None:
+                return out, positions
             return out
 
+        li_dup = accounting.duplicates
+        li_missing = accounting.missing
+        extra = {} if positions is None else {"positions": positions}
+        if dataframe == "polars":
+            return {
+                "out": self._dataframe(out, dataframe),
+                "dup": polars.DataFrame(li_dup, schema=["query", "duplicate hits"], orient="row"),
+                "missing": polars.DataFrame({"query": li_missing}, schema={"query": polars.String}),
+                **extra,
+            }
+        if dataframe:
+            assert pandas is not None  # noqa: S101
+            return {
+                "out": self._dataframe(out, dataframe, df_index=df_index),
+                "dup": pandas.DataFrame.from_records(li_dup, columns=["query", "duplicate hits"]),
+                "missing": pandas.DataFrame(li_missing, columns=["query"]),
+                **extra,
+            }
+        return {"out": out, "dup": li_dup, "missing": li_missing, **extra}
+
 
 def get_client(
     biothing_type: Optional[str] = None,
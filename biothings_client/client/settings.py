@@ -54,6 +54,7 @@ class ClientSettings(TypedDict):
 # ***********************************************
 # Function aliases common to all clients
 COMMON_ALIASES: FunctionAliases = {
+    "_cache_stats": "cache_stats",
     "_clear_cache": "clear_cache",
     "_delete_cache": "delete_cache",
     "_get_fields": "get_fields",
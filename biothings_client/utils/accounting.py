@@ -0,0 +1,186 @@
+"""
+Accounting of the duplicate and missing query terms of querymany
+
+With as_generator=True the hits of querymany are streamed out without being
+kept, so the query terms with several hits (duplicates) or without any
+(missing) are tracked in a compact side structure instead: every distinct
+input term is mapped to the position of its first occurrence in the input
+by a dict, the hits are counted in an array over the input positions and the notfound hits are recorded as the positions of their
+terms. The lists of terms are only built when the duplicates or the missing
+terms are read, once the generator is exhausted:
+
+    hits = client.querymany(terms, scopes="symbol", as_generator=True)
+    for hit in hits:
+        ...
+    hits.dup, hits.missing
+
+The other querymany modes use the same accounting for their returnall lists
+and their log lines, which only render the first terms
+"""
+
+import logging
+from array import array
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Generic, Iterable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def truncated_repr(items: Iterable[Any], width: int = 100) -> str:
+    """
+    str(list(items))[:width], rendering only the items needed to fill width
+    """
+    text = "["
+    for position, item in enumerate(items):
+        text += (", " if position else "") + repr(item)
+        if len(text) >= width:
+            return text[:width]
+    return (text + "]")[:width]
+
+
+class QueryAccounting:
+    """
+    Counts the hits of every input query term of a querymany call.
+
+    The terms are registered batch by batch with add_inputs before their hits
+    are counted with add_hit, a term is identified by its string value, like
+    the "query" key of the hits. The distinct terms are mapped to the position
+    of their first occurrence by a dict, the hits are counted in an array over
+    the positions. Like the returnall lists of querymany, a missing term is
+    listed once per notfound hit
+    """
+
+    def __init__(self) -> None:
+        self.inputs = 0
+        self.hits = 0
+        self.duplicate_count = 0
+        self.missing_count = 0
+        # term -> position of its first occurrence in the input
+        self._positions: Dict[str, int] = {}
+        self._counts = array("I")
+        self._missing = bytearray()
+        # the position of the term of every notfound hit, in hit order
+        self._missing_positions = array("I")
+        self._terms: Dict[int, str] = {}
+
+    def add_inputs(self, terms: Iterable[object]) -> None:
+        """Register a batch of input terms, in input order."""
+        positions = self._positions
+        start = position = self.inputs
+        for term in terms:
+            positions.setdefault(term if type(term) is str else str(term), position)
+            position += 1
+        self.inputs = position
+        self._grow(position - start)
+
+    def _grow(self, count: int) -> None:
+        self._counts.frombytes(bytes(count * self._counts.itemsize))
+        self._missing.extend(bytes((self.inputs + 7) // 8 - len(self._missing)))
+
+    def add_hit(self, query: str, found: bool = True) -> None:
+        """Count a hit of a query term, or the notfound hit of a missing term."""
+        position = self._positions.get(query)
+        if position is None:
+            # a hit for a term which wasn't registered, counted as an input of its own
+            position = self._positions[query] = self.inputs
+            self.inputs += 1
+            self._grow(1)
+        if found:
+            self.hits += 1
+            count = self._counts[position] = self._counts[position] + 1
+            if count == 2:
+                self.duplicate_count += 1
+                self._terms[position] = query
+        else:
+            self._missing[position >> 3] |= 1 << (position & 7)
+            self._missing_positions.append(position)
+            self.missing_count += 1
+            self._terms[position] = query
+
+    def is_missing(self, position: int) -> bool:
+        """Whether the term first found at this input position had no hit."""
+        return bool(self._missing[position >> 3] & (1 << (position & 7)))
+
+    def iter_duplicates(self) -> Iterator[Tuple[str, int]]:
+        """Lazily yield the (term, number of hits) of the terms with several hits, in input order."""
+        counts = self._counts
+        for position in sorted(self._terms):
+            if counts[position] > 1:
+                yield self._terms[position], counts[position]
+
+    def iter_missing(self) -> Iterator[str]:
+        """Lazily yield the terms without any hit, once per notfound hit, in hit order."""
+        for position in self._missing_positions:
+            yield self._terms[position]
+
+    @property
+    def duplicates(self) -> List[Tuple[str, int]]:
+        """The (term, number of hits) of the terms with several hits, in input order."""
+        return list(self.iter_duplicates())
+
+    @property
+    def missing(self) -> List[str]:
+        """The terms without any hit, once per notfound hit, in hit order."""
+        return list(self.iter_missing())
+
+    def log_summary(self, logger: logging.Logger, width: int = 100) -> None:
+        """Log the number of duplicate and missing terms, with the first of them."""
+        if self.duplicate_count:
+            logger.warning(
+                "%s input query terms found dup hits:\t%s",
+                self.duplicate_count,
+                truncated_repr(self.iter_duplicates(), width),
+            )
+        if self.missing_count:
+            logger.warning(
+                "%s input query terms found no hit:\t%s", self.missing_count, truncated_repr(self.iter_missing(), width)
+            )
+
+
+class AccountedHits(Generic[T]):
+    """
+    Iterator over the hits of querymany(as_generator=True), the duplicate and
+    missing query terms can be read once it is exhausted.
+
+    :param hits: the hits, counted by the producer into accounting
+    :param accounting: the accounting of the query terms
+    """
+
+    def __init__(self, hits: Iterable[T], accounting: QueryAccounting) -> None:
+        self._hits = iter(hits)
+        self.accounting = accounting
+
+    def __iter__(self) -> Iterator[T]:
+        return self
+
+    def __next__(self) -> T:
+        return next(self._hits)
+
+    @property
+    def dup(self) -> List[Tuple[str, int]]:
+        return self.accounting.duplicates
+
+    @property
+    def missing(self) -> List[str]:
+        return self.accounting.missing
+
+
+class AsyncAccountedHits(Generic[T]):
+    """Async counterpart of AccountedHits."""
+
+    def __init__(self, hits: AsyncIterable[T], accounting: QueryAccounting) -> None:
+        self._hits = hits.__aiter__()
+        self.accounting = accounting
+
+    def __aiter__(self) -> AsyncIterator[T]:
+        return self
+
+    async def __anext__(self) -> T:
+        return await self._hits.__anext__()
+
+    @property
+    def dup(self) -> List[Tuple[str, int]]:
+        return self.accounting.duplicates
+
+    @property
+    def missing(self) -> List[str]:
+        return self.accounting.missing
@@ -0,0 +1,139 @@
+"""
+Conversion of hits into Apache Arrow record batches
+
+Every batch of hits (one POST response, or one block of a fetch_all scroll) is
+converted into a pyarrow.RecordBatch as soon as it is received, so the hits
+never accumulate as python dicts. All the batches share one schema, either
+given by the caller or inferred from the first batch: one column per top-level
+field of the hits, nested objects becoming struct columns. Single values of
+list fields are wrapped into lists. A field whose values can't be typed in the
+first batch (only nulls, or mixed objects and lists) is stored as JSON text
+"""
+
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from biothings_client._dependencies import _PYARROW
+
+if _PYARROW:
+    import pyarrow
+
+JsonDict = Dict[str, Any]
+
+# metadata of the fields stored as JSON text
+JSON_FIELD_METADATA = {b"encoding": b"json"}
+
+
+def _has_list(data_type: "pyarrow.DataType") -> bool:
+    if pyarrow.types.is_list(data_type) or pyarrow.types.is_large_list(data_type):
+        return True
+    return pyarrow.types.is_struct(data_type) and any(_has_list(field.type) for field in data_type)
+
+
+def _conform(value: Any, data_type: "pyarrow.DataType") -> Any:
+    """
+    Wrap the single values of list fields into lists, the APIs return a single
+    value instead of a list of one (pyarrow would split a string into characters)
+    """
+    if value is None:
+        return None
+    if pyarrow.types.is_list(data_type) or pyarrow.types.is_large_list(data_type):
+        if not isinstance(value, list):
+            value = [value]
+        if _has_list(data_type.value_type):
+            return [_conform(item, data_type.value_type) for item in value]
+        return value
+    if isinstance(value, dict) and pyarrow.types.is_struct(data_type):
+        return {
+            field.name: _conform(value.get(field.name), field.type) if _has_list(field.type) else value.get(field.name)
+            for field in data_type
+        }
+    return value
+
+
+class ArrowBatchBuilder:
+    """
+    Converts batches of hits into Arrow record batches sharing one schema.
+
+    :param schema: a pyarrow.Schema for the hits, inferred from the first batch if None.
+                   Fields of the hits missing from the schema are dropped
+    """
+
+    def __init__(self, schema: Optional["pyarrow.Schema"] = None) -> None:
+        self.schema = schema
+
+    def infer_schema(self, hits: Sequence[JsonDict]) -> "pyarrow.Schema":
+        """Schema of a batch of hits, fields ordered by first appearance."""
+        names: Dict[str, None] = {}
+        for hit in hits:
+            names.update(dict.fromkeys(hit))
+        fields = []
+        for name in names:
+            try:
+                field_type = pyarrow.array([hit.get(name) for hit in hits]).type
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                field_type = pyarrow.null()
+            if pyarrow.types.is_null(field_type):
+                fields.append(pyarrow.field(name, pyarrow.string(), metadata=JSON_FIELD_METADATA))
+            else:
+                fields.append(pyarrow.field(name, field_type))
+        return pyarrow.schema(fields)
+
+    def record_batch(self, hits: Sequence[JsonDict]) -> "pyarrow.RecordBatch":
+        """Convert a batch of hits."""
+        if self.schema is None:
+            self.schema = self.infer_schema(hits)
+        columns = []
+        for field in self.schema:
+            values = [hit.get(field.name) for hit in hits]
+            if _has_list(field.type):
+                values = [_conform(value, field.type) for value in values]
+            if field.metadata == JSON_FIELD_METADATA:
+                columns.append(pyarrow.array([None if value is None else json.dumps(value) for value in values]))
+                continue
+            try:
+                columns.append(pyarrow.array(values, type=field.type))
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError) as conversion_error:
+                raise ValueError(
+                    f"The values of the {field.name} field don't match its {field.type} type, inferred from "
+                    "the first batch of hits. Pass always_list=[...] for the fields holding either a value "
+                    "or a list of values, or an explicit pyarrow.Schema with as_arrow=schema"
+                ) from conversion_error
+        return pyarrow.RecordBatch.from_arrays(columns, schema=self.schema)
+
+    def table(self, batches: List["pyarrow.RecordBatch"]) -> "pyarrow.Table":
+        """Concatenate the converted batches into a table."""
+        return pyarrow.Table.from_batches(
+            batches, schema=self.schema if self.schema is not None else pyarrow.schema([])
+        )
+
+    def reader(self, hit_batches: Iterable[Sequence[JsonDict]]) -> "pyarrow.RecordBatchReader":
+        """
+        Lazily convert batches of hits into a RecordBatchReader. The first batch
+        is fetched right away when the schema has to be inferred
+        """
+        hit_batches = iter(hit_batches)
+        first_batch = None
+        if self.schema is None:
+            for hits in hit_batches:
+                if hits:
+                    first_batch = self.record_batch(hits)
+                    break
+            else:
+                self.schema = pyarrow.schema([])
+
+        def record_batches() -> Iterator["pyarrow.RecordBatch"]:
+            if first_batch is not None:
+                yield first_batch
+            for hits in hit_batches:
+                yield self.record_batch(hits)
+
+        return pyarrow.RecordBatchReader.from_batches(self.schema, record_batches())
+
+    async def record_batches(
+        self, hit_batches: AsyncIterable[Sequence[JsonDict]]
+    ) -> AsyncIterator["pyarrow.RecordBatch"]:
+        """Async counterpart of reader, yielding the record batches as they are converted."""
+        async for hits in hit_batches:
+            if hits:
+                yield self.record_batch(hits)
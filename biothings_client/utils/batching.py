@@ -0,0 +1,98 @@
+"""
+DataLoader-style micro-batching for the async client
+
+Individual loads issued by many coroutines within a short window are collected
+and resolved with a single batched call. A batch is dispatched once the window
+elapses or as soon as it holds `max_batch_size` distinct keys, whichever comes
+first
+"""
+
+import asyncio
+import copy
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, Mapping, Optional, Set, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class AsyncBatchLoader(Generic[K, V]):
+    """Collects single key loads and resolves them with one call to `load_fn`.
+
+    :param load_fn: coroutine function taking the list of distinct keys of a batch
+                    and returning a mapping of key -> value. Keys missing from the
+                    mapping resolve to None
+    :param max_batch_size: maximum number of distinct keys in a batch
+    :param window: seconds to wait for more keys before dispatching a batch
+
+    max_batch_size and window are read on every load, they can be changed on a
+    loader in use
+    """
+
+    def __init__(
+        self,
+        load_fn: Callable[[List[K]], Awaitable[Mapping[K, Optional[V]]]],
+        max_batch_size: int,
+        window: float,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.load_fn = load_fn
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[K, List["asyncio.Future[Optional[V]]"]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: Set["asyncio.Task[None]"] = set()
+
+    async def load(self, key: K) -> Optional[V]:
+        """Queue a key in the current batch and wait for its value."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # futures and timers are bound to a loop, start over on a new one
+            if self._timer is not None:
+                self._timer.cancel()
+            self._loop = loop
+            self._pending = {}
+            self._timer = None
+
+        future: "asyncio.Future[Optional[V]]" = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            # keep a reference to the batch task so it isn't garbage collected while running
+            batch = asyncio.ensure_future(self._resolve(pending))
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+
+    async def _resolve(self, pending: Dict[K, List["asyncio.Future[Optional[V]]"]]) -> None:
+        try:
+            values = await self.load_fn(list(pending))
+        except Exception as batch_error:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(batch_error)
+            return
+        except BaseException:
+            # the batch was cancelled, and the loads waiting for it with it
+            for futures in pending.values():
+                for future in futures:
+                    future.cancel()
+            raise
+
+        for key, futures in pending.items():
+            value = values.get(key)
+            for position, future in enumerate(futures):
+                if not future.done():
+                    # callers asking for the same key each get their own object
+                    future.set_result(value if position == 0 else copy.deepcopy(value))
@@ -0,0 +1,43 @@
+"""
+JSON decoding of the biothings API responses
+
+The decoder is picked once at import time from the installed libraries, the
+fastest first: orjson, msgspec and finally the standard library json module.
+The fast decoders are stricter than the standard library (no NaN / Infinity
+literals), so a payload they reject is decoded again with the standard library
+before giving up
+"""
+
+import json
+from typing import Any, Callable, Tuple, Type, Union
+
+from biothings_client._dependencies import _MSGSPEC, _ORJSON
+
+JSON_DECODER: str
+_fast_loads: Callable[[Union[bytes, str]], Any]
+_decode_errors: Tuple[Type[Exception], ...]
+
+if _ORJSON:
+    import orjson
+
+    JSON_DECODER = "orjson"
+    _fast_loads = orjson.loads
+    _decode_errors = (orjson.JSONDecodeError,)
+elif _MSGSPEC:
+    import msgspec
+
+    JSON_DECODER = "msgspec"
+    _fast_loads = msgspec.json.Decoder().decode
+    _decode_errors = (msgspec.DecodeError,)
+else:
+    JSON_DECODER = "json"
+    _fast_loads = json.loads
+    _decode_errors = ()
+
+
+def decode_json(content: Union[bytes, str]) -> Any:
+    """Decode a JSON document with the fastest available decoder."""
+    try:
+        return _fast_loads(content)
+    except _decode_errors:
+        return json.loads(content)
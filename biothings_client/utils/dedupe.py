@@ -0,0 +1,57 @@
+"""
+Client-side deduplication of the input terms of querymany and getannotations
+
+With dedupe=True every distinct input term of a batch is sent once, and the
+hits of a term are fanned back out to all the positions of the term in the
+batch, in input order. The batches are deduplicated one at a time so the
+input is still read as it is sent: a term repeated in a later batch is sent
+again. The positions after the first one get copies of the hits
+"""
+
+import copy
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple
+
+
+def hit_query(hit: Any) -> str:
+    """The query term of a hit, or of a record decoded with as_records."""
+    return hit["query"] if isinstance(hit, dict) else hit.query
+
+
+def distinct_terms(batch: Iterable[Any]) -> Tuple[Any, ...]:
+    """
+    The distinct terms of a batch in the order of their first occurrence. Terms
+    are compared by their string value, like the "query" key of the hits
+    """
+    seen: Set[str] = set()
+    distinct = []
+    for term in batch:
+        key = str(term)
+        if key not in seen:
+            seen.add(key)
+            distinct.append(term)
+    return tuple(distinct)
+
+
+def fan_out(batch: Sequence[Any], hits: Iterable[Any]) -> List[Any]:
+    """
+    Receive the hits of the distinct terms of a batch, and return the hits of
+    every position of the batch, in input order
+    """
+    keys = [str(term) for term in batch]
+    fetched: Dict[str, List[Any]] = {key: [] for key in keys}
+    out = []
+    for hit in hits:
+        term_hits = fetched.get(hit_query(hit))
+        if term_hits is None:
+            # a hit for a term which wasn't sent, passed through
+            out.append(hit)
+        else:
+            term_hits.append(hit)
+    emitted: Set[str] = set()
+    for key in keys:
+        if key in emitted:
+            out.extend(copy.deepcopy(fetched[key]))
+        else:
+            out.extend(fetched[key])
+            emitted.add(key)
+    return out
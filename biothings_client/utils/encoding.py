@@ -0,0 +1,100 @@
+"""
+Encoding of the bodies of the POST batch queries
+
+The ids or query terms of a batch are sent form-encoded by default, quoted and
+joined with commas, which takes hundreds of kilobytes for a batch of long HGVS
+ids once percent-encoded. The body can instead be a JSON object, the ids or
+query terms being sent as an array, and be gzip compressed when it is larger
+than a threshold:
+
+    client.request_body_format = "json"
+    client.request_compression = "gzip"
+
+The compression of the responses is negotiated with the Accept-Encoding header
+of every request, ACCEPT_ENCODING: the gzip and deflate encodings, and br or
+zstd when brotli or zstandard is installed (the compression extra) for httpx
+to decode them. The header is set by the client rather than left to httpx, so
+the http clients given to it (a caching client, a mock) ask for the same
+encodings
+"""
+
+import json
+import re
+import zlib
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import httpx
+
+from biothings_client._dependencies import _BROTLI, _ZSTANDARD
+
+REQUEST_BODY_FORMATS = ("form", "json")
+REQUEST_COMPRESSIONS = (None, "gzip")
+
+# httpx decodes the zstd responses from 0.27.1 on
+_HTTPX_ZSTD = tuple(int(part) for part in re.findall(r"\d+", httpx.__version__)[:3]) >= (0, 27, 1)
+
+
+def accept_encoding(brotli: bool = _BROTLI, zstandard: bool = _ZSTANDARD) -> str:
+    """The Accept-Encoding header of the requests, with the encodings httpx can decode."""
+    encodings = ["gzip", "deflate"]
+    if brotli:
+        encodings.append("br")
+    if zstandard and _HTTPX_ZSTD:
+        encodings.append("zstd")
+    return ", ".join(encodings)
+
+
+ACCEPT_ENCODING = accept_encoding()
+
+
+def _form_value(value: Any) -> str:
+    # the form encoding of httpx
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value is None:
+        return ""
+    return str(value)
+
+
+def gzip_compress(data: bytes) -> bytes:
+    """A gzip member without timestamp, the same data always giving the same body."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def encode_request_body(
+    params: Dict[str, Any],
+    body_format: str = "form",
+    compression: Optional[str] = None,
+    threshold: int = 1024,
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Encode the parameters of a POST request, returns the body and its headers.
+
+    :param params: the parameters of the request, the lists being sent as JSON arrays
+                   with the "json" format, and as repeated fields with the "form" one
+    :param body_format: "form" or "json"
+    :param compression: None or "gzip"
+    :param threshold: the smallest body compressed, in bytes
+    """
+    if body_format not in REQUEST_BODY_FORMATS:
+        raise ValueError(f"request body format must be one of {REQUEST_BODY_FORMATS}, got {body_format!r}")
+    if compression not in REQUEST_COMPRESSIONS:
+        raise ValueError(f"request compression must be one of {REQUEST_COMPRESSIONS}, got {compression!r}")
+    if body_format == "json":
+        body = json.dumps(params, separators=(",", ":"), default=str).encode("utf-8")
+        headers = {"content-type": "application/json"}
+    else:
+        fields = [
+            (key, [_form_value(item) for item in value] if isinstance(value, (list, tuple)) else _form_value(value))
+            for key, value in params.items()
+        ]
+        body = urlencode(fields, doseq=True).encode("ascii")
+        headers = {"content-type": "application/x-www-form-urlencoded"}
+    if compression == "gzip" and len(body) >= threshold:
+        body = gzip_compress(body)
+        headers["content-encoding"] = "gzip"
+    return body, headers
@@ -0,0 +1,118 @@
+"""
+Extraction of dotted fields from hits
+
+A FieldExtractor splits a set of dotted field paths (`entrezgene`,
+`ensembl.gene`, `dbsnp.rsid`, ...) once and walks the hits iteratively: the
+objects along a path are looked up in a plain loop, the walk only switches to
+collecting values once the path crosses a list. The value of a field is the
+value at its path, or the list of the values found under every element when
+the path crosses a list (None if there are none):
+
+    {"ensembl": {"gene": "ENSG1"}}                      ensembl.gene -> "ENSG1"
+    {"ensembl": [{"gene": "ENSG1"}, {"gene": "ENSG2"}]} ensembl.gene -> ["ENSG1", "ENSG2"]
+
+The extractor is also the projection of the columns= option: the hits are
+reduced to flat objects keyed by the dotted paths before being converted into
+DataFrames, and only the minimal set of fields covering the paths is requested
+from the server
+"""
+
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union
+
+JsonDict = Dict[str, Any]
+
+# the keys the API adds to the hits, which aren't in the get_fields() metadata
+HIT_METADATA_FIELDS = ("query", "_id", "_score", "_version", "notfound")
+
+
+def _objects(values: List[Any]) -> List[JsonDict]:
+    """The objects among values, nested lists flattened."""
+    objects = []
+    stack = values[::-1]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            objects.append(value)
+        elif isinstance(value, list):
+            stack.extend(value[::-1])
+    return objects
+
+
+def _collect(values: List[Any], keys: Sequence[str]) -> Any:
+    """The values at the rest of a path starting with a list."""
+    found = [values]
+    for key in keys:
+        found = [item for item in (value.get(key) for value in _objects(found)) if item is not None]
+        if not found:
+            return None
+    flattened: List[Any] = []
+    for item in found:
+        if isinstance(item, list):
+            flattened.extend(item)
+        else:
+            flattened.append(item)
+    return flattened or None
+
+
+def projection_fields(fields: Iterable[str]) -> List[str]:
+    """
+    The minimal set of fields to request for the given dotted paths, dropping
+    the duplicates and the paths below another one: ensembl, ensembl.gene -> ensembl
+    """
+    fields = list(dict.fromkeys(fields))
+    return [field for field in fields if not any(field.startswith(other + ".") for other in fields if other != field)]
+
+
+class FieldExtractor:
+    """
+    Extracts the values of a set of dotted fields from hits.
+
+    :param fields: dotted field paths, as a list or a comma-separated string
+    """
+
+    def __init__(self, fields: Union[str, Iterable[str]]) -> None:
+        if isinstance(fields, str):
+            fields = [field.strip() for field in fields.split(",") if field.strip()]
+        self.fields: List[str] = list(fields)
+        self._paths: List[Tuple[str, ...]] = [tuple(field.split(".")) for field in self.fields]
+
+    def extract(self, hit: Any) -> List[Any]:
+        """The values of the fields in a hit, in the order of the fields."""
+        out = []
+        for path in self._paths:
+            value = hit
+            for position, key in enumerate(path):
+                if isinstance(value, dict):
+                    value = value.get(key)
+                elif isinstance(value, list):
+                    value = _collect(value, path[position:])
+                    break
+                else:
+                    value = None
+                    break
+            out.append(value)
+        return out
+
+    def rows(self, hits: Iterable[Any]) -> List[List[Any]]:
+        """The values of the fields in every hit of a batch."""
+        extract = self.extract
+        return [extract(hit) for hit in hits]
+
+    def columns(self, hits: Iterable[Any]) -> Dict[str, List[Any]]:
+        """The values of the fields in a batch of hits, as one list per field."""
+        rows = self.rows(hits)
+        if not rows:
+            return {field: [] for field in self.fields}
+        return {field: list(column) for field, column in zip(self.fields, zip(*rows))}
+
+    def project(self, hits: Iterable[Any], keep: Sequence[str] = ("query",)) -> List[JsonDict]:
+        """
+        The hits reduced to the fields, as flat objects keyed by the field paths,
+        with the top-level keys of keep (the query term of the batch queries) first
+        """
+        projected = []
+        for hit in hits:
+            row = {key: hit[key] for key in keep if key in hit}
+            row.update(zip(self.fields, self.extract(hit)))
+            projected.append(row)
+        return projected
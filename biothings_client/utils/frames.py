@@ -0,0 +1,138 @@
+"""
+Conversion of hits into DataFrames
+
+polars: every batch of hits is converted into a polars.DataFrame as soon as it
+is received, nested objects being flattened into dotted columns (ensembl.gene),
+and the frames of all the batches are concatenated once at the end. The
+columns missing from a batch are filled with nulls, single values of a column
+holding lists in another batch are wrapped into lists
+
+pandas: DataFrameChunker splits the hits into DataFrames of a fixed number of
+rows as they are received, so a large result is never held as a whole. All
+the chunks share the columns of the first chunk and of the requested fields,
+a column first appearing in a later chunk is added to that chunk and to all
+the following ones. json_normalize doesn't flatten lists of objects, the
+requested fields below them (go.BP.id) are filled by a FieldExtractor
+"""
+
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from biothings_client._dependencies import _PANDAS, _POLARS
+from biothings_client.utils.fields import FieldExtractor
+from biothings_client.utils.iteration import aiter_n, iter_n
+
+if _PANDAS:
+    import pandas
+
+if _POLARS:
+    import polars
+
+JsonDict = Dict[str, Any]
+
+
+def _require_polars() -> None:
+    if not _POLARS:
+        from biothings_client.client.exceptions import OptionalDependencyImportError
+
+        raise OptionalDependencyImportError(
+            optional_function_access="enable polars dataframe conversion", optional_group="polars", libraries=["polars"]
+        )
+
+
+def polars_frame(hits: Sequence[JsonDict]) -> "polars.DataFrame":
+    """Convert a batch of hits, nested objects flattened into dotted columns."""
+    _require_polars()
+    try:
+        return polars.json_normalize(list(hits), separator=".", infer_schema_length=None)
+    except polars.exceptions.ComputeError as conversion_error:
+        raise ValueError(
+            "The values of a field of the hits don't share a type. Pass always_list=[...] for the fields "
+            "holding either a value or a list of values"
+        ) from conversion_error
+
+
+def concat_polars_frames(frames: Iterable["polars.DataFrame"]) -> "polars.DataFrame":
+    """Concatenate the frames of the batches of hits into one frame."""
+    _require_polars()
+    frames = [frame for frame in frames if frame.width]
+    if not frames:
+        return polars.DataFrame()
+    list_columns: List[str] = []
+    for frame in frames:
+        for name, data_type in frame.schema.items():
+            if isinstance(data_type, polars.List) and name not in list_columns:
+                list_columns.append(name)
+    if list_columns:
+        frames = [
+            frame.with_columns(
+                polars.when(polars.col(name).is_null()).then(None).otherwise(polars.concat_list(name)).alias(name)
+                for name in list_columns
+                if name in frame.schema and not isinstance(frame.schema[name], polars.List)
+            )
+            for frame in frames
+        ]
+    return polars.concat(frames, how="diagonal_relaxed", rechunk=True)
+
+
+class DataFrameChunker:
+    """
+    Splits hits into pandas DataFrames of **size** rows with a column set which
+    only grows.
+
+    :param size: number of rows of the chunks, the last chunk may be shorter
+    :param columns: columns of every chunk, typically the requested fields, in
+                    addition to the columns of the first chunk
+    :param index: column to index the chunks by, e.g. "query"
+    :param projection: reduce the hits to the fields of this extractor, the chunks then
+                       have exactly one column per field (and the index)
+    """
+
+    def __init__(
+        self,
+        size: int,
+        columns: Optional[Sequence[str]] = None,
+        index: Optional[str] = None,
+        projection: Optional[FieldExtractor] = None,
+    ) -> None:
+        if not _PANDAS:
+            from biothings_client.client.exceptions import OptionalDependencyImportError
+
+            raise OptionalDependencyImportError(
+                optional_function_access="enable dataframe conversion", optional_group="dataframe", libraries=["pandas"]
+            )
+        if size < 1:
+            raise ValueError("as_dataframe_chunks must be a positive number of rows")
+        self.size = size
+        self.index = index
+        self.projection = projection
+        self._requested = list(columns or [])
+        self._extractor = FieldExtractor(self._requested)
+        self.columns: Optional[List[str]] = None
+
+    def frame(self, hits: Sequence[JsonDict]) -> "pandas.DataFrame":
+        """Convert a chunk of hits, with the columns of the previous chunks."""
+        hits = list(hits) if self.projection is None else self.projection.project(hits)
+        frame = pandas.json_normalize(hits)
+        for column, values in self._extractor.columns(hits).items():
+            # the fields below lists of objects, objects are already flattened by json_normalize
+            if any(value is not None and not isinstance(value, dict) for value in values):
+                frame[column] = [None if isinstance(value, dict) else value for value in values]
+        if self.columns is None:
+            self.columns = list(frame.columns)
+            self.columns.extend(column for column in self._requested if column not in frame.columns)
+        else:
+            self.columns.extend(column for column in frame.columns if column not in self.columns)
+        frame = frame.reindex(columns=self.columns)
+        if self.index is not None and self.index in frame.columns:
+            frame = frame.set_index(self.index)
+        return frame
+
+    def chunks(self, hits: Iterable[JsonDict]) -> Iterator["pandas.DataFrame"]:
+        """Lazily convert hits into DataFrames of size rows."""
+        for chunk in iter_n(hits, self.size):
+            yield self.frame(chunk)
+
+    async def achunks(self, hits: AsyncIterable[JsonDict]) -> AsyncIterator["pandas.DataFrame"]:
+        """Async counterpart of chunks."""
+        async for chunk in aiter_n(hits, self.size):
+            yield self.frame(chunk)
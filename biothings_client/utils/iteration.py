@@ -2,6 +2,8 @@ from collections import Counter
 from itertools import islice
 from typing import (
     Any,
+    AsyncIterable,
+    AsyncIterator,
     Iterable,
     Iterator,
     List,
@@ -70,6 +72,20 @@ def iter_n(
             yield chunk
 
 
+async def aiter_n(aiterable: AsyncIterable[T], n: int) -> AsyncIterator[Tuple[T, ...]]:
+    """
+    Iterate an async iterator by chunks (of n)
+    """
+    chunk: List[T] = []
+    async for item in aiterable:
+        chunk.append(item)
+        if len(chunk) == n:
+            yield tuple(chunk)
+            chunk = []
+    if chunk:
+        yield tuple(chunk)
+
+
 def concatenate_list(sequence: Iterable[Any], sep: str = ",", quoted: bool = True) -> Any:
     """
     Ingests an iterable sequence and combines all elements into a string
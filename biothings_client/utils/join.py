@@ -1,5 +1,19 @@
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import zlib
 from typing import (
+    IO,
     Any,
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Deque,
     Dict,
     Iterable,
     Iterator,
@@ -11,16 +25,55 @@ from typing import (
     Union,
 )
 
+from biothings_client.utils.decoding import decode_json
+from biothings_client.utils.fields import FieldExtractor
+
+logger = logging.getLogger("biothings.client")
+
 Document = Dict[str, Any]
 JoinMap = Dict[str, List[int]]
 JoinedDocsMap = Dict[str, List[Document]]
 
 
+# the number of outer docs per chunk of a join, and of a key lookup join (the max_query of the APIs)
+CHUNK_SIZE = 100
+LOOKUP_CHUNK_SIZE = 1000
+# the hits per term of a querymany lookup without a size in e2_kwargs (the default of the APIs)
+QUERYMANY_SIZE = 10
+# the partitions of a grace hash join, and how many times an oversized partition is split again
+PARTITIONS = 32
+MAX_REPARTITIONS = 4
+
+
 class QueryClient(Protocol):
     _entity: str
+    caching_enabled: bool
 
     def query(self, query: str, fetch_all: bool = True, **kwargs: Any) -> Iterable[Document]: ...
 
+    def _querymany(self, qterms: Iterable[Any], scopes: Any = None, **kwargs: Any) -> Any: ...
+
+    def _getannotations(self, ids: Iterable[Any], fields: Any = None, **kwargs: Any) -> Any: ...
+
+    def _set_caching(self) -> None: ...
+
+    def _stop_caching(self) -> None: ...
+
+
+class AsyncQueryClient(Protocol):
+    _entity: str
+    caching_enabled: bool
+
+    async def query(self, query: str, fetch_all: bool = True, **kwargs: Any) -> AsyncIterable[Document]: ...
+
+    async def _querymany(self, qterms: Iterable[Any], scopes: Any = None, **kwargs: Any) -> Any: ...
+
+    async def _getannotations(self, ids: Iterable[Any], fields: Any = None, **kwargs: Any) -> Any: ...
+
+    async def _set_caching(self) -> None: ...
+
+    async def _stop_caching(self) -> None: ...
+
 
 def get_dotfield(d: Any, df: str) -> List[Any]:
     s: Set[Any] = set()
@@ -49,23 +102,44 @@ def get_dotfield(d: Any, df: str) -> List[Any]:
     return list(s)
 
 
+def join_values(extractor: FieldExtractor, doc: Document) -> List[Any]:
+    """
+    The distinct values of the join field of a document, the single field of
+    extractor. Like get_dotfield, objects and empty values are skipped
+    """
+    values: Dict[Any, None] = {}
+    stack = [extractor.extract(doc)[0]]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(reversed(value))
+        elif value and not isinstance(value, dict):
+            values[value] = None
+    return list(values)
+
+
+def _with_join_field(kwargs: Dict[str, Any], join_field: str) -> None:
+    if kwargs.get("fields", None) and kwargs["fields"] != "all" and join_field != "_id":
+        kwargs["fields"] = kwargs["fields"].rstrip(", ") + "," + join_field
+
+
 def unordered_chunk_iterator(
     client: QueryClient,
     query: str,
     join_field: str,
-    chunk_size: Union[int, Dict[str, Any]] = 100,
+    chunk_size: Union[int, Dict[str, Any]] = CHUNK_SIZE,
     query_kwargs: Optional[Dict[str, Any]] = None,
 ) -> Iterator[Tuple[List[Document], JoinMap]]:
     chunk: List[Document] = []
     join_val_dict: JoinMap = {}
     if isinstance(chunk_size, dict):
         query_kwargs = chunk_size
-        chunk_size = 100
+        chunk_size = CHUNK_SIZE
     query_kwargs = query_kwargs or {}
-    if query_kwargs.get("fields", None) and query_kwargs["fields"] != "all" and join_field != "_id":
-        query_kwargs["fields"] = query_kwargs["fields"].rstrip(", ") + "," + join_field
+    extractor = FieldExtractor([join_field])
+    _with_join_field(query_kwargs, join_field)
     for doc in client.query(query, fetch_all=True, **query_kwargs):
-        for doc_join_val in get_dotfield(doc, join_field):
+        for doc_join_val in join_values(extractor, doc):
             join_val_dict.setdefault(str(doc_join_val).lower(), []).append(len(chunk))
         chunk.append(doc)
         if len(join_val_dict) == chunk_size:
@@ -76,6 +150,144 @@ def unordered_chunk_iterator(
         yield chunk, join_val_dict
 
 
+def _inner_query_string(e2_query: str, e2_join_field: str, outer_join_val_dict: JoinMap) -> str:
+    inner_query_string = " OR ".join(["{}:{}".format(e2_join_field, x) for x in outer_join_val_dict.keys()])
+    if e2_query != "__all__":
+        inner_query_string = "((" + inner_query_string + ") AND (" + e2_query + "))"
+    return inner_query_string
+
+
+def _is_key_lookup(e2_query: str, e2_join_field: str, lookup: Optional[bool]) -> bool:
+    """
+    Whether the inner docs of a join are looked up by key: by default for the joins
+    on the _id of the inner entity, without e2_query
+    """
+    if lookup is None:
+        return e2_query == "__all__" and e2_join_field == "_id"
+    if lookup and e2_query != "__all__":
+        raise ValueError("a key lookup join can't be combined with e2_query")
+    return lookup
+
+
+def _lookup_values(extractor: FieldExtractor, outer_doc_chunk: List[Document]) -> List[Any]:
+    """The distinct join values of a chunk, with their case, to look up."""
+    values: Dict[Any, None] = {}
+    for doc in outer_doc_chunk:
+        values.update(dict.fromkeys(join_values(extractor, doc)))
+    return list(values)
+
+
+def _lookup_args(e2_join_field: str, e2_kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    The client method looking up the inner docs of a chunk, and its arguments. The
+    getannotations and querymany methods are named after the entity of the clients
+    """
+    kwargs = {"verbose": False, **e2_kwargs}
+    if e2_join_field == "_id":
+        return "_getannotations", kwargs
+    return "_querymany", {"scopes": e2_join_field, **kwargs}
+
+
+def _lookup_size(method: str, lookup_kwargs: Dict[str, Any]) -> Optional[int]:
+    """The most hits per term returned by the lookup method, None for getannotations"""
+    if method == "_getannotations":
+        return None
+    return int(lookup_kwargs.get("size", QUERYMANY_SIZE))
+
+
+def _found(hits: Iterable[Document], size: Optional[int] = None) -> Tuple[List[Document], List[Any]]:
+    """
+    The hits of a key lookup, without the query key added to them or the notfound
+    hits, and the terms with size hits or more. querymany returns at most size hits
+    per term, the hits of those terms are left out to be fetched in full by _remaining
+    """
+    hits_by_term: Dict[Any, List[Document]] = {}
+    for hit in hits:
+        if not hit.get("notfound", False):
+            hits_by_term.setdefault(hit.pop("query", None), []).append(hit)
+    docs: List[Document] = []
+    truncated: List[Any] = []
+    for term, term_hits in hits_by_term.items():
+        if size is not None and len(term_hits) >= size:
+            truncated.append(term)
+        else:
+            docs.extend(term_hits)
+    return docs, truncated
+
+
+def _remaining_query(e2_join_field: str, truncated: List[Any]) -> str:
+    """The query string scrolled with fetch_all for the hits of the truncated terms of a lookup"""
+    return _inner_query_string("__all__", e2_join_field, dict.fromkeys(truncated))
+
+
+def _distinct(docs: Iterable[Document]) -> List[Document]:
+    """
+    The docs without the repeats of a doc, by _id: querymany returns a doc once per
+    term it matches, and the scrolled hits of truncated terms can match other terms
+    """
+    seen = set()
+    distinct = []
+    for doc in docs:
+        if "_id" in doc:
+            if doc["_id"] in seen:
+                continue
+            seen.add(doc["_id"])
+        distinct.append(doc)
+    return distinct
+
+
+def _lookup(
+    e2_client: QueryClient,
+    e2_join_field: str,
+    e2_kwargs: Dict[str, Any],
+    method: str,
+    lookup_kwargs: Dict[str, Any],
+    values: List[Any],
+) -> List[Document]:
+    """The inner docs of a chunk looked up by key, with all the hits of the terms querymany truncated"""
+    docs, truncated = _found(getattr(e2_client, method)(values, **lookup_kwargs), _lookup_size(method, lookup_kwargs))
+    if truncated:
+        docs.extend(e2_client.query(_remaining_query(e2_join_field, truncated), fetch_all=True, **e2_kwargs))
+    return _distinct(docs)
+
+
+async def _async_lookup(
+    e2_client: AsyncQueryClient,
+    e2_join_field: str,
+    e2_kwargs: Dict[str, Any],
+    method: str,
+    lookup_kwargs: Dict[str, Any],
+    values: List[Any],
+) -> List[Document]:
+    """_lookup for the async clients"""
+    hits = await getattr(e2_client, method)(values, **lookup_kwargs)
+    docs, truncated = _found(hits, _lookup_size(method, lookup_kwargs))
+    if truncated:
+        query = _remaining_query(e2_join_field, truncated)
+        docs.extend([doc async for doc in await e2_client.query(query, fetch_all=True, **e2_kwargs)])
+    return _distinct(docs)
+
+
+def _merge_chunk(
+    entity: str,
+    outer_doc_chunk: List[Document],
+    outer_join_val_dict: JoinMap,
+    inner_docs: Iterable[Document],
+    e2_extractor: FieldExtractor,
+) -> List[Document]:
+    """The outer docs of a chunk with their joined inner docs under entity."""
+    e2_val_join_dict: JoinedDocsMap = {}
+    for inner_doc in inner_docs:
+        for doc_join_val in join_values(e2_extractor, inner_doc):
+            e2_val_join_dict.setdefault(str(doc_join_val).lower(), []).append(inner_doc)
+    # merge the docs for this chunk
+    chunk_intersection = set(list(e2_val_join_dict.keys())).intersection(set(list(outer_join_val_dict.keys())))
+    for merge_join_field in chunk_intersection:
+        for index in outer_join_val_dict[merge_join_field]:
+            outer_doc_chunk[index].setdefault(entity, []).extend(e2_val_join_dict[merge_join_field])
+    return [outer_doc_chunk[p] for p in {p for v in chunk_intersection for p in outer_join_val_dict[v]}]
+
+
 def join(
     e1_client: QueryClient,
     e2_client: QueryClient,
@@ -86,36 +298,531 @@ def join(
     e2_join_field: str = "_id",
     e1_kwargs: Optional[Dict[str, Any]] = None,
     e2_kwargs: Optional[Dict[str, Any]] = None,
+    lookup: Optional[bool] = None,
 ) -> Iterator[List[Document]]:
-    """implements a join with e1 being the outer loop and e2 being the inner loop"""
+    """
+    implements a join with e1 being the outer loop and e2 being the inner loop
+
+    With lookup, the inner docs of every chunk of outer docs are looked up by key in
+    one batch, with getannotations for a join on the _id of e2, or with querymany on
+    the e2_join_field scope, instead of a query string scrolled with fetch_all. A
+    querymany lookup returns at most the size of e2_kwargs hits per join value (10 by
+    default), the hits of the join values reaching it are then scrolled with fetch_all.
+    lookup is only the default for the _id joins without e2_query
+    """
     ret_chunk: List[Document] = []
     e1_kwargs = e1_kwargs or {}
-    e2_kwargs = e2_kwargs or {}
-    for outer_doc_chunk, outer_join_val_dict in unordered_chunk_iterator(e1_client, e1_query, e1_join_field, e1_kwargs):
+    e2_kwargs = dict(e2_kwargs or {})
+    _with_join_field(e2_kwargs, e2_join_field)
+    e1_extractor = FieldExtractor([e1_join_field])
+    e2_extractor = FieldExtractor([e2_join_field])
+    lookup = _is_key_lookup(e2_query, e2_join_field, lookup)
+    chunk_size = LOOKUP_CHUNK_SIZE if lookup else CHUNK_SIZE
+    method, lookup_kwargs = _lookup_args(e2_join_field, e2_kwargs)
+    for outer_doc_chunk, outer_join_val_dict in unordered_chunk_iterator(
+        e1_client, e1_query, e1_join_field, chunk_size, query_kwargs=e1_kwargs
+    ):
         if outer_doc_chunk:
-            inner_query_string = " OR ".join(["{}:{}".format(e2_join_field, x) for x in outer_join_val_dict.keys()])
-            if e2_query != "__all__":
-                inner_query_string = "((" + inner_query_string + ") AND (" + e2_query + "))"
-            if e2_kwargs.get("fields", None) and e2_kwargs["fields"] != "all" and e2_join_field != "_id":
-                e2_kwargs["fields"] = e2_kwargs["fields"].rstrip(", ") + "," + e2_join_field
-            e2_val_join_dict: JoinedDocsMap = {}
-            for inner_doc in e2_client.query(inner_query_string, fetch_all=True, **e2_kwargs):
-                for doc_join_val in get_dotfield(inner_doc, e2_join_field):
-                    e2_val_join_dict.setdefault(str(doc_join_val).lower(), []).append(inner_doc)
-            # merge the docs for this chunk
-            chunk_intersection = set(list(e2_val_join_dict.keys())).intersection(set(list(outer_join_val_dict.keys())))
-            if len(chunk_intersection) > 0:
-                for merge_join_field in set(list(e2_val_join_dict.keys())).intersection(
-                    set(list(outer_join_val_dict.keys()))
-                ):
-                    for index in outer_join_val_dict[merge_join_field]:
-                        outer_doc_chunk[index].setdefault(e2_client._entity, []).extend(
-                            e2_val_join_dict[merge_join_field]
-                        )
-                for p in {p for v in chunk_intersection for p in outer_join_val_dict[v]}:
-                    ret_chunk.append(outer_doc_chunk[p])
-                    if len(ret_chunk) == size:
-                        yield ret_chunk
-                        ret_chunk = []
+            inner_docs: Iterable[Document]
+            if lookup:
+                values = _lookup_values(e1_extractor, outer_doc_chunk)
+                inner_docs = _lookup(e2_client, e2_join_field, e2_kwargs, method, lookup_kwargs, values)
+            else:
+                inner_query_string = _inner_query_string(e2_query, e2_join_field, outer_join_val_dict)
+                inner_docs = e2_client.query(inner_query_string, fetch_all=True, **e2_kwargs)
+            for doc in _merge_chunk(e2_client._entity, outer_doc_chunk, outer_join_val_dict, inner_docs, e2_extractor):
+                ret_chunk.append(doc)
+                if len(ret_chunk) == size:
+                    yield ret_chunk
+                    ret_chunk = []
+    if ret_chunk:
+        yield ret_chunk
+
+
+@contextlib.contextmanager
+def _caching_disabled(*clients: QueryClient) -> Iterator[None]:
+    """
+    Disable the caching of the clients for the whole of a pipelined join. The
+    fetch_all queries of the join then run on clients with caching already
+    disabled, instead of every one of them disabling and restoring it while the
+    others run from other threads
+    """
+    stopped: List[QueryClient] = []
+    try:
+        for client in {id(client): client for client in clients}.values():
+            if client.caching_enabled:
+                client._stop_caching()
+                stopped.append(client)
+        yield
+    finally:
+        for client in stopped:
+            client._set_caching()
+
+
+@contextlib.asynccontextmanager
+async def _async_caching_disabled(*clients: AsyncQueryClient) -> AsyncIterator[None]:
+    """Async counterpart of _caching_disabled, for the concurrent tasks of async_pipelined_join."""
+    stopped: List[AsyncQueryClient] = []
+    try:
+        for client in {id(client): client for client in clients}.values():
+            if client.caching_enabled:
+                await client._stop_caching()
+                stopped.append(client)
+        yield
+    finally:
+        for client in stopped:
+            await client._set_caching()
+
+
+def pipelined_join(
+    e1_client: QueryClient,
+    e2_client: QueryClient,
+    size: int = 10,
+    e1_query: str = "__all__",
+    e2_query: str = "__all__",
+    e1_join_field: str = "_id",
+    e2_join_field: str = "_id",
+    e1_kwargs: Optional[Dict[str, Any]] = None,
+    e2_kwargs: Optional[Dict[str, Any]] = None,
+    window: int = 4,
+    lookup: Optional[bool] = None,
+) -> Iterator[List[Document]]:
+    """
+    join, with the inner queries of up to window outer chunks run at once from a
+    thread pool while the next outer chunks are fetched. The joined docs are yielded
+    in the order of the outer chunks, like join. The caching of the clients is
+    disabled for the whole join, e2_client being used from several threads, and e1_client
+    can be the same client
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    e1_kwargs = e1_kwargs or {}
+    e2_kwargs = dict(e2_kwargs or {})
+    _with_join_field(e2_kwargs, e2_join_field)
+    e1_extractor = FieldExtractor([e1_join_field])
+    e2_extractor = FieldExtractor([e2_join_field])
+    lookup = _is_key_lookup(e2_query, e2_join_field, lookup)
+    method, lookup_kwargs = _lookup_args(e2_join_field, e2_kwargs)
+
+    def inner_join(outer_doc_chunk: List[Document], outer_join_val_dict: JoinMap) -> List[Document]:
+        if lookup:
+            values = _lookup_values(e1_extractor, outer_doc_chunk)
+            inner_docs = _lookup(e2_client, e2_join_field, e2_kwargs, method, lookup_kwargs, values)
+        else:
+            inner_query_string = _inner_query_string(e2_query, e2_join_field, outer_join_val_dict)
+            inner_docs = list(e2_client.query(inner_query_string, fetch_all=True, **e2_kwargs))
+        return _merge_chunk(e2_client._entity, outer_doc_chunk, outer_join_val_dict, inner_docs, e2_extractor)
+
+    ret_chunk: List[Document] = []
+    pending: Deque["concurrent.futures.Future[List[Document]]"] = collections.deque()
+    with _caching_disabled(e1_client, e2_client), concurrent.futures.ThreadPoolExecutor(max_workers=window) as executor:
+        outer_chunks = unordered_chunk_iterator(
+            e1_client, e1_query, e1_join_field, LOOKUP_CHUNK_SIZE if lookup else CHUNK_SIZE, query_kwargs=e1_kwargs
+        )
+        try:
+            while True:
+                outer = next(outer_chunks, None)
+                if outer is not None and outer[0]:
+                    pending.append(executor.submit(inner_join, *outer))
+                # the joined chunks are emitted in order, once done or when the window is full
+                while pending and (pending[0].done() or len(pending) >= window or outer is None):
+                    for doc in pending.popleft().result():
+                        ret_chunk.append(doc)
+                        if len(ret_chunk) == size:
+                            yield ret_chunk
+                            ret_chunk = []
+                if outer is None:
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+            outer_chunks.close()
+    if ret_chunk:
+        yield ret_chunk
+
+
+async def async_unordered_chunk_iterator(
+    client: AsyncQueryClient,
+    query: str,
+    join_field: str,
+    chunk_size: int = CHUNK_SIZE,
+    query_kwargs: Optional[Dict[str, Any]] = None,
+) -> AsyncGenerator[Tuple[List[Document], JoinMap], None]:
+    """Async counterpart of unordered_chunk_iterator."""
+    chunk: List[Document] = []
+    join_val_dict: JoinMap = {}
+    query_kwargs = query_kwargs or {}
+    extractor = FieldExtractor([join_field])
+    _with_join_field(query_kwargs, join_field)
+    async for doc in await client.query(query, fetch_all=True, **query_kwargs):
+        for doc_join_val in join_values(extractor, doc):
+            join_val_dict.setdefault(str(doc_join_val).lower(), []).append(len(chunk))
+        chunk.append(doc)
+        if len(join_val_dict) == chunk_size:
+            yield chunk, join_val_dict
+            chunk = []
+            join_val_dict = {}
+    if chunk:
+        yield chunk, join_val_dict
+
+
+async def async_pipelined_join(
+    e1_client: AsyncQueryClient,
+    e2_client: AsyncQueryClient,
+    size: int = 10,
+    e1_query: str = "__all__",
+    e2_query: str = "__all__",
+    e1_join_field: str = "_id",
+    e2_join_field: str = "_id",
+    e1_kwargs: Optional[Dict[str, Any]] = None,
+    e2_kwargs: Optional[Dict[str, Any]] = None,
+    window: int = 4,
+    lookup: Optional[bool] = None,
+) -> AsyncGenerator[List[Document], None]:
+    """
+    pipelined_join for the async clients, the inner queries of up to window outer
+    chunks being run as tasks while the next outer chunks are fetched. The caching of
+    the clients is disabled for the whole join, like pipelined_join
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    e2_kwargs = dict(e2_kwargs or {})
+    _with_join_field(e2_kwargs, e2_join_field)
+    e1_extractor = FieldExtractor([e1_join_field])
+    e2_extractor = FieldExtractor([e2_join_field])
+    lookup = _is_key_lookup(e2_query, e2_join_field, lookup)
+    method, lookup_kwargs = _lookup_args(e2_join_field, e2_kwargs)
+
+    async def inner_join(outer_doc_chunk: List[Document], outer_join_val_dict: JoinMap) -> List[Document]:
+        if lookup:
+            values = _lookup_values(e1_extractor, outer_doc_chunk)
+            inner_docs = await _async_lookup(e2_client, e2_join_field, e2_kwargs, method, lookup_kwargs, values)
+        else:
+            inner_query_string = _inner_query_string(e2_query, e2_join_field, outer_join_val_dict)
+            inner_docs = [doc async for doc in await e2_client.query(inner_query_string, fetch_all=True, **e2_kwargs)]
+        return _merge_chunk(e2_client._entity, outer_doc_chunk, outer_join_val_dict, inner_docs, e2_extractor)
+
+    ret_chunk: List[Document] = []
+    pending: Deque["asyncio.Task[List[Document]]"] = collections.deque()
+    async with _async_caching_disabled(e1_client, e2_client):
+        outer_chunks = async_unordered_chunk_iterator(
+            e1_client, e1_query, e1_join_field, LOOKUP_CHUNK_SIZE if lookup else CHUNK_SIZE, query_kwargs=e1_kwargs
+        )
+        try:
+            while True:
+                outer: Optional[Tuple[List[Document], JoinMap]]
+                try:
+                    outer = await outer_chunks.__anext__()
+                except StopAsyncIteration:
+                    outer = None
+                if outer is not None and outer[0]:
+                    pending.append(asyncio.ensure_future(inner_join(*outer)))
+                # the joined chunks are emitted in order, once done or when the window is full
+                while pending and (pending[0].done() or len(pending) >= window or outer is None):
+                    for doc in await pending.popleft():
+                        ret_chunk.append(doc)
+                        if len(ret_chunk) == size:
+                            yield ret_chunk
+                            ret_chunk = []
+                if outer is None:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            # the cancelled tasks are done before the caching of the clients is restored
+            await asyncio.gather(*pending, return_exceptions=True)
+            await outer_chunks.aclose()
     if ret_chunk:
         yield ret_chunk
+
+
+def _join_keys(extractor: FieldExtractor, doc: Document) -> List[str]:
+    return list(dict.fromkeys(str(value).lower() for value in join_values(extractor, doc)))
+
+
+def _partition(key: str, level: int, count: int) -> int:
+    # salted with the level, so that an oversized partition is split again by a different hash
+    return zlib.crc32(f"{level}:{key}".encode("utf-8")) % count
+
+
+class _SpillFiles:
+    """
+    One append-only spill file of JSON lines per partition, written with the
+    number of bytes and records of every partition
+    """
+
+    def __init__(self, directory: str, name: str, count: int) -> None:
+        self.count = count
+        self.paths = [os.path.join(directory, f"{name}-{index:05d}.ndjson") for index in range(count)]
+        self.sizes = [0] * count
+        self.records = [0] * count
+        self._files: Dict[int, IO[bytes]] = {}
+
+    def write(self, index: int, record: Any) -> None:
+        line = json.dumps(record, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+        spill = self._files.get(index)
+        if spill is None:
+            spill = self._files[index] = open(self.paths[index], "wb")
+        spill.write(line)
+        self.sizes[index] += len(line)
+        self.records[index] += 1
+
+    def close(self) -> None:
+        for spill in self._files.values():
+            spill.close()
+
+    def read(self, index: int) -> Iterator[Any]:
+        if not self.records[index]:
+            return
+        with open(self.paths[index], "rb") as spill:
+            for line in spill:
+                yield decode_json(line)
+
+    def remove(self, index: int) -> None:
+        if self.records[index]:
+            os.remove(self.paths[index])
+
+
+class _GraceHashJoin:
+    """
+    The partitions of a grace hash join on disk. The outer docs are spilled as
+    [seq, whole, keys, doc] records to the partitions of their keys, the doc being
+    only written with the keys of the first partition, and whole telling a doc with
+    all its keys in one partition. The inner docs are spilled as [keys, doc] records
+    to every partition of their keys. The outer docs spread over several partitions
+    are joined as fragments, merged once all the partitions are joined
+    """
+
+    def __init__(
+        self,
+        entity: str,
+        e1_extractor: FieldExtractor,
+        e2_extractor: FieldExtractor,
+        directory: str,
+        partitions: int,
+        max_memory: int,
+    ) -> None:
+        self.entity = entity
+        self.e1_extractor = e1_extractor
+        self.e2_extractor = e2_extractor
+        self.directory = directory
+        self.partitions = partitions
+        self.max_memory = max_memory
+        self.outer = _SpillFiles(directory, "outer", partitions)
+        self.inner = _SpillFiles(directory, "inner", partitions)
+        self._seq = 0
+        self._splits = 0
+
+    def add_outer(self, doc: Document) -> None:
+        keys = _join_keys(self.e1_extractor, doc)
+        if keys:
+            self._seq += 1
+            self._spill_outer(self.outer, 0, self._seq, True, keys, doc)
+
+    def add_inner(self, doc: Document) -> None:
+        self._spill_inner(self.inner, 0, _join_keys(self.e2_extractor, doc), doc)
+
+    @staticmethod
+    def _spill_outer(
+        files: _SpillFiles, level: int, seq: int, whole: bool, keys: List[str], doc: Optional[Document]
+    ) -> None:
+        partition_keys: Dict[int, List[str]] = {}
+        for key in keys:
+            partition_keys.setdefault(_partition(key, level, files.count), []).append(key)
+        whole = whole and len(partition_keys) == 1
+        for index, (partition, keys_in_partition) in enumerate(partition_keys.items()):
+            files.write(partition, [seq, whole, keys_in_partition, doc if index == 0 else None])
+
+    @staticmethod
+    def _spill_inner(files: _SpillFiles, level: int, keys: List[str], doc: Document) -> None:
+        partition_keys: Dict[int, List[str]] = {}
+        for key in keys:
+            partition_keys.setdefault(_partition(key, level, files.count), []).append(key)
+        for partition, keys_in_partition in partition_keys.items():
+            files.write(partition, [keys_in_partition, doc])
+
+    def close(self) -> None:
+        self.outer.close()
+        self.inner.close()
+
+    def results(self) -> Iterator[Document]:
+        """The outer docs with their joined inner docs, partition by partition."""
+        self.close()
+        fragments = _SpillFiles(self.directory, "fragments", self.partitions)
+        try:
+            yield from self._join(self.outer, self.inner, 0, fragments)
+        finally:
+            fragments.close()
+        for partition in range(fragments.count):
+            merged: Dict[int, List[Any]] = {}
+            for seq, doc, inner_docs in fragments.read(partition):
+                entry = merged.setdefault(seq, [None, []])
+                if doc is not None:
+                    entry[0] = doc
+                entry[1].extend(inner_docs)
+            fragments.remove(partition)
+            for doc, inner_docs in merged.values():
+                if inner_docs:
+                    doc.setdefault(self.entity, []).extend(inner_docs)
+                    yield doc
+
+    def _join(self, outer: _SpillFiles, inner: _SpillFiles, level: int, fragments: _SpillFiles) -> Iterator[Document]:
+        for partition in range(outer.count):
+            if inner.sizes[partition] > self.max_memory and inner.records[partition] > 1:
+                if level < MAX_REPARTITIONS:
+                    yield from self._split(outer, inner, partition, level, fragments)
+                    continue
+                logger.warning(
+                    "grace hash join partition of %d bytes still exceeds max_memory after %d repartitions, "
+                    "joining it in memory",
+                    inner.sizes[partition],
+                    level,
+                )
+            table: JoinedDocsMap = {}
+            for keys, doc in inner.read(partition):
+                for key in keys:
+                    table.setdefault(key, []).append(doc)
+            inner.remove(partition)
+            for seq, whole, keys, doc in outer.read(partition):
+                inner_docs = [inner_doc for key in keys for inner_doc in table.get(key, ())]
+                if whole:
+                    if inner_docs:
+                        doc.setdefault(self.entity, []).extend(inner_docs)
+                        yield doc
+                elif inner_docs or doc is not None:
+                    fragments.write(seq % fragments.count, [seq, doc, inner_docs])
+            outer.remove(partition)
+
+    def _split(
+        self, outer: _SpillFiles, inner: _SpillFiles, partition: int, level: int, fragments: _SpillFiles
+    ) -> Iterator[Document]:
+        self._splits += 1
+        name = f"split{self._splits}"
+        sub_outer = _SpillFiles(self.directory, f"{name}-outer", self.partitions)
+        sub_inner = _SpillFiles(self.directory, f"{name}-inner", self.partitions)
+        try:
+            for keys, doc in inner.read(partition):
+                self._spill_inner(sub_inner, level + 1, keys, doc)
+            inner.remove(partition)
+            for seq, whole, keys, doc in outer.read(partition):
+                self._spill_outer(sub_outer, level + 1, seq, whole, keys, doc)
+            outer.remove(partition)
+        finally:
+            sub_outer.close()
+            sub_inner.close()
+        yield from self._join(sub_outer, sub_inner, level + 1, fragments)
+
+
+def _grace_hash_args(
+    e2_client: Any,
+    e1_join_field: str,
+    e2_join_field: str,
+    e1_kwargs: Optional[Dict[str, Any]],
+    e2_kwargs: Optional[Dict[str, Any]],
+    partitions: int,
+    max_memory: int,
+) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """The query arguments of both sides of a grace hash join, and the arguments of _GraceHashJoin."""
+    if partitions < 1:
+        raise ValueError("partitions must be at least 1")
+    if max_memory < 1:
+        raise ValueError("max_memory must be a positive number of bytes")
+    e1_kwargs = dict(e1_kwargs or {})
+    e2_kwargs = dict(e2_kwargs or {})
+    _with_join_field(e1_kwargs, e1_join_field)
+    _with_join_field(e2_kwargs, e2_join_field)
+    join_args = {
+        "entity": e2_client._entity,
+        "e1_extractor": FieldExtractor([e1_join_field]),
+        "e2_extractor": FieldExtractor([e2_join_field]),
+        "partitions": partitions,
+        "max_memory": max_memory,
+    }
+    return e1_kwargs, e2_kwargs, join_args
+
+
+def grace_hash_join(
+    e1_client: QueryClient,
+    e2_client: QueryClient,
+    size: int = 10,
+    e1_query: str = "__all__",
+    e2_query: str = "__all__",
+    e1_join_field: str = "_id",
+    e2_join_field: str = "_id",
+    e1_kwargs: Optional[Dict[str, Any]] = None,
+    e2_kwargs: Optional[Dict[str, Any]] = None,
+    max_memory: int = 256 * 2**20,
+    partitions: int = PARTITIONS,
+    spill_dir: Optional[str] = None,
+) -> Iterator[List[Document]]:
+    """
+    A join of all the docs of e1_query and e2_query, for joins too large for memory.
+    Both sides are fetched with fetch_all and spilled to partition files by the hash
+    of their join values, in a temporary directory of spill_dir, then the inner docs
+    of every partition are loaded in a hash table probed with the outer docs of the
+    partition. The joined docs are yielded like join, in chunks of size, but in the
+    order of the partitions.
+
+    max_memory bounds the JSON size of the inner docs of a partition, Python objects
+    taking a few times more memory: a larger partition is split again, up to
+    MAX_REPARTITIONS times (the docs of a single join value can't be split). The
+    spill files of a partition are deleted once it is joined, and the temporary
+    directory when the generator is exhausted or closed
+    """
+    e1_kwargs, e2_kwargs, join_args = _grace_hash_args(
+        e2_client, e1_join_field, e2_join_field, e1_kwargs, e2_kwargs, partitions, max_memory
+    )
+    with tempfile.TemporaryDirectory(prefix="biothings-join-", dir=spill_dir) as directory:
+        grace_join = _GraceHashJoin(directory=directory, **join_args)
+        try:
+            for doc in e1_client.query(e1_query, fetch_all=True, **e1_kwargs):
+                grace_join.add_outer(doc)
+            for doc in e2_client.query(e2_query, fetch_all=True, **e2_kwargs):
+                grace_join.add_inner(doc)
+        finally:
+            grace_join.close()
+        ret_chunk: List[Document] = []
+        for doc in grace_join.results():
+            ret_chunk.append(doc)
+            if len(ret_chunk) == size:
+                yield ret_chunk
+                ret_chunk = []
+        if ret_chunk:
+            yield ret_chunk
+
+
+async def async_grace_hash_join(
+    e1_client: AsyncQueryClient,
+    e2_client: AsyncQueryClient,
+    size: int = 10,
+    e1_query: str = "__all__",
+    e2_query: str = "__all__",
+    e1_join_field: str = "_id",
+    e2_join_field: str = "_id",
+    e1_kwargs: Optional[Dict[str, Any]] = None,
+    e2_kwargs: Optional[Dict[str, Any]] = None,
+    max_memory: int = 256 * 2**20,
+    partitions: int = PARTITIONS,
+    spill_dir: Optional[str] = None,
+) -> AsyncGenerator[List[Document], None]:
+    """grace_hash_join for the async clients, the spill files being read and written synchronously."""
+    e1_kwargs, e2_kwargs, join_args = _grace_hash_args(
+        e2_client, e1_join_field, e2_join_field, e1_kwargs, e2_kwargs, partitions, max_memory
+    )
+    with tempfile.TemporaryDirectory(prefix="biothings-join-", dir=spill_dir) as directory:
+        grace_join = _GraceHashJoin(directory=directory, **join_args)
+        try:
+            async for doc in await e1_client.query(e1_query, fetch_all=True, **e1_kwargs):
+                grace_join.add_outer(doc)
+            async for doc in await e2_client.query(e2_query, fetch_all=True, **e2_kwargs):
+                grace_join.add_inner(doc)
+        finally:
+            grace_join.close()
+        ret_chunk: List[Document] = []
+        for doc in grace_join.results():
+            ret_chunk.append(doc)
+            if len(ret_chunk) == size:
+                yield ret_chunk
+                ret_chunk = []
+        if ret_chunk:
+            yield ret_chunk
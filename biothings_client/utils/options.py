@@ -0,0 +1,53 @@
+"""
+Validation of the output options of getannotations, query and querymany
+
+The output options each select what a query method returns: a list of hits,
+a DataFrame (as_dataframe), records (as_records), an Arrow table (as_arrow),
+the raw responses (return_raw), a file (to_parquet, to_ndjson), DataFrames of
+N rows (as_dataframe_chunks) or a generator of hits (as_generator). They
+are mutually exclusive, except for the combinations of COMPATIBLE_OUTPUTS: a
+generator of records, or the record batches of an Arrow table read as they
+come, and returnall adding the duplicate and missing terms to the output of
+querymany
+"""
+
+import itertools
+from typing import FrozenSet, Iterable
+
+OUTPUT_OPTIONS = (
+    "as_dataframe",
+    "as_records",
+    "as_arrow",
+    "return_raw",
+    "to_parquet",
+    "to_ndjson",
+    "as_dataframe_chunks",
+    "as_generator",
+    "returnall",
+)
+
+COMPATIBLE_OUTPUTS: FrozenSet[FrozenSet[str]] = frozenset(
+    [
+        frozenset(["as_generator", "as_records"]),
+        frozenset(["as_generator", "as_arrow"]),
+        *(
+            frozenset(["returnall", option])
+            for option in ("as_dataframe", "as_records", "as_arrow", "return_raw", "to_parquet", "to_ndjson")
+        ),
+    ]
+)
+
+
+def check_output_options(compatible: Iterable[FrozenSet[str]] = COMPATIBLE_OUTPUTS, **options: bool) -> None:
+    """
+    Raise a ValueError for the first two output options given together that can't
+    be combined.
+
+    :param compatible: the pairs of output options which can be combined
+    :param options: whether each output option of OUTPUT_OPTIONS is given
+    """
+    compatible = frozenset(compatible)
+    given = [option for option in OUTPUT_OPTIONS if options.get(option)]
+    for first, second in itertools.combinations(given, 2):
+        if frozenset([first, second]) not in compatible:
+            raise ValueError(f"{first} can't be combined with {second}")
@@ -0,0 +1,202 @@
+"""
+Splitting of the query strings of query() too long for a URL
+
+A query string is sent in the URL of a GET request, which servers and proxies
+limit to a few kilobytes, and join() builds OR-disjunctions of one term per
+join value. A query string longer than client.max_query_length once URL-encoded
+is split into sub-queries of at most this length when it is a disjunction, or
+a conjunction with a disjunction, which is distributed:
+
+    a OR b OR c OR d          ->  a OR b, c OR d
+    ((a OR b OR c) AND x)     ->  (a OR b) AND x, (c) AND x
+
+The sub-queries are run at once and their hits are unioned, deduplicated by
+_id. A disjunction is only split when its terms are plain or parenthesized
+clauses: the clauses combined with other operators, or prohibited with NOT or
+a leading -, change the meaning of the disjunction when taken apart. The
+query strings which can't be split are sent as they are, the POST requests of
+the query endpoint being batch queries of terms on scopes, without the query
+string syntax
+"""
+
+from typing import Any, AsyncGenerator, AsyncIterable, Dict, Iterable, Iterator, List, Optional, Sequence
+from urllib.parse import quote_plus
+
+_OPERATORS = (" AND ", " OR ", " NOT ", " && ", " || ")
+_PROHIBITED = ("-", "+", "!", "NOT ")
+
+
+def _encoded_length(text: str) -> int:
+    return len(quote_plus(text))
+
+
+def _operands(q: str, operator: str) -> List[str]:
+    """The operands of operator at the top level of q, outside of groups, ranges and phrases."""
+    operands = []
+    depth, start, position, quoted = 0, 0, 0, False
+    while position < len(q):
+        char = q[position]
+        if char == "\\":
+            position += 2
+            continue
+        if char == '"':
+            quoted = not quoted
+        elif not quoted:
+            if char in "([{":
+                depth += 1
+            elif char in ")]}":
+                depth -= 1
+            elif depth == 0 and q.startswith(operator, position):
+                operands.append(q[start:position].strip())
+                position += len(operator)
+                start = position
+                continue
+        position += 1
+    operands.append(q[start:].strip())
+    return operands
+
+
+def _closing(q: str) -> int:
+    """The position of the parenthesis closing the one q starts with, -1 if there is none."""
+    depth, position, quoted = 0, 0, False
+    while position < len(q):
+        char = q[position]
+        if char == "\\":
+            position += 2
+            continue
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+            if depth == 0:
+                return position
+        position += 1
+    return -1
+
+
+def _unwrap(q: str) -> str:
+    """q without the parentheses enclosing all of it."""
+    q = q.strip()
+    while q.startswith("(") and _closing(q) == len(q) - 1:
+        q = q[1:-1].strip()
+    return q
+
+
+def _only_operator(q: str, operator: str) -> Optional[List[str]]:
+    """The operands of q when it combines them with operator only at the top level."""
+    operands = _operands(q, operator)
+    if len(operands) < 2 or not all(operands):
+        return None
+    for other in _OPERATORS:
+        if other != operator and any(len(_operands(operand, other)) > 1 for operand in operands):
+            return None
+    return operands
+
+
+def _disjuncts(q: str) -> Optional[List[str]]:
+    disjuncts = _only_operator(_unwrap(q), " OR ")
+    if disjuncts is None or any(disjunct.startswith(_PROHIBITED) for disjunct in disjuncts):
+        return None
+    return disjuncts
+
+
+def _group(disjuncts: Sequence[str], prefix: str, suffix: str, max_length: int) -> List[str]:
+    budget = max_length - _encoded_length(prefix + suffix)
+    separator = _encoded_length(" OR ")
+    groups: List[List[str]] = []
+    length = 0
+    for disjunct in disjuncts:
+        disjunct_length = _encoded_length(disjunct)
+        if groups and length + separator + disjunct_length <= budget:
+            groups[-1].append(disjunct)
+            length += separator + disjunct_length
+        else:
+            groups.append([disjunct])
+            length = disjunct_length
+    return [prefix + " OR ".join(group) + suffix for group in groups]
+
+
+def split_query(q: str, max_length: int) -> List[str]:
+    """
+    The sub-queries of q of at most max_length characters once URL-encoded, or [q]
+    when it is short enough or can't be split
+    """
+    if _encoded_length(q) <= max_length:
+        return [q]
+    disjuncts = _disjuncts(q)
+    if disjuncts is not None:
+        return _group(disjuncts, "", "", max_length)
+    conjuncts = _only_operator(_unwrap(q), " AND ")
+    if conjuncts is None:
+        return [q]
+    # distribute the longest disjunction of the conjunction
+    candidates = [(_encoded_length(conjunct), index) for index, conjunct in enumerate(conjuncts)]
+    for _, index in sorted(candidates, reverse=True):
+        disjuncts = _disjuncts(conjuncts[index])
+        if disjuncts is not None:
+            prefix = "".join(conjunct + " AND " for conjunct in conjuncts[:index]) + "("
+            suffix = ")" + "".join(" AND " + conjunct for conjunct in conjuncts[index + 1 :])
+            return _group(disjuncts, prefix, suffix, max_length)
+    return [q]
+
+
+def _hit_id(hit: Any) -> Any:
+    return hit.get("_id") if isinstance(hit, dict) else None
+
+
+def union_responses(responses: Sequence[Dict[str, Any]], size: int, skip: int = 0, by_score: bool = False) -> Any:
+    """
+    The union of the query responses of the sub-queries of a query, the hits being
+    deduplicated by _id in the order of the sub-queries. The total is the sum of the
+    totals of the sub-queries, an upper bound when they overlap.
+
+    With by_score, the hits are sorted by score instead. The ranking is approximate:
+    the scores of different sub-queries aren't computed against the same query, and
+    a hit matched by several of them keeps the score of the first one
+    """
+    for response in responses:
+        if not isinstance(response, dict) or "hits" not in response:
+            return response
+    hits = list(unique_hits(response["hits"] for response in responses))
+    if by_score:
+        hits.sort(key=lambda hit: -hit.get("_score", 0.0))
+    out = dict(responses[0])
+    out["took"] = max(response.get("took", 0) for response in responses)
+    out["total"] = sum(response.get("total", 0) for response in responses)
+    scores = [response["max_score"] for response in responses if response.get("max_score") is not None]
+    out["max_score"] = max(scores) if scores else None
+    out["hits"] = hits[skip : skip + size]
+    return out
+
+
+def unique_hits(hit_lists: Iterable[Iterable[Any]]) -> Iterator[Any]:
+    """The hits of every list, skipping the hits of an _id already seen."""
+    seen = set()
+    for hits in hit_lists:
+        for hit in hits:
+            key = _hit_id(hit)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield hit
+
+
+async def aunique_hits(hit_lists: Iterable[AsyncIterable[Any]]) -> AsyncGenerator[Any, None]:
+    """Async counterpart of unique_hits, closing the async generators of hits."""
+    seen = set()
+    for hits in hit_lists:
+        try:
+            async for hit in hits:
+                key = _hit_id(hit)
+                if key is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield hit
+        finally:
+            aclose = getattr(hits, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -0,0 +1,75 @@
+"""
+Mapping of the hits of querymany and getannotations to their input positions
+
+The hits of a batch are returned grouped by input term, in the order of the
+terms of the batch, so they are mapped to the input positions by walking the
+terms of the batch in step with the hits, without a dictionary keyed on the
+query strings. The positions are kept in a side array aligned with the hits
+(with_positions=True), from which the input order is rebuilt in O(n) with
+input_order, e.g. for the hits of unordered=True received fastest first:
+
+    hits, positions = client.querymany(terms, unordered=True, with_positions=True)
+    hits = [hits[index] for index in input_order(positions)]
+
+The hits of consecutive occurrences of the same term can't be told apart,
+they are all mapped to the first of these positions. A hit whose query isn't
+a term of its batch is mapped to -1
+"""
+
+from array import array
+from typing import Any, Iterable, List, Sequence
+
+from biothings_client.utils.dedupe import hit_query
+
+
+class BatchPositions:
+    """
+    Maps the hits of a batch to input positions, in the order they are received.
+
+    :param batch: the input terms of the batch
+    :param start: the input position of the first term of the batch
+    """
+
+    def __init__(self, batch: Sequence[Any], start: int) -> None:
+        self._keys = [str(term) for term in batch]
+        self.start = start
+        self._cursor = 0
+
+    def position(self, hit: Any) -> int:
+        """The input position of the next hit of the batch."""
+        query = hit_query(hit)
+        keys = self._keys
+        cursor = self._cursor
+        while cursor < len(keys) and keys[cursor] != query:
+            cursor += 1
+        if cursor == len(keys):
+            return -1
+        self._cursor = cursor
+        return self.start + cursor
+
+
+def batch_positions(batch: Sequence[Any], hits: Iterable[Any], start: int) -> "array[int]":
+    """The input positions of all the hits of a batch."""
+    positions = BatchPositions(batch, start)
+    return array("q", [positions.position(hit) for hit in hits])
+
+
+def input_order(positions: Sequence[int]) -> List[int]:
+    """
+    The indices of the hits sorted by input position, the hits of a position
+    keeping their order and the hits without a position coming last. A counting
+    sort, linear in the number of hits and of input positions
+    """
+    # one slot per input position, then one for the hits without a position
+    slots = max(positions, default=-1) + 2
+    starts = [0] * (slots + 1)
+    for position in positions:
+        starts[(position if position >= 0 else slots - 1) + 1] += 1
+    for slot in range(1, slots + 1):
+        starts[slot] += starts[slot - 1]
+    order = [0] * len(positions)
+    for index, position in enumerate(positions):
+        slot = position if position >= 0 else slots - 1
+        order[starts[slot]] = index
+        starts[slot] += 1
+    return order
@@ -0,0 +1,104 @@
+"""
+Single-flight coalescing of identical in-flight requests
+
+When several callers (threads for the sync client, coroutines for the async
+client) issue the same request at the same time, only the first one, the
+leader, sends it. Everyone else waits for the leader and receives its result
+(or its exception). Nothing is kept once the request completes: a call made
+after the leader finished sends a new request
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def request_key(method: str, url: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, str, str]:
+    """Build the key identifying a request, independent of the ordering of its parameters."""
+    return (method.upper(), url, json.dumps(params or {}, sort_keys=True, default=str))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Thread-safe request coalescing for the sync client."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Return fn(), sharing the result with every concurrent caller using the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """Request coalescing for the async client, shared by the coroutines of a single event loop."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Return await fn(), sharing the result with every concurrent caller using the same key."""
+        loop = asyncio.get_running_loop()
+        future = self._calls.get(key)
+        while future is not None and future.get_loop() is loop:
+            try:
+                # shield so a cancelled waiter doesn't cancel the request of the others
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # the leader was cancelled, take over or wait for the new leader
+                future = self._calls.get(key)
+
+        future = loop.create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            # mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        return result
@@ -0,0 +1,346 @@
+"""
+Streaming export sinks writing hits to NDJSON or Parquet files
+
+A sink receives the hits batch by batch and writes them to disk right away, so
+an export of millions of documents runs in the memory of a few batches. Output
+files are rolled once they hold max_rows_per_file rows: the parts are named
+<name>-00000.<extension>, <name>-00001.<extension>, ...
+
+The progress of an export is saved next to the output in <path>.progress.json.
+With resume=True, an interrupted querymany / getannotations export picks up
+after the last input saved in the progress file:
+
+    * NDJSON files are flushed after every batch (a gzip member or a zstd frame
+      per batch when compressed), a resumed export truncates the part it was
+      writing to the last saved batch and appends to it
+    * Parquet files can't be appended to, a resumed export starts over from the
+      first input which isn't in a completed part
+
+The sinks also work with the generator APIs, for instance:
+
+    with NDJSONSink("genes.ndjson.gz", compression="gzip") as sink:
+        for hits in iter_n(client.query("cdk*", fetch_all=True), 1000):
+            sink.write(hits)
+            sink.checkpoint()
+"""
+
+import gzip
+import json
+import logging
+import os
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Sequence, Union
+
+from biothings_client._dependencies import _PYARROW, _ZSTANDARD
+from biothings_client.utils.arrow import ArrowBatchBuilder
+
+if _PYARROW:
+    import pyarrow
+    import pyarrow.parquet
+
+if _ZSTANDARD:
+    import zstandard
+
+logger = logging.getLogger("biothings.client")
+
+JsonDict = Dict[str, Any]
+
+NDJSON_COMPRESSIONS = (None, "gzip", "zstd")
+
+
+class BiothingsClientSink:
+    """
+    Base class of the export sinks.
+
+    :param path: output file, the name of the parts when the output is rolled
+    :param max_rows_per_file: roll the output to a new file once a file holds at least this
+                              many rows, checked after every batch. None for a single file
+    :param resume: resume an interrupted export from its progress file, otherwise the
+                   export starts over
+    """
+
+    def __init__(self, path: Union[str, Path], max_rows_per_file: Optional[int] = None, resume: bool = False) -> None:
+        self.path = Path(path)
+        self.max_rows_per_file = max_rows_per_file
+        self.progress_path = self.path.with_name(self.path.name + ".progress.json")
+        self.paths: List[Path] = []
+        self.rows = 0
+        self.complete = False
+        self._position = 0
+        self._part = 0
+        self._file_rows = 0
+        self._progress: JsonDict = {}
+        if resume and self.progress_path.exists():
+            self._progress = json.loads(self.progress_path.read_text())
+        elif self.progress_path.exists():
+            self.progress_path.unlink()
+
+    @property
+    def resume_position(self) -> int:
+        """The number of inputs already exported, to skip when resuming."""
+        return self._progress.get("position", 0)
+
+    def part_path(self, part: int) -> Path:
+        if self.max_rows_per_file is None:
+            return self.path
+        name, _, extensions = self.path.name.partition(".")
+        return self.path.with_name(f"{name}-{part:05d}.{extensions}" if extensions else f"{name}-{part:05d}")
+
+    def restart(self) -> None:
+        """Discard the saved progress and export from the first input."""
+        if self._progress:
+            self._progress = {}
+            self.paths = []
+            self.rows = 0
+            self._position = 0
+            self._part = 0
+            self.progress_path.unlink()
+
+    def write(self, hits: Sequence[JsonDict]) -> None:
+        """Write a batch of hits."""
+        raise NotImplementedError
+
+    def checkpoint(self, position: Optional[int] = None) -> None:
+        """
+        Mark the end of a batch, rolling the output if the current file is full.
+
+        :param position: the number of inputs whose hits were all written, saved in the
+                         progress file so the export can be resumed after them
+        """
+        raise NotImplementedError
+
+    def close(self) -> List[Path]:
+        """Complete the export and return the files written."""
+        raise NotImplementedError
+
+    def abort(self) -> None:
+        """Release the open files of an interrupted export, keeping its progress file."""
+        raise NotImplementedError
+
+    def _save_progress(self, **progress: Any) -> None:
+        progress.update({"position": self._position, "rows": self.rows, "paths": [str(path) for path in self.paths]})
+        temporary_path = self.progress_path.with_name(self.progress_path.name + ".tmp")
+        temporary_path.write_text(json.dumps(progress))
+        os.replace(temporary_path, self.progress_path)
+
+    def __enter__(self) -> "BiothingsClientSink":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class NDJSONSink(BiothingsClientSink):
+    """
+    Writes the hits as newline delimited JSON.
+
+    :param compression: None, "gzip" or "zstd" (requires zstandard)
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        compression: Optional[str] = None,
+        max_rows_per_file: Optional[int] = None,
+        resume: bool = False,
+    ) -> None:
+        if compression not in NDJSON_COMPRESSIONS:
+            raise ValueError(f"compression must be one of {NDJSON_COMPRESSIONS}")
+        if compression == "zstd" and not _ZSTANDARD:
+            from biothings_client.client.exceptions import OptionalDependencyImportError
+
+            raise OptionalDependencyImportError(
+                optional_function_access="compress exports with zstd", optional_group="zstd", libraries=["zstandard"]
+            )
+        super().__init__(path, max_rows_per_file=max_rows_per_file, resume=resume)
+        self.compression = compression
+        self._file: Optional[IO[bytes]] = None
+        self._compressor: Any = zstandard.ZstdCompressor() if compression == "zstd" else None
+
+    def _open(self) -> IO[bytes]:
+        if self._file is not None:
+            return self._file
+        progress = self._progress
+        if progress and not progress.get("complete", False):
+            # resume the part being written, dropping what was written after the last checkpoint
+            self.paths = [Path(path) for path in progress["paths"]]
+            self.rows = progress["rows"]
+            self._position = progress["position"]
+            self._part = progress["part"]
+            self._file_rows = progress["file_rows"]
+            part_path = self.part_path(self._part)
+            self._file = open(part_path, "r+b" if part_path.exists() else "wb")
+            self._file.truncate(progress["file_size"])
+            self._file.seek(progress["file_size"])
+        else:
+            self._file = open(self.part_path(self._part), "wb")
+        self._progress = {}
+        if self.part_path(self._part) not in self.paths:
+            self.paths.append(self.part_path(self._part))
+        return self._file
+
+    def write(self, hits: Sequence[JsonDict]) -> None:
+        output = self._open()
+        data = "".join(json.dumps(hit) + "\n" for hit in hits).encode("utf-8")
+        if self.compression == "gzip":
+            data = gzip.compress(data)
+        elif self.compression == "zstd":
+            data = self._compressor.compress(data)
+        output.write(data)
+        self.rows += len(hits)
+        self._file_rows += len(hits)
+
+    def checkpoint(self, position: Optional[int] = None) -> None:
+        if self._file is None:
+            return
+        self._file.flush()
+        file_size = self._file.tell()
+        if self.max_rows_per_file is not None and self._file_rows >= self.max_rows_per_file:
+            # the next part is created by the next write
+            self._file.close()
+            self._file = None
+            self._part += 1
+            self._file_rows = 0
+            file_size = 0
+        elif position is not None:
+            os.fsync(self._file.fileno())
+        if position is not None:
+            self._position = position
+            self._save_progress(part=self._part, file_rows=self._file_rows, file_size=file_size)
+
+    def close(self) -> List[Path]:
+        if self._progress.get("complete", False):
+            # resuming an export which already completed
+            return [Path(path) for path in self._progress["paths"]]
+        if self._file is not None or not self.paths:
+            self._open().close()
+            self._file = None
+        self.complete = True
+        self._save_progress(complete=True)
+        return self.paths
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ParquetSink(BiothingsClientSink):
+    """
+    Writes the hits to Parquet files (requires pyarrow), converted with the same
+    schema as the as_arrow option.
+
+    :param schema: a pyarrow.Schema for the hits, inferred from the first batch if None
+    :param row_group_size: number of rows buffered before writing a row group
+    :param compression: Parquet compression codec
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        schema: Optional["pyarrow.Schema"] = None,
+        row_group_size: int = 65536,
+        compression: str = "zstd",
+        max_rows_per_file: Optional[int] = None,
+        resume: bool = False,
+    ) -> None:
+        if not _PYARROW:
+            from biothings_client.client.exceptions import OptionalDependencyImportError
+
+            raise OptionalDependencyImportError(
+                optional_function_access="export to parquet", optional_group="arrow", libraries=["pyarrow"]
+            )
+        super().__init__(path, max_rows_per_file=max_rows_per_file, resume=resume)
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self._builder = ArrowBatchBuilder(schema)
+        self._writer: Optional["pyarrow.parquet.ParquetWriter"] = None
+        self._pending: List["pyarrow.RecordBatch"] = []
+        self._pending_rows = 0
+        if self._progress and not self._progress.get("complete", False):
+            # restart after the last completed part, with the schema of the parts
+            self.paths = [Path(path) for path in self._progress["paths"]]
+            self.rows = self._progress["rows"]
+            self._position = self._progress["position"]
+            self._part = len(self.paths)
+            if self.paths and self._builder.schema is None:
+                self._builder.schema = pyarrow.parquet.read_schema(self.paths[0])
+
+    def write(self, hits: Sequence[JsonDict]) -> None:
+        if not hits:
+            return
+        batch = self._builder.record_batch(hits)
+        self._pending.append(batch)
+        self._pending_rows += batch.num_rows
+        self.rows += batch.num_rows
+        self._file_rows += batch.num_rows
+        if self._pending_rows >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        if not self._pending:
+            return
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(
+                self.part_path(self._part), self._builder.schema, compression=self.compression
+            )
+        table = pyarrow.Table.from_batches(self._pending, schema=self._builder.schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._pending = []
+        self._pending_rows = 0
+
+    def _close_part(self) -> None:
+        self._write_row_group()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self.paths.append(self.part_path(self._part))
+            self._part += 1
+            self._file_rows = 0
+
+    def checkpoint(self, position: Optional[int] = None) -> None:
+        if self.max_rows_per_file is not None and self._file_rows >= self.max_rows_per_file:
+            self._close_part()
+            if position is not None:
+                # parts can't be appended to, only completed parts are resumable
+                self._position = position
+                self._save_progress(part=self._part)
+
+    def close(self) -> List[Path]:
+        if self._progress.get("complete", False):
+            return [Path(path) for path in self._progress["paths"]]
+        self._close_part()
+        self.complete = True
+        self._save_progress(complete=True)
+        return self.paths
+
+    def abort(self) -> None:
+        # a part without its footer is unreadable, it is written again when resuming
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+
+def export_sink(
+    to_parquet: Optional[Union[str, Path, BiothingsClientSink]] = None,
+    to_ndjson: Optional[Union[str, Path, BiothingsClientSink]] = None,
+) -> Optional[BiothingsClientSink]:
+    """
+    The sink of the to_parquet / to_ndjson export options: either a sink, or
+    the path of the output file. The compression of an NDJSON file is given by
+    its .gz or .zst extension
+    """
+    if to_parquet is not None and to_ndjson is not None:
+        raise ValueError("to_parquet can't be combined with to_ndjson")
+    target = to_parquet if to_parquet is not None else to_ndjson
+    if target is None or isinstance(target, BiothingsClientSink):
+        return target
+    if to_parquet is not None:
+        return ParquetSink(target)
+    suffix = Path(target).suffix
+    return NDJSONSink(target, compression={".gz": "gzip", ".zst": "zstd"}.get(suffix))
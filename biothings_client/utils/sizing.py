@@ -0,0 +1,110 @@
+"""
+Adaptive sizing of the batches of querymany and getannotations
+
+The batches are sent with a fixed number of inputs (client.step) by default,
+which is too many when the hits are large (fields="all" on myvariant can
+return tens of megabytes per batch) and too few when they are small
+(fields="_id"). With client.adaptive_step = True the size of every batch is
+derived from the latency and the response size measured for the previous
+ones, to fit both the latency budget and the size budget of the client:
+
+    client.adaptive_step = True
+    client.step_latency_budget = 5.0  # seconds per batch
+    client.step_size_budget = 8 * 2**20  # response bytes per batch
+
+The size of a batch is always between 1 and client.max_query, and grows at
+most twofold from a batch to the next one. The responses read from the cache
+aren't measured, and streamed responses (stream_responses) are only measured
+until their headers are received
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_current_meter: "ContextVar[Optional[BatchMeter]]" = ContextVar("batch_meter", default=None)
+
+
+def record_response_bytes(count: int) -> None:
+    """Add the size of a response body to the batch being measured, if any."""
+    meter = _current_meter.get()
+    if meter is not None:
+        meter.bytes += count
+
+
+class BatchMeter:
+    """
+    Measures the duration of the query of a batch and the size of the response
+    bodies received meanwhile, in the same thread or task
+    """
+
+    __slots__ = ("seconds", "bytes")
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def run(self, query_fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        token = _current_meter.set(self)
+        start = time.perf_counter()
+        try:
+            return query_fn(*args, **kwargs)
+        finally:
+            self.seconds = time.perf_counter() - start
+            _current_meter.reset(token)
+
+    async def arun(self, query_fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        token = _current_meter.set(self)
+        start = time.perf_counter()
+        try:
+            return await query_fn(*args, **kwargs)
+        finally:
+            self.seconds = time.perf_counter() - start
+            _current_meter.reset(token)
+
+
+class AdaptiveStep:
+    """
+    Sizes the batches from the latency and response size per input of the
+    batches already sent, smoothed with an exponential moving average.
+
+    :param initial: the size of the first batch
+    :param maximum: the largest batch size, the max_query of the API
+    :param latency_budget: the target duration of a batch, in seconds
+    :param size_budget: the target size of the response of a batch, in bytes
+    :param smoothing: the weight of the last batch in the averages
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int,
+        latency_budget: float,
+        size_budget: int,
+        smoothing: float = 0.5,
+    ) -> None:
+        self.maximum = max(1, maximum)
+        self.size = min(max(1, initial), self.maximum)
+        self.latency_budget = latency_budget
+        self.size_budget = size_budget
+        self.smoothing = smoothing
+        self._seconds_per_input: Optional[float] = None
+        self._bytes_per_input: Optional[float] = None
+
+    def _smooth(self, average: Optional[float], value: float) -> float:
+        return value if average is None else average + self.smoothing * (value - average)
+
+    def observe(self, count: int, meter: BatchMeter) -> None:
+        """Resize the next batches after a batch of count inputs was measured."""
+        if count <= 0:
+            return
+        self._seconds_per_input = self._smooth(self._seconds_per_input, meter.seconds / count)
+        self._bytes_per_input = self._smooth(self._bytes_per_input, meter.bytes / count)
+        target = float(self.maximum)
+        if self.latency_budget and self._seconds_per_input > 0:
+            target = min(target, self.latency_budget / self._seconds_per_input)
+        if self.size_budget and self._bytes_per_input > 0:
+            target = min(target, self.size_budget / self._bytes_per_input)
+        self.size = max(1, min(int(target), 2 * self.size, self.maximum))
@@ -0,0 +1,205 @@
+"""
+Incremental parsing of JSON responses
+
+The hits of a batch (POST) response, a JSON array, or of a query (GET)
+response, an object with a "hits" array, are parsed from the chunks of the
+response body as they arrive. Every hit is decoded as soon as its closing
+bracket is received, so the first hits are available before the body is
+complete and the body is never held in memory as a whole.
+
+The tokenizer only stops on the brackets of deeply nested containers, strings
+and the content of small containers are skipped by a regular expression. The hits themselves are decoded with
+biothings_client.utils.decoding.decode_json
+"""
+
+import json
+import re
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+import httpx
+
+from biothings_client.utils.decoding import decode_json
+
+# the regular expressions are written as unrolled loops so they can't backtrack
+#   catastrophically on an incomplete document
+_TEXT = rb'[^"\[\]{}]*'
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+# a container holding no other container, then a container nesting one level of them
+_FLAT_CONTAINER = rb"[\[{]" + _TEXT + rb"(?:" + _STRING + _TEXT + rb")*[\]}]"
+_CONTAINER = rb"[\[{]" + _TEXT + rb"(?:(?:" + _STRING + rb"|" + _FLAT_CONTAINER + rb")" + _TEXT + rb")*[\]}]"
+# everything up to the next bracket, skipping over complete strings
+_SKIP = re.compile(_TEXT + rb"(?:" + _STRING + _TEXT + rb")*")
+# inside an element, small complete containers are skipped over as well
+_SKIP_ELEMENT = re.compile(_TEXT + rb"(?:(?:" + _STRING + rb"|" + _CONTAINER + rb")" + _TEXT + rb")*")
+_WHITESPACE = b" \t\r\n"
+
+
+class JsonArrayParser:
+    """
+    Push parser yielding the elements of a JSON array from chunks of a document.
+
+    :param key: stream the array stored under this key of a top-level object
+                instead of a top-level array
+    """
+
+    def __init__(self, key: Optional[str] = None) -> None:
+        self.key = None if key is None else json.dumps(key).encode("utf-8")
+        self._buffer = bytearray()
+        self._position = 0
+        self._depth = 0
+        self._array_depth: Optional[int] = None
+        self._done = False
+        # the document without the elements of the array, decoded by close()
+        self._envelope = bytearray()
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Parse a chunk of the document and return the elements completed by it."""
+        if self._done:
+            self._envelope += chunk
+            return []
+        buffer = self._buffer
+        buffer += chunk
+        position = self._position
+        depth = self._depth
+        array_depth = self._array_depth
+        elements: List[Any] = []
+        while True:
+            skip = _SKIP_ELEMENT if array_depth is not None and depth > array_depth else _SKIP
+            position = skip.match(buffer, position).end()  # type: ignore[union-attr]
+            if position == len(buffer):
+                break
+            token = buffer[position]
+            if token == 0x22:  # "
+                # wait for the rest of an incomplete string
+                break
+            position += 1
+            if token == 0x7B or token == 0x5B:  # { [
+                if depth == array_depth:
+                    # an object or array element starts, collect the scalars before it
+                    self._scalars(buffer[: position - 1], elements)
+                    del buffer[: position - 1]
+                    position = 1
+                depth += 1
+                if token == 0x5B and array_depth is None and self._is_streamed_array(depth, buffer[: position - 1]):
+                    array_depth = depth
+                    self._envelope += buffer[:position]
+                    del buffer[:position]
+                    position = 0
+            elif depth == array_depth:  # the ] closing the streamed array
+                self._scalars(buffer[: position - 1], elements)
+                depth -= 1
+                self._done = True
+                self._envelope += buffer[position - 1 :]
+                buffer.clear()
+                position = 0
+                break
+            else:  # } ]
+                depth -= 1
+                if depth == array_depth:
+                    # the buffer starts with the element which just ended
+                    elements.append(decode_json(bytes(buffer[:position])))
+                    del buffer[:position]
+                    position = 0
+        self._position = position
+        self._depth = depth
+        self._array_depth = array_depth
+        return elements
+
+    @staticmethod
+    def _scalars(text: bytearray, elements: List[Any]) -> None:
+        # numbers, strings, true, false and null elements between two brackets
+        text = text.strip(b"," + _WHITESPACE)
+        if text:
+            elements.extend(decode_json(b"[" + bytes(text) + b"]"))
+
+    def _is_streamed_array(self, depth: int, prefix: bytearray) -> bool:
+        if self.key is None:
+            return depth == 1
+        if depth != 2:
+            return False
+        # the array is a member of the top-level object: ..., "key": [
+        prefix = prefix.rstrip(_WHITESPACE)
+        if not prefix.endswith(b":"):
+            return False
+        prefix = prefix[:-1].rstrip(_WHITESPACE)
+        return prefix.endswith(self.key) and not prefix[: -len(self.key)].endswith(b"\\")
+
+    def close(self) -> Any:
+        """
+        Check the document is complete and return it without the elements of the
+        array, e.g. {"total": 2, "hits": []}
+        """
+        if self._array_depth is not None and not self._done:
+            raise ValueError("Incomplete JSON document: the array was not terminated")
+        envelope, self._envelope = bytes(self._envelope + self._buffer), bytearray()
+        self._buffer.clear()
+        return decode_json(envelope)
+
+
+class JsonStream:
+    """
+    Iterator over the hits of a streamed httpx response. The response is closed
+    once the hits are exhausted or when the stream is closed.
+
+    :param response: response sent with stream=True
+    :param key: the key of the hits in the response object, None if the response is an array
+    :param convert: optional function applied to every hit
+    """
+
+    def __init__(
+        self, response: httpx.Response, key: Optional[str] = None, convert: Optional[Callable[[Any], Any]] = None
+    ) -> None:
+        self.response = response
+        self.convert = convert
+        self.envelope: Any = None
+        self._parser = JsonArrayParser(key)
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            for chunk in self.response.iter_bytes():
+                for hit in self._parser.feed(chunk):
+                    yield hit if self.convert is None else self.convert(hit)
+            self.envelope = self._parser.close()
+        finally:
+            self.response.close()
+
+    def close(self) -> None:
+        self.response.close()
+
+    def __enter__(self) -> "JsonStream":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class AsyncJsonStream:
+    """
+    Async iterator over the hits of a streamed httpx response, see JsonStream.
+    """
+
+    def __init__(
+        self, response: httpx.Response, key: Optional[str] = None, convert: Optional[Callable[[Any], Any]] = None
+    ) -> None:
+        self.response = response
+        self.convert = convert
+        self.envelope: Any = None
+        self._parser = JsonArrayParser(key)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        try:
+            async for chunk in self.response.aiter_bytes():
+                for hit in self._parser.feed(chunk):
+                    yield hit if self.convert is None else self.convert(hit)
+            self.envelope = self._parser.close()
+        finally:
+            await self.response.aclose()
+
+    async def aclose(self) -> None:
+        await self.response.aclose()
+
+    async def __aenter__(self) -> "AsyncJsonStream":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
@@ -2,11 +2,15 @@
 Fixtures for the biothings_client testing
 """
 
+import json
 import os
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
 
+import httpx
 import pytest
 
-from biothings_client import get_client, get_async_client
+from biothings_client import AsyncBiothingClient, BiothingClient, get_async_client, get_client
 from biothings_client.client.definitions import (
     AsyncMyChemInfo,
     AsyncMyGeneInfo,
@@ -18,6 +22,8 @@ from biothings_client.client.definitions import (
     MyVariantInfo,
 )
 
+Handler = Callable[[httpx.Request], Any]
+
 # --- CLIENTS ---
 # sync:
 # >>> MyGeneInfo client
@@ -121,3 +127,85 @@ def mock_client_proxy_configuration() -> None:
     yield
     os.environ.pop("HTTP_PROXY", None)
     os.environ.pop("HTTPS_PROXY", None)
+
+
+# --- MOCKED CLIENTS ---
+# The mocked clients send their requests to a handler taking an httpx.Request
+# and returning an httpx.Response instead of the network:
+# >>> mock_client("gene", handler)
+# >>> mock_async_client("gene", handler)
+# >>> scroll_handler(hits) a handler answering every query with hits, scrolled in one page
+# >>> batch_terms(request) the ids or query terms of a batch POST request
+
+
+@pytest.fixture(scope="function")
+def mock_client() -> Callable[..., BiothingClient]:
+    """
+    Fixture for generating synchronous clients with a mocked transport
+    """
+
+    def make_client(client: str, handler: Handler, **client_kwargs: Any) -> BiothingClient:
+        biothing_client = get_client(client)
+        biothing_client.http_client = httpx.Client(transport=httpx.MockTransport(handler), **client_kwargs)
+        biothing_client.http_client_setup = True
+        biothing_client.delay = 0
+        return biothing_client
+
+    return make_client
+
+
+@pytest.fixture(scope="function")
+def mock_async_client() -> Callable[..., AsyncBiothingClient]:
+    """
+    Fixture for generating asynchronous clients with a mocked transport
+    """
+
+    def make_client(client: str, handler: Handler, **client_kwargs: Any) -> AsyncBiothingClient:
+        biothing_client = get_async_client(client)
+        biothing_client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler), **client_kwargs)
+        biothing_client.http_client_setup = True
+        biothing_client.delay = 0
+        return biothing_client
+
+    return make_client
+
+
+@pytest.fixture(scope="function")
+def scroll_handler() -> Callable[..., Handler]:
+    """
+    Fixture for generating the handlers of fetch_all queries: hits is either the list of
+    the hits of every query, or a function of the query string returning them. They
+    are returned in one page, the following scroll request has no more results
+    """
+
+    def make_handler(
+        hits: Any, on_request: Optional[Callable[[httpx.Request], None]] = None, **response: Any
+    ) -> Handler:
+        def handler(request: httpx.Request) -> httpx.Response:
+            if on_request is not None:
+                on_request(request)
+            if "scroll_id" in request.url.params:
+                return httpx.Response(200, json={"success": False, "error": "No results to return."})
+            page = hits(request.url.params["q"]) if callable(hits) else hits
+            return httpx.Response(200, json={"total": len(page), "hits": page, "_scroll_id": "scroll", **response})
+
+        return handler
+
+    return make_handler
+
+
+@pytest.fixture(scope="session")
+def batch_terms() -> Callable[[httpx.Request], List[str]]:
+    """
+    Fixture for parsing the ids or query terms of a batch POST request, sent form or
+    JSON encoded
+    """
+
+    def parse_terms(request: httpx.Request) -> List[str]:
+        if request.headers["content-type"] == "application/json":
+            form: Dict[str, Any] = json.loads(request.content)
+            return form.get("q", form.get("ids"))
+        fields = parse_qs(request.content.decode())
+        return fields.get("q", fields.get("ids"))[0].replace('"', "").split(",")
+
+    return parse_terms
@@ -153,3 +153,345 @@ async def test_async_cache_client_proxy_discovery(mock_client_proxy_configuratio
             assert proxy_url.host == b"fakehttpproxyhost"
             assert proxy_url.port == 6374
             assert proxy_url.target == b"/"
+
+
+@pytest.mark.asyncio
+async def test_async_request_coalescing(mock_async_client):
+    """
+    Tests that identical requests issued concurrently from several coroutines
+    share a single network call once coalescing is enabled
+    """
+    import asyncio
+
+    requests_sent = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests_sent.append(request.url)
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json={"_id": "1017", "symbol": "CDK2"})
+
+    gene_client = mock_async_client("gene", handler)
+    assert gene_client.coalesce_requests is False
+    gene_client.coalesce_requests = True
+    # the cache statistics count the lookups, not the callers sharing them
+    gene_client.caching_enabled = True
+    gene_client.http_cache_client_setup = True
+
+    genes = await asyncio.gather(*(gene_client.getgene("1017", fields="symbol") for _ in range(16)))
+    assert len(requests_sent) == 1
+    assert gene_client.cache_statistics.misses == 1
+    assert all(gene == {"_id": "1017", "symbol": "CDK2"} for gene in genes)
+
+    await asyncio.gather(gene_client.getgene("1017", fields="symbol"), gene_client.getgene("1018", fields="symbol"))
+    assert len(requests_sent) == 3
+
+    gene_client.coalesce_requests = False
+    await asyncio.gather(*(gene_client.getgene("1017", fields="symbol") for _ in range(4)))
+    assert len(requests_sent) == 7
+
+
+@pytest.mark.asyncio
+async def test_async_annotation_batching(mock_async_client, batch_terms):
+    """
+    Tests that concurrent single annotation lookups are sent as one POST
+    request when batch_annotations is enabled
+    """
+    import asyncio
+    import json
+
+    requests_sent = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests_sent.append(request)
+        hits = []
+        for gene_id in batch_terms(request):
+            if gene_id == "0":
+                hits.append({"query": gene_id, "notfound": True})
+            else:
+                hits.append({"query": gene_id, "_id": gene_id, "symbol": f"GENE{gene_id}"})
+        return httpx.Response(200, json=hits)
+
+    gene_client = mock_async_client("gene", handler)
+    gene_client.batch_annotations = True
+
+    gene_ids = ["1017", "1018", "0", "1017"]
+    genes = await asyncio.gather(*(gene_client.getgene(gene_id, fields="symbol") for gene_id in gene_ids))
+    assert len(requests_sent) == 1
+    assert requests_sent[0].method == "POST"
+    assert genes[0] == {"_id": "1017", "symbol": "GENE1017"}
+    assert genes[1] == {"_id": "1018", "symbol": "GENE1018"}
+    assert genes[2] is None
+    assert genes[3] == genes[0] and genes[3] is not genes[0]
+
+    gene_client.max_query = 2
+    await asyncio.gather(*(gene_client.getgene(str(gene_id), fields="symbol") for gene_id in range(1, 6)))
+    assert len(requests_sent) == 4
+
+    gene_client.max_annotation_loaders = 2
+    for fields in ("symbol", "name", "taxid", "symbol"):
+        await gene_client.getgene("1017", fields=fields)
+    assert len(gene_client._annotation_loaders) == 2
+    assert [json.loads(key)["fields"] for key in gene_client._annotation_loaders] == ["taxid", "symbol"]
+
+
+@pytest.mark.asyncio
+async def test_async_stream_responses(mock_async_client, batch_terms):
+    """
+    Tests that streamed as_generator and fetch_all queries return the same
+    hits as buffered ones
+    """
+    import json
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            gene_ids = batch_terms(request)
+            body = json.dumps([{"query": gene_id, "_id": gene_id} for gene_id in gene_ids]).encode("utf-8")
+            return httpx.Response(200, stream=httpx.ByteStream(body))
+        scroll_id = request.url.params.get("scroll_id")
+        if scroll_id == "2":
+            return httpx.Response(200, json={"success": False, "error": "No results to return."})
+        hits = [{"_id": "1017"}, {"_id": "1018"}] if scroll_id is None else [{"_id": "1019"}]
+        return httpx.Response(200, json={"total": 3, "hits": hits, "_scroll_id": "1" if scroll_id is None else "2"})
+
+    gene_client = mock_async_client("gene", handler)
+    gene_client.step = 2
+
+    for stream_responses in (False, True):
+        gene_client.stream_responses = stream_responses
+        genes = [gene async for gene in await gene_client.getgenes(["1017", "1018", "1019"], as_generator=True)]
+        assert [gene["_id"] for gene in genes] == ["1017", "1018", "1019"]
+        genes = [gene async for gene in await gene_client.query("cdk*", fetch_all=True)]
+        assert [gene["_id"] for gene in genes] == ["1017", "1018", "1019"]
+
+
+@pytest.mark.asyncio
+async def test_async_querymany_as_generator(mock_async_client, batch_terms):
+    """
+    Tests streaming the hits of querymany with the async client, the duplicate
+    and missing query terms being readable once the generator is exhausted,
+    with and without dedupe
+    """
+    requested = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        hits = []
+        requested.append(batch_terms(request))
+        for qterm in requested[-1]:
+            hits.append({"query": qterm, "notfound": True} if qterm == "0" else {"query": qterm, "_id": qterm})
+        return httpx.Response(200, json=hits)
+
+    gene_client = mock_async_client("gene", handler)
+    gene_client.step = 2
+
+    hits = await gene_client.querymany(["1017", "0", "1017"], scopes="entrezgene", as_generator=True)
+    assert [hit.get("_id") async for hit in hits] == ["1017", None, "1017"]
+    assert hits.dup == [("1017", 2)]
+    assert hits.missing == ["0"]
+
+    requested.clear()
+    gene_client.step = 3
+    hits = await gene_client.querymany(["1017", "0", "1017", "0"], scopes="entrezgene", dedupe=True, as_generator=True)
+    assert [hit.get("_id") async for hit in hits] == ["1017", None, "1017", None]
+    assert requested == [["1017", "0"], ["0"]]
+    assert hits.accounting.inputs == 4
+    assert hits.missing == ["0", "0"]
+
+
+@pytest.mark.asyncio
+async def test_async_getannotations_unordered(mock_async_client, batch_terms):
+    """
+    Tests sending the batches of getannotations concurrently with the async
+    client, the hits being mapped to their input positions
+    """
+    import asyncio
+
+    first_batch_sent = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        gene_ids = batch_terms(request)
+        if gene_ids[0] == "1017":
+            await asyncio.wait_for(first_batch_sent.wait(), 5)
+        else:
+            first_batch_sent.set()
+        return httpx.Response(200, json=[{"query": gene_id, "_id": gene_id} for gene_id in gene_ids])
+
+    gene_client = mock_async_client("gene", handler)
+    gene_client.step = 2
+
+    genes, positions = await gene_client.getgenes(["1017", "1018", "1019"], unordered=True, with_positions=True)
+    assert [gene["_id"] for gene in genes] == ["1019", "1017", "1018"]
+    assert list(positions) == [2, 0, 1]
+    items = [
+        item
+        async for item in await gene_client.getgenes(["1017", "1018", "1019"], with_positions=True, as_generator=True)
+    ]
+    assert items[2] == (2, {"query": "1019", "_id": "1019"})
+
+
+@pytest.mark.asyncio
+async def test_async_query_parallel_pages(mock_async_client):
+    """
+    Tests fetching the pages of a query larger than one page at once with the async
+    client, the hits being stitched together in the order of the query, and the
+    sub-queries of a split query being paged past the 1000 hits of one request
+    """
+    import asyncio
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        skip, size = int(request.url.params["skip"]), int(request.url.params["size"])
+        hits = [{"_id": str(rank), "_score": 100.0 - rank} for rank in range(skip, min(skip + size, 2500))]
+        return httpx.Response(200, json={"took": 1, "total": 2500, "max_score": 100.0, "hits": hits})
+
+    async def slow_first_pages(request: httpx.Request) -> httpx.Response:
+        # the earlier pages are received last
+        await asyncio.sleep(0.05 if 0 < int(request.url.params["skip"]) < 2000 else 0)
+        return handler(request)
+
+    gene_client = mock_async_client("gene", slow_first_pages)
+
+    out = await gene_client.query("cdk*", size=2200, parallel_pages=3, verbose=False)
+    assert out["total"] == 2500
+    assert [hit["_id"] for hit in out["hits"]] == [str(rank) for rank in range(2200)]
+
+    def capped_handler(request: httpx.Request) -> httpx.Response:
+        if int(request.url.params["size"]) > 1000:
+            return httpx.Response(400, json={"success": False, "error": "size too large"})
+        return handler(request)
+
+    gene_client = mock_async_client("gene", capped_handler)
+    gene_client.max_query_length = 100
+    q = " OR ".join(f"symbol:cdk{n}" for n in range(20))
+    out = await gene_client.query(q, skip=500, size=700, verbose=False)
+    assert [hit["_id"] for hit in out["hits"]] == [str(rank) for rank in range(500, 1200)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not biothings_client._POLARS, reason="polars is not installed")
+async def test_async_query_fetch_all_as_polars_dataframe(mock_async_client, scroll_handler):
+    """
+    Tests building one polars frame of all the hits of a fetch_all query with the
+    async client, from the frames of its batches
+    """
+    hits = [{"_id": str(n), "ensembl": {"gene": f"ENSG{n}"}} for n in range(5)]
+    gene_client = mock_async_client("gene", scroll_handler(hits))
+    gene_client.step = 2
+
+    frame = await gene_client.query("cdk*", fetch_all=True, as_dataframe="polars", verbose=False)
+    assert frame["ensembl.gene"].to_list() == [f"ENSG{n}" for n in range(5)]
+    with pytest.warns(UserWarning, match="Ignored 'as_dataframe'"):
+        hits = await gene_client.query("cdk*", fetch_all=True, as_dataframe=True, verbose=False)
+    assert len([hit async for hit in hits]) == 5
+
+
+@pytest.mark.asyncio
+async def test_async_pipelined_join(mock_async_client, scroll_handler):
+    """
+    Tests the pipelined join of the async clients, the inner queries of several outer
+    chunks running at once
+    """
+    import asyncio
+    import re
+
+    from biothings_client.utils.join import async_pipelined_join
+
+    second_chunk_queried = asyncio.Event()
+
+    async def inner_handler(request: httpx.Request) -> httpx.Response:
+        if "scroll_id" in request.url.params:
+            return httpx.Response(200, json={"success": False, "error": "No results to return."})
+        ids = [int(n) for n in re.findall(r"_id:(\d+)", request.url.params["q"])]
+        if ids[0] == 0:
+            await asyncio.wait_for(second_chunk_queried.wait(), 5)
+        elif ids[0] == 100:
+            second_chunk_queried.set()
+        hits = [{"_id": str(n)} for n in ids if n % 2 == 0]
+        return httpx.Response(200, json={"total": len(hits), "hits": hits, "_scroll_id": "scroll"})
+
+    outer_client = mock_async_client("gene", scroll_handler([{"_id": str(n)} for n in range(250)]))
+    inner_client = mock_async_client("chem", inner_handler)
+
+    docs = [
+        doc
+        async for chunk in async_pipelined_join(outer_client, inner_client, size=30, window=2, lookup=False)
+        for doc in chunk
+    ]
+    assert len(docs) == 125
+    assert [int(doc["_id"]) // 100 for doc in docs] == sorted(int(doc["_id"]) // 100 for doc in docs)
+    assert all(doc["chem"] == [{"_id": doc["_id"]}] for doc in docs)
+
+
+@pytest.mark.asyncio
+async def test_async_pipelined_join_shared_client(mock_async_client, scroll_handler):
+    """
+    Tests an async pipelined join of a client with itself with caching enabled, the
+    caching being disabled once for the whole join
+    """
+    import re
+
+    from biothings_client.utils.join import async_pipelined_join
+
+    cache_disabled = []
+
+    def gene_hits(q):
+        ids = range(250) if q == "__all__" else [int(n) for n in re.findall(r"_id:(\d+)", q)]
+        return [{"_id": str(n)} for n in ids if n % 2 == 0]
+
+    def on_request(request: httpx.Request) -> None:
+        cache_disabled.append(request.extensions["cache_disabled"])
+
+    gene_client = mock_async_client("gene", scroll_handler(gene_hits, on_request=on_request))
+    gene_client.http_cache_client_setup = True
+    gene_client.caching_enabled = True
+    toggles = []
+
+    async def stop_caching():
+        toggles.append("stop")
+        gene_client.caching_enabled = False
+
+    async def set_caching():
+        toggles.append("set")
+        gene_client.caching_enabled = True
+
+    gene_client._stop_caching = stop_caching
+    gene_client._set_caching = set_caching
+
+    docs = [
+        doc
+        async for chunk in async_pipelined_join(gene_client, gene_client, size=30, window=3, lookup=False)
+        for doc in chunk
+    ]
+    assert sorted(int(doc["_id"]) for doc in docs) == list(range(0, 250, 2))
+    assert toggles == ["stop", "set"]
+    assert gene_client.caching_enabled
+    assert cache_disabled and all(cache_disabled)
+
+
+@pytest.mark.asyncio
+async def test_async_grace_hash_join(tmp_path, mock_async_client, scroll_handler):
+    """
+    Tests the out-of-core join of the async clients
+    """
+    from biothings_client.utils.join import async_grace_hash_join
+
+    genes = [{"_id": str(n), "uniprot": [f"P{n}", f"P{n + 500}"]} for n in range(300)]
+    chems = [{"_id": f"C{m}", "target": f"P{m}"} for m in range(0, 1000, 2)]
+    docs = [
+        doc
+        async for chunk in async_grace_hash_join(
+            mock_async_client("gene", scroll_handler(genes)),
+            mock_async_client("chem", scroll_handler(chems)),
+            size=40,
+            e1_join_field="uniprot",
+            e2_join_field="target",
+            max_memory=1000,
+            partitions=3,
+            spill_dir=str(tmp_path),
+        )
+        for doc in chunk
+    ]
+    assert sorted(int(doc["_id"]) for doc in docs) == list(range(0, 300, 2))
+    assert all(
+        sorted(chem["_id"] for chem in doc["chem"]) == sorted([f"C{doc['_id']}", f"C{int(doc['_id']) + 500}"])
+        for doc in docs
+    )
+    assert list(tmp_path.iterdir()) == []
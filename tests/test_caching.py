@@ -2,6 +2,7 @@
 Tests the client caching functionality
 """
 
+import asyncio
 import logging
 from typing import Callable
 
@@ -312,3 +313,344 @@ async def test_async_cache_clearing(method: str, client: str, function: str, fun
         raise gen_exc
     finally:
         await client_instance.delete_cache()
+
+
+def _storage_backends(mode: str) -> list:
+    """Collects the pluggable cache storage classes available in this environment."""
+    backends = []
+    if biothings_client._CACHING:
+        from biothings_client.cache.storage import filesystem
+
+        backends.append(getattr(filesystem, f"BiothingsClient{mode}FileSystemStorage"))
+        if biothings_client._dependencies._LMDB:
+            from biothings_client.cache.storage import lmdb
+
+            backends.append(getattr(lmdb, f"BiothingsClient{mode}LMDBStorage"))
+    return backends
+
+
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+@pytest.mark.parametrize("storage_class", _storage_backends("Sync"))
+def test_sync_storage_roundtrip(storage_class: type, tmp_path):
+    """Verify a pluggable storage backend returns the stored body and honors soft and hard deletes."""
+    import hishel
+
+    storage = storage_class(database_path=tmp_path / "cache")
+    request = hishel.Request(method="GET", url="https://mygene.info/v3/gene/1017")
+    response = hishel.Response(status_code=200, stream=iter([b'{"_id": ', b'"1017"}']))
+    entry = storage.create_entry(request, response, "cache-key")
+    assert storage.get_entries("cache-key") == []
+    assert b"".join(entry.response.stream) == b'{"_id": "1017"}'
+
+    entries = storage.get_entries("cache-key")
+    assert len(entries) == 1
+    assert entries[0].id == entry.id
+    assert b"".join(entries[0].response.stream) == b'{"_id": "1017"}'
+
+    storage.remove_entry(entry.id)
+    assert storage.get_entries("cache-key") == []
+
+    storage.hard_cleanup()
+    assert storage.get_entries("cache-key") == []
+    storage.delete_database()
+    assert not (tmp_path / "cache").exists()
+
+
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+@pytest.mark.parametrize("storage_class", _storage_backends("Sync"))
+def test_sync_caching_storage_backend(storage_class: type, tmp_path):
+    """Verify the sync client serves cached responses from a pluggable storage backend."""
+    client_instance = get_client("gene")
+    try:
+        client_instance.set_caching(storage=storage_class(database_path=tmp_path / "cache"))
+        assert isinstance(client_instance.cache_storage, storage_class)
+
+        cold_response = client_instance.getgene("1017", return_raw=True)
+        hot_response = client_instance.getgene("1017", return_raw=True)
+        assert not cold_response.extensions.get("hishel_from_cache", False)
+        assert hot_response.extensions.get("hishel_from_cache", False)
+        assert hot_response.json() == cold_response.json()
+    finally:
+        client_instance.delete_cache()
+    assert not (tmp_path / "cache").exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+@pytest.mark.parametrize("storage_class", _storage_backends("Async"))
+async def test_async_caching_storage_backend(storage_class: type, tmp_path):
+    """Verify the async client serves cached responses from a pluggable storage backend."""
+    client_instance = get_async_client("gene")
+    try:
+        await client_instance.set_caching(storage=storage_class(database_path=tmp_path / "cache"))
+        assert isinstance(client_instance.cache_storage, storage_class)
+
+        cold_response = await client_instance.getgene("1017", return_raw=True)
+        hot_response = await client_instance.getgene("1017", return_raw=True)
+        assert not cold_response.extensions.get("hishel_from_cache", False)
+        assert hot_response.extensions.get("hishel_from_cache", False)
+        assert hot_response.json() == cold_response.json()
+    finally:
+        await client_instance.delete_cache()
+    assert not (tmp_path / "cache").exists()
+
+
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+def test_set_caching_rejects_invalid_storage():
+    """Storages must implement both the hishel storage interface and our storage protocol."""
+    client_instance = get_client("gene")
+    with pytest.raises(TypeError):
+        client_instance.set_caching(storage=object())
+    assert not client_instance.caching_enabled
+
+
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+@pytest.mark.parametrize("storage_class", _storage_backends("Sync"))
+def test_sync_storage_inspection(storage_class: type, tmp_path):
+    """Verify the inspection helpers summarize, prune and export a pluggable storage backend."""
+    import io
+    import json
+
+    import hishel
+
+    from biothings_client.cache.inspection import export_records, summarize
+
+    storage = storage_class(database_path=tmp_path / "cache")
+    for gene_id in ("1017", "1018"):
+        request = hishel.Request(method="GET", url=f"https://mygene.info/v3/gene/{gene_id}?fields=symbol")
+        response = hishel.Response(status_code=200, stream=iter([json.dumps({"_id": gene_id}).encode()]))
+        entry = storage.create_entry(request, response, f"cache-key-{gene_id}")
+        b"".join(entry.response.stream)
+
+    summary = summarize(storage)
+    assert summary["entries"] == 2
+    assert summary["deleted_entries"] == 0
+    assert summary["bytes_on_disk"] > 0
+    assert summary["top_endpoints"] == [("https://mygene.info/v3/gene/", 2 * len(b'{"_id": "1017"}'))]
+
+    storage.remove_entry(entry.id)
+    assert summarize(storage)["deleted_entries"] == 1
+    assert storage.prune() == 1
+    assert summarize(storage)["deleted_entries"] == 0
+
+    output = io.StringIO()
+    assert export_records(storage, output) == 1
+    assert json.loads(output.getvalue())["body"] == {"_id": "1017"}
+    storage.delete_database()
+
+
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+def test_sync_cache_stats(tmp_path):
+    """Verify the hit / miss counters and the cache summary reported by cache_stats."""
+    client_instance = get_client("gene")
+    try:
+        client_instance.set_caching(cache_db=tmp_path / "cache.db")
+        client_instance.getgene("1017")
+        client_instance.getgene("1017")
+
+        cache_stats = client_instance.cache_stats()
+        assert cache_stats["hits"] == 1
+        assert cache_stats["misses"] == 1
+        assert cache_stats["entries"] == 1
+        assert cache_stats["bytes_on_disk"] > 0
+        assert cache_stats["top_endpoints"][0][0].endswith("/gene/")
+    finally:
+        client_instance.delete_cache()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+async def test_async_cache_stats(tmp_path):
+    """Verify the hit / miss counters and the cache summary reported by the async cache_stats."""
+    client_instance = get_async_client("gene")
+    try:
+        await client_instance.set_caching(cache_db=tmp_path / "cache.db")
+        await client_instance.getgene("1017")
+        await client_instance.getgene("1017")
+
+        cache_stats = await client_instance.cache_stats()
+        assert cache_stats["hits"] == 1
+        assert cache_stats["misses"] == 1
+        assert cache_stats["entries"] == 1
+        assert cache_stats["top_endpoints"][0][0].endswith("/gene/")
+    finally:
+        await client_instance.delete_cache()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+async def test_async_sqlite_storage_roundtrip(tmp_path):
+    """Verify the async sqlite storage stores and serves bodies through its dedicated executor."""
+    import threading
+
+    import hishel
+
+    from biothings_client.cache.executor import CacheIOExecutor
+    from biothings_client.cache.storage.sqlite3 import BiothingsClientAsyncSqliteStorage
+
+    async def body_stream():
+        yield b'{"_id": '
+        yield b'"1017"}'
+
+    executor = CacheIOExecutor(max_workers=1, max_pending=2)
+    storage = BiothingsClientAsyncSqliteStorage(database_path=tmp_path / "cache.db", executor=executor)
+    request = hishel.Request(method="GET", url="https://mygene.info/v3/gene/1017")
+    entry = await storage.create_entry(request, hishel.Response(status_code=200, stream=body_stream()), "cache-key")
+    assert await storage.get_entries("cache-key") == []
+    assert b"".join([chunk async for chunk in entry.response.stream]) == b'{"_id": "1017"}'
+
+    entries = await storage.get_entries("cache-key")
+    assert len(entries) == 1
+    assert b"".join([chunk async for chunk in entries[0].response.stream]) == b'{"_id": "1017"}'
+
+    worker_names = await asyncio.gather(*(executor.run(lambda: threading.current_thread().name) for _ in range(8)))
+    assert all(name.startswith("biothings-client-cache") for name in worker_names)
+
+    await storage.hard_cleanup()
+    entries_table = await storage.get_entries_table()
+    assert await entries_table.fetchall() == []
+    await storage.delete_database()
+    assert not (tmp_path / "cache.db").exists()
+
+
+def _inspectable_storage_backends() -> list:
+    """The sqlite storage along with the pluggable sync storages."""
+    if not biothings_client._CACHING:
+        return []
+    from biothings_client.cache.storage.sqlite3 import BiothingsClientSyncSqliteStorage
+
+    return [BiothingsClientSyncSqliteStorage] + _storage_backends("Sync")
+
+
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+@pytest.mark.parametrize("storage_class", _inspectable_storage_backends())
+def test_sync_storage_prune_request_ttl(storage_class: type, tmp_path):
+    """Verify every storage prunes the entries past the hishel_ttl of their request, over the default TTL."""
+    import time
+
+    import hishel
+
+    from biothings_client.cache.inspection import summarize
+
+    storage = storage_class(database_path=tmp_path / "cache", default_ttl=3600)
+    for gene_id, metadata in (("1017", {"hishel_ttl": 0.01}), ("1018", {})):
+        request = hishel.Request(method="GET", url=f"https://mygene.info/v3/gene/{gene_id}", metadata=metadata)
+        response = hishel.Response(status_code=200, stream=iter([b'{"_id": "' + gene_id.encode() + b'"}']))
+        entry = storage.create_entry(request, response, f"cache-key-{gene_id}")
+        b"".join(entry.response.stream)
+    time.sleep(0.05)
+    assert storage.prune() == 1
+    assert summarize(storage)["entries"] == 1
+    storage.delete_database()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+async def test_async_cache_stats_storage_executor(tmp_path, monkeypatch):
+    """Verify the async cache_stats walks the storage on the bounded executor of the storage."""
+    import threading
+
+    from biothings_client.cache.inspection import summarize
+    from biothings_client.cache.storage import base
+    from biothings_client.cache.storage.sqlite3 import BiothingsClientAsyncSqliteStorage
+
+    threads = []
+
+    def recording_summarize(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return summarize(*args, **kwargs)
+
+    monkeypatch.setattr(base, "summarize", recording_summarize)
+    client_instance = get_async_client("gene")
+    try:
+        await client_instance.set_caching(
+            storage=BiothingsClientAsyncSqliteStorage(database_path=tmp_path / "cache.db")
+        )
+        cache_stats = await client_instance.cache_stats()
+        assert cache_stats["entries"] == 0
+        assert threads and threads[0].startswith("biothings-client-cache")
+    finally:
+        await client_instance.delete_cache()
+
+
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+def test_cache_command_line(tmp_path, capsys):
+    """Verify the inspect, prune, vacuum and export commands of python -m biothings_client.cache on a sqlite cache."""
+    import json
+
+    import hishel
+
+    from biothings_client.cache.__main__ import main
+    from biothings_client.cache.storage.sqlite3 import BiothingsClientSyncSqliteStorage
+
+    cache_db = tmp_path / "cache.db"
+    storage = BiothingsClientSyncSqliteStorage(database_path=cache_db)
+    for gene_id in ("1017", "1018"):
+        request = hishel.Request(method="GET", url=f"https://mygene.info/v3/gene/{gene_id}")
+        response = hishel.Response(status_code=200, stream=iter([json.dumps({"_id": gene_id}).encode()]))
+        entry = storage.create_entry(request, response, f"cache-key-{gene_id}")
+        b"".join(entry.response.stream)
+    storage.remove_entry(entry.id)
+    storage.close()
+
+    assert main(["inspect", str(cache_db), "--top", "1"]) == 0
+    output = capsys.readouterr().out
+    assert "entries:         1\n" in output
+    assert "deleted entries: 1\n" in output
+    assert "https://mygene.info/v3/gene/" in output
+
+    assert main(["export", str(cache_db), str(tmp_path / "all.ndjson"), "--include-deleted"]) == 0
+    assert capsys.readouterr().err == "exported 2 entries\n"
+    assert main(["export", str(cache_db), "-"]) == 0
+    captured = capsys.readouterr()
+    assert [json.loads(line)["body"] for line in captured.out.splitlines()] == [{"_id": "1017"}]
+    assert captured.err == "exported 1 entries\n"
+
+    assert main(["prune", str(cache_db)]) == 0
+    assert capsys.readouterr().out == "removed 1 entries\n"
+    assert main(["vacuum", str(cache_db)]) == 0
+    assert capsys.readouterr().out.startswith("size on disk: ")
+    assert main(["inspect", str(cache_db)]) == 0
+    assert "deleted entries: 0\n" in capsys.readouterr().out
+
+    with pytest.raises(FileNotFoundError):
+        main(["inspect", str(tmp_path / "missing.db")])
+
+
+@pytest.mark.skipif(not biothings_client._CACHING, reason="caching libraries not installed")
+def test_hishel_internals(tmp_path):
+    """
+    Verify the private hishel internals the storages depend on: the packing of the
+    entries and the layout of the response bodies in the sqlite streams table
+    """
+    import hishel
+
+    from biothings_client.cache.storage._hishel import pack, unpack
+    from biothings_client.cache.storage.sqlite3 import BiothingsClientSyncSqliteStorage
+
+    storage = BiothingsClientSyncSqliteStorage(database_path=tmp_path / "cache.db")
+
+    # a body written by hishel is read back in our layout
+    request = hishel.Request(method="GET", url="https://mygene.info/v3/gene/1017")
+    entry = storage.create_entry(
+        request, hishel.Response(status_code=200, stream=iter([b'{"_id": ', b'"1017"}'])), "cache-key-1017"
+    )
+    assert b"".join(entry.response.stream) == b'{"_id": "1017"}'
+    assert storage.read_stream(entry.id.bytes) == b'{"_id": "1017"}'
+
+    unpacked = unpack(pack(entry, kind="pair"), kind="pair")
+    assert unpacked.id == entry.id
+    assert str(unpacked.request.url) == "https://mygene.info/v3/gene/1017"
+    assert unpacked.response.status_code == 200
+
+    # a body written in our layout is served by hishel
+    request = hishel.Request(method="GET", url="https://mygene.info/v3/gene/1018")
+    entry = storage.create_entry(request, hishel.Response(status_code=200, stream=iter(())), "cache-key-1018")
+    storage.write_stream(entry.id, b'{"_id": "1018"}')
+    entries = storage.get_entries("cache-key-1018")
+    assert len(entries) == 1
+    assert b"".join(entries[0].response.stream) == b'{"_id": "1018"}'
+    storage.delete_database()
+
+    # the safe methods are overridden by the clients to cache the POST queries
+    assert "POST" in hishel._core._spec.SAFE_METHODS
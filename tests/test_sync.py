@@ -152,3 +152,909 @@ def test_cache_client_proxy_discovery(mock_client_proxy_configuration):
             assert proxy_url.host == b"fakehttpproxyhost"
             assert proxy_url.port == 6374
             assert proxy_url.target == b"/"
+
+
+def test_request_coalescing(mock_client):
+    """
+    Tests that identical requests issued concurrently from several threads
+    share a single network call once coalescing is enabled
+    """
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    requests_sent = []
+    barrier = threading.Barrier(8)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_sent.append(request.url)
+        time.sleep(0.2)
+        return httpx.Response(200, json={"_id": "1017", "symbol": "CDK2"})
+
+    gene_client = mock_client("gene", handler)
+    assert gene_client.coalesce_requests is False
+    gene_client.coalesce_requests = True
+    # the cache statistics count the lookups, not the callers sharing them
+    gene_client.caching_enabled = True
+    gene_client.http_cache_client_setup = True
+
+    def getgene() -> dict:
+        barrier.wait()
+        return gene_client.getgene("1017", fields="symbol")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        genes = list(executor.map(lambda _: getgene(), range(8)))
+    assert len(requests_sent) == 1
+    assert all(gene == {"_id": "1017", "symbol": "CDK2"} for gene in genes)
+    assert len({id(gene) for gene in genes}) == 8
+    assert gene_client.cache_statistics.misses == 1
+
+    gene_client.coalesce_requests = False
+    barrier.reset()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: getgene(), range(8)))
+    assert len(requests_sent) == 9
+
+
+def test_querymany_as_records(mock_client):
+    """
+    Tests decoding querymany hits into typed records restricted to the
+    requested fields
+    """
+    from urllib.parse import parse_qs
+
+    from biothings_client.utils.records import record_type
+
+    requested_fields = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        form = parse_qs(request.content.decode())
+        requested_fields.append(form["fields"][0])
+        return httpx.Response(
+            200,
+            json=[
+                {
+                    "query": "1017",
+                    "_id": "1017",
+                    "symbol": "CDK2",
+                    "taxid": 9606,
+                    "ensembl": {"gene": "ENSG00000123374", "transcript": ["ENST1", "ENST2"]},
+                },
+                {"query": "0", "notfound": True},
+                {"query": "CDK2", "_id": "1017", "symbol": "CDK2", "ensembl": [{"gene": "A"}, {"gene": "B"}]},
+                {"query": "CDK2", "_id": "12566", "symbol": "Cdk2"},
+            ],
+        )
+
+    gene_client = mock_client("gene", handler)
+
+    GeneRecord = record_type({"symbol": str, "ensembl.gene": str, "taxid": int}, name="GeneRecord")
+    results = gene_client.querymany(
+        ["1017", "0", "CDK2"], scopes="entrezgene,symbol", as_records=GeneRecord, returnall=True
+    )
+    assert requested_fields == ["symbol,ensembl.gene,taxid"]
+    records = results["out"]
+    assert records[0] == GeneRecord(query="1017", id="1017", symbol="CDK2", ensembl_gene="ENSG00000123374", taxid=9606)
+    assert records[1].id is None and records[1].symbol is None
+    assert records[2].ensembl_gene == ["A", "B"]
+    assert results["missing"] == ["0"]
+    assert results["dup"] == [("CDK2", 2)]
+
+    records = gene_client.querymany(["1017"], scopes="entrezgene", fields="symbol", as_records=True, verbose=False)
+    assert records[0]._fields == ("query", "id", "symbol")
+    with pytest.raises(ValueError):
+        gene_client.querymany(["1017"], as_records=GeneRecord, as_dataframe=True)
+    with pytest.raises(ValueError):
+        record_type(["ensembl.gene", "ensembl_gene"])
+
+
+def test_stream_responses(mock_client, batch_terms):
+    """
+    Tests that streamed as_generator and fetch_all queries return the same
+    hits as buffered ones
+    """
+    import json
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            gene_ids = batch_terms(request)
+            body = json.dumps([{"query": gene_id, "_id": gene_id} for gene_id in gene_ids]).encode("utf-8")
+            return httpx.Response(200, stream=httpx.ByteStream(body))
+        scroll_id = request.url.params.get("scroll_id")
+        if scroll_id == "2":
+            return httpx.Response(200, json={"success": False, "error": "No results to return."})
+        hits = [{"_id": "1017"}, {"_id": "1018"}] if scroll_id is None else [{"_id": "1019"}]
+        return httpx.Response(200, json={"total": 3, "hits": hits, "_scroll_id": "1" if scroll_id is None else "2"})
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 2
+
+    for stream_responses in (False, True):
+        gene_client.stream_responses = stream_responses
+        genes = list(gene_client.getgenes(["1017", "1018", "1019"], as_generator=True))
+        assert [gene["_id"] for gene in genes] == ["1017", "1018", "1019"]
+        genes = list(gene_client.query("cdk*", fetch_all=True))
+        assert [gene["_id"] for gene in genes] == ["1017", "1018", "1019"]
+
+
+@pytest.mark.skipif(not biothings_client._PYARROW, reason="pyarrow not installed")
+def test_querymany_as_arrow(mock_client, batch_terms):
+    """
+    Tests converting batches of querymany hits into an Arrow table with a
+    schema inferred from the first batch
+    """
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hits = []
+        for qterm in batch_terms(request):
+            if qterm == "0":
+                hits.append({"query": qterm, "notfound": True})
+            else:
+                alias = ["p33(CDK2)"] if qterm == "1017" else "CDKN3"
+                hits.append({"query": qterm, "_id": qterm, "taxid": 9606, "ensembl": {"gene": "ENSG1"}, "alias": alias})
+        return httpx.Response(200, json=hits)
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 2
+
+    results = gene_client.querymany(["1017", "0", "1018"], scopes="entrezgene", as_arrow=True, returnall=True)
+    table = results["out"]
+    assert table.num_rows == 3
+    assert table.column_names == ["query", "_id", "taxid", "ensembl", "alias", "notfound"]
+    assert table.column("alias").to_pylist() == [["p33(CDK2)"], None, ["CDKN3"]]
+    assert table.column("ensembl").to_pylist()[2] == {"gene": "ENSG1"}
+    assert results["missing"] == ["0"]
+
+    reader = gene_client.getgenes(["1017", "1018", "1019"], as_arrow=True, as_generator=True)
+    assert [batch.num_rows for batch in reader] == [2, 1]
+    with pytest.raises(ValueError):
+        gene_client.querymany(["1017"], as_arrow=True, as_dataframe=True)
+
+
+@pytest.mark.skipif(not biothings_client._POLARS, reason="polars is not installed")
+def test_querymany_as_polars_dataframe(mock_client, batch_terms):
+    """
+    Tests converting every batch of querymany hits into a polars frame with
+    dotted columns, the frames being concatenated at the end
+    """
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hits = []
+        for qterm in batch_terms(request):
+            if qterm == "0":
+                hits.append({"query": qterm, "notfound": True})
+            else:
+                alias = ["p33(CDK2)"] if qterm == "1017" else "CDKN3"
+                hits.append({"query": qterm, "_id": qterm, "ensembl": {"gene": "ENSG" + qterm}, "alias": alias})
+        return httpx.Response(200, json=hits)
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 2
+
+    results = gene_client.querymany(["1017", "1017", "0", "1018"], as_dataframe="polars", returnall=True)
+    frame = results["out"]
+    assert frame.height == 4
+    assert frame["ensembl.gene"].to_list() == ["ENSG1017", "ENSG1017", None, "ENSG1018"]
+    assert frame["alias"].to_list() == [["p33(CDK2)"], ["p33(CDK2)"], None, ["CDKN3"]]
+    assert results["missing"]["query"].to_list() == ["0"]
+    assert results["dup"].row(0) == ("1017", 2)
+
+
+@pytest.mark.skipif(not biothings_client._POLARS, reason="polars is not installed")
+def test_query_fetch_all_as_polars_dataframe(mock_client, scroll_handler):
+    """
+    Tests building one polars frame of all the hits of a fetch_all query from the
+    frames of its batches, and warning about the ignored pandas as_dataframe
+    """
+    hits = [
+        {"_id": str(n), "ensembl": {"gene": f"ENSG{n}"}, "alias": [f"A{n}"] if n < 2 else f"A{n}"} for n in range(5)
+    ]
+    query_handler = scroll_handler(hits)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/metadata/fields"):
+            return httpx.Response(200, json={"ensembl.gene": {"type": "keyword"}})
+        return query_handler(request)
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 2
+
+    frame = gene_client.query("cdk*", fetch_all=True, as_dataframe="polars", verbose=False)
+    assert frame.height == 5
+    assert frame["ensembl.gene"].to_list() == [f"ENSG{n}" for n in range(5)]
+    assert frame["alias"].to_list() == [["A0"], ["A1"], ["A2"], ["A3"], ["A4"]]
+
+    frame = gene_client.query("cdk*", fetch_all=True, as_dataframe="polars", columns=["ensembl.gene"], verbose=False)
+    assert frame.columns == ["ensembl.gene"]
+
+    with pytest.warns(UserWarning, match="Ignored 'as_dataframe'"):
+        assert len(list(gene_client.query("cdk*", fetch_all=True, as_dataframe=2, verbose=False))) == 5
+    with pytest.raises(ValueError):
+        gene_client.query("cdk*", fetch_all=True, as_dataframe="polars", as_records=True)
+
+
+def test_querymany_to_ndjson(tmp_path, mock_client, batch_terms):
+    """
+    Tests exporting querymany hits to gzip compressed NDJSON parts and resuming
+    an interrupted export after the last completed batch
+    """
+    import gzip
+    import json
+
+    from biothings_client.utils.sinks import NDJSONSink
+
+    failing_qterms = {"1020"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        qterms = batch_terms(request)
+        if failing_qterms.intersection(qterms):
+            return httpx.Response(500, json={"error": "unavailable"})
+        return httpx.Response(200, json=[{"query": qterm, "_id": qterm} for qterm in qterms])
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 2
+    gene_client.delay = 0
+    qterms = [str(qterm) for qterm in range(1015, 1022)]
+
+    output = tmp_path / "genes.ndjson.gz"
+    with pytest.raises(httpx.HTTPStatusError):
+        gene_client.querymany(
+            qterms, scopes="entrezgene", to_ndjson=NDJSONSink(output, compression="gzip", max_rows_per_file=3)
+        )
+
+    failing_qterms.clear()
+    sink = NDJSONSink(output, compression="gzip", max_rows_per_file=3, resume=True)
+    assert sink.resume_position == 4
+    paths = gene_client.querymany(qterms, scopes="entrezgene", to_ndjson=sink)
+    assert [path.name for path in paths] == ["genes-00000.ndjson.gz", "genes-00001.ndjson.gz"]
+    hits = [json.loads(line) for path in paths for line in gzip.decompress(path.read_bytes()).splitlines()]
+    assert [hit["_id"] for hit in hits] == qterms
+
+    paths = gene_client.getgenes(qterms, to_ndjson=tmp_path / "genes.ndjson")
+    assert len(paths[0].read_text().splitlines()) == len(qterms)
+    with pytest.raises(ValueError):
+        gene_client.getgenes(qterms, to_ndjson=tmp_path / "genes.ndjson", as_generator=True)
+
+
+@pytest.mark.skipif(not biothings_client._PYARROW, reason="pyarrow is not installed")
+def test_query_to_parquet(tmp_path, mock_client):
+    """
+    Tests exporting all the hits of a fetch_all query to a Parquet file
+    """
+    import pyarrow.parquet
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if "scroll_id" in request.url.params:
+            if request.url.params["scroll_id"] == "done":
+                return httpx.Response(200, json={"success": False, "error": "No results to return"})
+            hits = [{"_id": "3", "symbol": "CDK3", "taxid": 9606}]
+            return httpx.Response(200, json={"_scroll_id": "done", "hits": hits})
+        hits = [{"_id": "1", "symbol": "CDK1", "taxid": 9606}, {"_id": "2", "symbol": "CDK2", "taxid": 9606}]
+        return httpx.Response(200, json={"total": 3, "_scroll_id": "next", "hits": hits})
+
+    gene_client = mock_client("gene", handler)
+
+    output = tmp_path / "genes.parquet"
+    assert gene_client.query("cdk*", fetch_all=True, to_parquet=output) == [output]
+    table = pyarrow.parquet.read_table(output)
+    assert table.column("symbol").to_pylist() == ["CDK1", "CDK2", "CDK3"]
+    with pytest.raises(ValueError):
+        gene_client.query("cdk*", to_parquet=output)
+
+
+@pytest.mark.skipif(not biothings_client._PANDAS, reason="pandas is not installed")
+def test_query_as_dataframe_chunks(mock_client):
+    """
+    Tests splitting all the hits of a fetch_all query into DataFrames of a fixed
+    number of rows whose column set only grows
+    """
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if "scroll_id" not in request.url.params:
+            hits = [{"_id": "1", "symbol": "CDK1"}, {"_id": "2", "symbol": "CDK2"}, {"_id": "3", "symbol": "CDK3"}]
+            return httpx.Response(200, json={"total": 5, "_scroll_id": "next", "hits": hits})
+        if request.url.params["scroll_id"] == "done":
+            return httpx.Response(200, json={"success": False, "error": "No results to return"})
+        hits = [{"_id": "4", "symbol": "CDK4", "ensembl": {"gene": "ENSG4"}}, {"_id": "5", "symbol": "CDK5"}]
+        return httpx.Response(200, json={"_scroll_id": "done", "hits": hits})
+
+    gene_client = mock_client("gene", handler)
+
+    chunks = list(gene_client.query("cdk*", fields="symbol,taxid", fetch_all=True, as_dataframe_chunks=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert list(chunks[0].columns) == ["_id", "symbol", "taxid"]
+    assert list(chunks[1].columns) == ["_id", "symbol", "taxid", "ensembl.gene"]
+    assert list(chunks[2].columns) == ["_id", "symbol", "taxid", "ensembl.gene"]
+    with pytest.raises(ValueError):
+        gene_client.query("cdk*", as_dataframe_chunks=2)
+
+
+@pytest.mark.skipif(not biothings_client._PANDAS, reason="pandas is not installed")
+def test_querymany_columns_projection(caplog, mock_client):
+    """
+    Tests deriving the fields sent to the server from the columns of the
+    DataFrame, verified against the get_fields() metadata
+    """
+    from urllib.parse import parse_qs
+
+    from biothings_client.utils.fields import projection_fields
+
+    sent_fields = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/metadata/fields"):
+            return httpx.Response(200, json={"symbol": {"type": "text"}, "ensembl.gene": {"type": "keyword"}})
+        form = parse_qs(request.content.decode())
+        sent_fields.append(form["fields"][0])
+        hits = [
+            {"query": "1017", "_id": "1017", "symbol": "CDK2", "ensembl": {"gene": "ENSG1"}},
+            {"query": "1018", "_id": "1018", "symbol": "CDK3", "ensembl": [{"gene": "ENSG2"}, {"gene": "ENSG3"}]},
+        ]
+        return httpx.Response(200, json=hits)
+
+    gene_client = mock_client("gene", handler)
+
+    frame = gene_client.querymany(["1017", "1018"], columns=["symbol", "ensembl.gene"], as_dataframe=True)
+    assert sent_fields == ["symbol,ensembl.gene"]
+    assert list(frame.columns) == ["symbol", "ensembl.gene"]
+    assert frame.loc["1018", "ensembl.gene"] == ["ENSG2", "ENSG3"]
+    assert projection_fields(["ensembl.gene", "symbol", "ensembl", "symbol"]) == ["symbol", "ensembl"]
+
+    with caplog.at_level("WARNING", logger="biothings.client"):
+        gene_client.querymany(["1017"], columns="symbol,refseq.rna", as_dataframe=True)
+    assert "refseq.rna" in caplog.text
+    with pytest.raises(ValueError):
+        gene_client.querymany(["1017"], columns=["symbol"])
+
+
+def test_querymany_as_generator(mock_client, batch_terms):
+    """
+    Tests streaming the hits of querymany, the duplicate and missing query
+    terms being readable from the generator once it is exhausted
+    """
+    import json
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hits = []
+        for qterm in batch_terms(request):
+            if qterm == "0":
+                hits.append({"query": qterm, "notfound": True})
+            else:
+                hits.append({"query": qterm, "_id": qterm})
+                if qterm == "CDK2":
+                    hits.append({"query": qterm, "_id": "12566"})
+        return httpx.Response(200, stream=httpx.ByteStream(json.dumps(hits).encode("utf-8")))
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 2
+
+    for stream_responses in (False, True):
+        gene_client.stream_responses = stream_responses
+        hits = gene_client.querymany(["1017", "0", "CDK2", "1018", "0"], scopes="entrezgene,symbol", as_generator=True)
+        assert next(hits) == {"query": "1017", "_id": "1017"}
+        assert [hit.get("_id") for hit in hits] == [None, "CDK2", "12566", "1018", None]
+        assert hits.dup == [("CDK2", 2)]
+        assert hits.missing == ["0", "0"]
+        assert hits.accounting.inputs == 5 and hits.accounting.hits == 4
+
+    with pytest.raises(ValueError):
+        gene_client.querymany(["1017"], as_generator=True, returnall=True)
+
+
+def test_getannotations_dedupe(mock_client, batch_terms):
+    """
+    Tests sending every distinct id of a batch once, the hits being fanned back
+    out to every input position in input order, and the input being read batch
+    by batch
+    """
+    import itertools
+
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        terms = batch_terms(request)
+        requested.append(terms)
+        hits = []
+        for term in terms:
+            hits.append({"query": term, "notfound": True} if term == "0" else {"query": term, "_id": term})
+            if term == "CDK2":
+                hits.append({"query": term, "_id": "12566"})
+        return httpx.Response(200, json=hits)
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 3
+
+    genes = gene_client.getgenes(["1017", "1018", 1017, "1019", "1019", "1017"], dedupe=True)
+    assert requested == [["1017", "1018"], ["1019", "1017"]]
+    assert [gene["_id"] for gene in genes] == ["1017", "1018", "1017", "1019", "1019", "1017"]
+    assert genes[2] == genes[0] and genes[2] is not genes[0]
+
+    requested.clear()
+    results = gene_client.querymany(["CDK2", "0", "CDK2", "1017", "0"], dedupe=True, returnall=True)
+    assert requested == [["CDK2", "0"], ["1017", "0"]]
+    assert [hit.get("_id") for hit in results["out"]] == ["CDK2", "12566", None, "CDK2", "12566", "1017", None]
+    assert results["dup"] == [("CDK2", 4)]
+    assert results["missing"] == ["0", "0"]
+
+    qterms = iter(["CDK2", "CDK2", "CDK2", "1017", "1017"])
+    hits = gene_client.querymany(qterms, dedupe=True, as_generator=True)
+    assert [hit["_id"] for hit in itertools.islice(hits, 6)] == ["CDK2", "12566"] * 3
+    assert list(qterms) == ["1017", "1017"]
+    hits = gene_client.querymany(["CDK2", "CDK2", "1017"], dedupe=True, as_generator=True)
+    assert len(list(hits)) == 5
+    assert hits.accounting.inputs == 3 and hits.accounting.hits == 5
+    with pytest.raises(ValueError):
+        gene_client.getgenes(["1017"], dedupe=True, return_raw=True)
+
+
+def test_querymany_unordered_with_positions(mock_client, batch_terms):
+    """
+    Tests mapping the hits to their input positions, and restoring the input
+    order of the hits of concurrent batches received fastest first
+    """
+    import threading
+
+    from biothings_client.utils.positions import input_order
+
+    first_batch_sent = threading.Event()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        qterms = batch_terms(request)
+        if qterms[0] == "1017":
+            # the first batch is only answered once the second one was received
+            assert first_batch_sent.wait(5)
+        else:
+            first_batch_sent.set()
+        hits = []
+        for qterm in qterms:
+            hits.append({"query": qterm, "notfound": True} if qterm == "0" else {"query": qterm, "_id": qterm})
+            if qterm == "CDK2":
+                hits.append({"query": qterm, "_id": "12566"})
+        return httpx.Response(200, json=hits)
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 2
+
+    qterms = ["1017", "CDK2", "0", "1018"]
+    hits, positions = gene_client.querymany(qterms, unordered=True, with_positions=True)
+    assert [hit["query"] for hit in hits] == ["0", "1018", "1017", "CDK2", "CDK2"]
+    assert list(positions) == [2, 3, 0, 1, 1]
+    assert [hits[index].get("_id") for index in input_order(positions)] == ["1017", "CDK2", "12566", None, "1018"]
+
+    results = gene_client.querymany(qterms, with_positions=True, returnall=True)
+    assert list(results["positions"]) == [0, 1, 1, 2, 3]
+    assert results["missing"] == ["0"]
+    items = list(gene_client.getgenes(qterms, with_positions=True, as_generator=True))
+    assert [position for position, _ in items] == [0, 1, 1, 2, 3]
+    with pytest.raises(ValueError):
+        gene_client.querymany(qterms, dedupe=True, unordered=True)
+
+
+def test_querymany_adaptive_step(mock_client, batch_terms):
+    """
+    Tests sizing the batches from the response size of the previous batches,
+    within max_query inputs
+    """
+
+    batch_sizes = []
+    payload = {"padding": "x" * 1000}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        qterms = batch_terms(request)
+        batch_sizes.append(len(qterms))
+        return httpx.Response(200, json=[{"query": qterm, "_id": qterm, **payload} for qterm in qterms])
+
+    gene_client = mock_client("gene", handler)
+    gene_client.step = 10
+    gene_client.adaptive_step = True
+    gene_client.step_latency_budget = 0
+    gene_client.step_size_budget = 4000
+
+    qterms = [str(index) for index in range(40)]
+    hits = gene_client.querymany(qterms, scopes="entrezgene", verbose=False)
+    assert [hit["_id"] for hit in hits] == qterms
+    assert batch_sizes[0] == 10
+    assert all(size == 3 for size in batch_sizes[1:])
+
+    # small hits, the batches grow twofold up to max_query
+    batch_sizes.clear()
+    payload = {}
+    gene_client.step = 2
+    gene_client.max_query = 16
+    gene_client.querymany(qterms, scopes="entrezgene", verbose=False)
+    assert batch_sizes == [2, 4, 8, 16, 10]
+
+
+def test_querymany_request_bodies(mock_client):
+    """
+    Tests sending the batch queries as JSON and gzip compressed bodies
+    """
+    import gzip
+    import json
+    from urllib.parse import parse_qs
+
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = request.content
+        if request.headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        if request.headers["content-type"] == "application/json":
+            qterms = json.loads(body)["q"]
+        else:
+            qterms = parse_qs(body.decode())["q"][0].replace('"', "").split(",")
+        requests.append((request.headers["content-type"], request.headers.get("content-encoding"), len(qterms)))
+        return httpx.Response(200, json=[{"query": qterm, "_id": qterm} for qterm in qterms])
+
+    variant_client = mock_client("variant", handler)
+
+    qterms = [f"chr7:g.{140453136 + index}A>T" for index in range(100)]
+    variant_client.request_compression = "gzip"
+    hits = variant_client.querymany(qterms, scopes="_id", verbose=False)
+    assert [hit["_id"] for hit in hits] == qterms
+    variant_client.request_body_format = "json"
+    hits = variant_client.querymany(qterms[:2], scopes="_id", verbose=False)
+    assert [hit["_id"] for hit in hits] == qterms[:2]
+    assert requests == [
+        ("application/x-www-form-urlencoded", "gzip", 100),
+        ("application/json", None, 2),
+    ]
+
+    variant_client.request_compression = "br"
+    with pytest.raises(ValueError):
+        variant_client.querymany(qterms, scopes="_id", verbose=False)
+
+
+def test_output_options(mock_client):
+    """
+    Tests that the output options that can't be combined are rejected by every query
+    method before sending a request
+    """
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise AssertionError("no request is sent")
+
+    gene_client = mock_client("gene", handler)
+    with pytest.raises(ValueError, match="as_dataframe can't be combined with as_generator"):
+        gene_client.getgenes(["1017"], as_dataframe=True, as_generator=True)
+    with pytest.raises(ValueError, match="as_dataframe_chunks can't be combined with as_generator"):
+        gene_client.getgenes(["1017"], as_dataframe_chunks=10, as_generator=True)
+    with pytest.raises(ValueError, match="as_arrow can't be combined with return_raw"):
+        gene_client.query("cdk2", as_arrow=True, return_raw=True)
+    with pytest.raises(ValueError, match="as_arrow can't be combined with as_generator"):
+        gene_client.querymany(["cdk2"], as_arrow=True, as_generator=True)
+    with pytest.raises(ValueError, match="as_generator can't be combined with returnall"):
+        gene_client.querymany(["cdk2"], as_generator=True, returnall=True)
+
+
+def test_accept_encoding(mock_client):
+    """
+    Tests that the requests ask for the response encodings httpx can decode, whatever
+    the headers of the http client
+    """
+    from biothings_client._dependencies import _BROTLI, _ZSTANDARD
+    from biothings_client.utils.encoding import ACCEPT_ENCODING, accept_encoding
+
+    assert accept_encoding(brotli=False, zstandard=False) == "gzip, deflate"
+    assert accept_encoding(brotli=True, zstandard=False) == "gzip, deflate, br"
+    assert accept_encoding(brotli=True, zstandard=True) == "gzip, deflate, br, zstd"
+    assert ACCEPT_ENCODING == accept_encoding(brotli=_BROTLI, zstandard=_ZSTANDARD)
+
+    encodings = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        encodings.append((request.method, request.headers["accept-encoding"]))
+        if request.method == "POST":
+            return httpx.Response(200, json=[{"query": "1017", "_id": "1017"}])
+        return httpx.Response(200, json={"_id": "1017"})
+
+    gene_client = mock_client("gene", handler, headers={"accept-encoding": "identity"})
+    gene_client.getgene("1017")
+    gene_client.getgenes(["1017"], verbose=False)
+    assert encodings == [("GET", ACCEPT_ENCODING), ("POST", ACCEPT_ENCODING)]
+
+
+def test_query_parallel_pages(mock_client):
+    """
+    Tests fetching the pages of a query larger than one page at once, up to the
+    total number of hits
+    """
+    pages = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        skip, size = int(request.url.params["skip"]), int(request.url.params["size"])
+        pages.append((skip, size))
+        hits = [{"_id": str(rank), "_score": 100.0 - rank} for rank in range(skip, min(skip + size, 2500))]
+        return httpx.Response(200, json={"took": 1, "total": 2500, "max_score": 100.0, "hits": hits})
+
+    gene_client = mock_client("gene", handler)
+
+    out = gene_client.query("cdk*", size=5000, parallel_pages=2, verbose=False)
+    assert out["total"] == 2500
+    assert [hit["_id"] for hit in out["hits"]] == [str(rank) for rank in range(2500)]
+    assert sorted(pages) == [(0, 1000), (1000, 1000), (2000, 500)]
+
+    pages.clear()
+    out = gene_client.query("cdk*", skip=2400, size=5000, parallel_pages=2, verbose=False)
+    assert len(out["hits"]) == 100
+    assert pages == [(2400, 1000)]
+    with pytest.raises(ValueError):
+        gene_client.query("cdk*", size=5000, parallel_pages=2, fetch_all=True)
+
+
+def test_query_split_long_disjunction(mock_client, scroll_handler):
+    """
+    Tests splitting a query string too long for a URL into sub-queries, their hits
+    being unioned and deduplicated by _id
+    """
+    import re
+    from urllib.parse import quote_plus
+
+    urls = []
+
+    def gene_hits(q):
+        # every gene matches its number modulo 50, the sub-queries overlap
+        ids = sorted({int(n) % 50 for n in re.findall(r"entrezgene:(\d+)", q)})
+        return [{"_id": str(n), "_score": float(n)} for n in ids]
+
+    def on_request(request: httpx.Request) -> None:
+        urls.append(str(request.url))
+
+    gene_client = mock_client("gene", scroll_handler(gene_hits, on_request=on_request, took=1))
+    gene_client.max_query_length = 1000
+
+    q = "(" + " OR ".join(f"entrezgene:{n}" for n in range(300)) + ") AND taxid:9606"
+    out = gene_client.query(q, size=20, verbose=False)
+    assert len(urls) > 1
+    assert all(len(quote_plus(httpx.URL(url).params["q"])) <= 1000 for url in urls)
+    assert all(httpx.URL(url).params["q"].endswith(") AND taxid:9606") for url in urls)
+    assert [hit["_id"] for hit in out["hits"]] == [str(n) for n in range(20)]
+
+    hits = list(gene_client.query(q, fetch_all=True, verbose=False))
+    assert sorted(int(hit["_id"]) for hit in hits) == list(range(50))
+
+    urls.clear()
+    gene_client.query("entrezgene:1 OR -taxid:9606 " + "x" * 1000, verbose=False)
+    assert len(urls) == 1
+
+    def page_handler(request: httpx.Request) -> httpx.Response:
+        # a page is capped at max_query hits like the APIs cap them at 1000
+        params = request.url.params
+        skip, size = int(params.get("skip", 0)), int(params["size"])
+        if size > 10:
+            return httpx.Response(400, json={"success": False, "error": "size too large"})
+        page = gene_hits(params["q"])
+        return httpx.Response(200, json={"total": len(page), "hits": page[skip : skip + size]})
+
+    gene_client = mock_client("gene", page_handler)
+    gene_client.max_query_length = 1000
+    gene_client.max_query = 10
+    out = gene_client.query(q, skip=5, size=20, verbose=False)
+    assert [hit["_id"] for hit in out["hits"]] == [str(n) for n in range(5, 25)]
+
+
+def test_pipelined_join(mock_client, scroll_handler):
+    """
+    Tests overlapping the inner queries of several outer chunks of a join, the
+    joined docs being yielded in the order of the outer chunks
+    """
+    import re
+    import threading
+
+    from biothings_client.utils.join import join, pipelined_join
+
+    second_chunk_queried = threading.Event()
+
+    def inner_hits(q):
+        ids = [int(n) for n in re.findall(r"_id:(\d+)", q)]
+        if ids[0] == 0:
+            # the first chunk is only answered once the second one was queried
+            assert second_chunk_queried.wait(5)
+        elif ids[0] == 100:
+            second_chunk_queried.set()
+        return [{"_id": str(n)} for n in ids if n % 2 == 0]
+
+    outer_handler = scroll_handler([{"_id": str(n), "symbol": f"GENE{n}"} for n in range(250)])
+    outer_client, inner_client = mock_client("gene", outer_handler), mock_client("gene", scroll_handler(inner_hits))
+    docs = [
+        doc for chunk in pipelined_join(outer_client, inner_client, size=30, window=2, lookup=False) for doc in chunk
+    ]
+    assert len(docs) == 125
+    assert [int(doc["_id"]) // 100 for doc in docs] == sorted(int(doc["_id"]) // 100 for doc in docs)
+    assert all(doc["gene"] == [{"_id": doc["_id"]}] for doc in docs)
+
+    second_chunk_queried.set()
+    joined = [
+        doc["_id"]
+        for chunk in join(mock_client("gene", outer_handler), inner_client, size=30, lookup=False)
+        for doc in chunk
+    ]
+    assert sorted(joined) == sorted(doc["_id"] for doc in docs)
+
+
+def test_pipelined_join_shared_client(mock_client, scroll_handler):
+    """
+    Tests a pipelined join of a client with itself with caching enabled, the caching
+    being disabled once for the whole join instead of by every concurrent fetch_all
+    """
+    import re
+
+    from biothings_client.utils.join import pipelined_join
+
+    cache_disabled = []
+
+    def gene_hits(q):
+        ids = range(250) if q == "__all__" else [int(n) for n in re.findall(r"_id:(\d+)", q)]
+        return [{"_id": str(n)} for n in ids if n % 2 == 0]
+
+    def on_request(request: httpx.Request) -> None:
+        cache_disabled.append(request.extensions["cache_disabled"])
+
+    gene_client = mock_client("gene", scroll_handler(gene_hits, on_request=on_request))
+    gene_client.http_cache_client_setup = True
+    gene_client.caching_enabled = True
+    toggles = []
+
+    def stop_caching():
+        toggles.append("stop")
+        gene_client.caching_enabled = False
+
+    def set_caching():
+        toggles.append("set")
+        gene_client.caching_enabled = True
+
+    gene_client._stop_caching = stop_caching
+    gene_client._set_caching = set_caching
+
+    docs = [doc for chunk in pipelined_join(gene_client, gene_client, size=30, window=3, lookup=False) for doc in chunk]
+    assert sorted(int(doc["_id"]) for doc in docs) == list(range(0, 250, 2))
+    assert all(doc["gene"] == [{"_id": doc["_id"]}] for doc in docs)
+    assert toggles == ["stop", "set"]
+    assert gene_client.caching_enabled
+    assert cache_disabled and all(cache_disabled)
+
+
+def test_grace_hash_join(tmp_path, mock_client, scroll_handler):
+    """
+    Tests the out-of-core join of two whole collections, with multi-valued join fields
+    spread over several partitions and partitions split again to fit max_memory
+    """
+    from biothings_client.utils.join import grace_hash_join
+
+    genes = [{"_id": str(n), "uniprot": [f"P{n}", f"P{n + 1000}"] if n % 5 == 0 else f"P{n}"} for n in range(1, 401)]
+    chems = [{"_id": f"C{m}", "target": f"p{m % 700}" if m % 3 else [f"P{m}", f"P{m + 1}"]} for m in range(1300)]
+
+    expected = {}
+    for gene in genes:
+        keys = gene["uniprot"] if isinstance(gene["uniprot"], list) else [gene["uniprot"]]
+        matches = [
+            chem["_id"]
+            for key in keys
+            for chem in chems
+            if key.lower()
+            in [t.lower() for t in (chem["target"] if isinstance(chem["target"], list) else [chem["target"]])]
+        ]
+        if matches:
+            expected[gene["_id"]] = sorted(matches)
+
+    chunks = list(
+        grace_hash_join(
+            mock_client("gene", scroll_handler(genes)),
+            mock_client("chem", scroll_handler(chems)),
+            size=50,
+            e1_join_field="uniprot",
+            e2_join_field="target",
+            max_memory=2000,
+            partitions=4,
+            spill_dir=str(tmp_path),
+        )
+    )
+    assert all(len(chunk) == 50 for chunk in chunks[:-1])
+    joined = {doc["_id"]: sorted(chem["_id"] for chem in doc["chem"]) for chunk in chunks for doc in chunk}
+    assert sum(len(chunk) for chunk in chunks) == len(joined)
+    assert joined == expected
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(ValueError):
+        next(
+            grace_hash_join(
+                mock_client("gene", scroll_handler(genes)), mock_client("chem", scroll_handler(chems)), partitions=0
+            )
+        )
+
+
+def test_join_key_lookup(mock_client, scroll_handler, batch_terms):
+    """
+    Tests looking up the inner docs of a join by key in batches, with getannotations
+    for a join on _id and with querymany on the join field scope
+    """
+    from urllib.parse import parse_qs
+
+    from biothings_client.utils.join import join
+
+    inner_requests = []
+    outer_handler = scroll_handler([{"_id": str(n), "entrezgene": n} for n in range(1, 1501)])
+
+    def inner_handler(request: httpx.Request) -> httpx.Response:
+        assert request.method == "POST"
+        terms = batch_terms(request)
+        scopes = parse_qs(request.content.decode()).get("scopes", [None])[0]
+        inner_requests.append((request.url.path, scopes, len(terms)))
+        hits = [
+            (
+                {"query": term, "notfound": True}
+                if int(term) % 2
+                else {"query": term, "_id": term, "dbsnp": {"gene": {"geneid": int(term)}}}
+            )
+            for term in terms
+        ]
+        return httpx.Response(200, json=hits)
+
+    outer_client, inner_client = mock_client("gene", outer_handler), mock_client("variant", inner_handler)
+    docs = [doc for chunk in join(outer_client, inner_client, size=100) for doc in chunk]
+    assert len(docs) == 750
+    assert all(doc["variant"] == [{"_id": doc["_id"], "dbsnp": {"gene": {"geneid": int(doc["_id"])}}}] for doc in docs)
+    assert inner_requests == [("/v1/variant/", None, 1000), ("/v1/variant/", None, 500)]
+
+    inner_requests.clear()
+    outer_client = mock_client("gene", outer_handler)
+    chunks = join(
+        outer_client, inner_client, e1_join_field="entrezgene", e2_join_field="dbsnp.gene.geneid", lookup=True
+    )
+    assert sum(len(chunk) for chunk in chunks) == 750
+    assert inner_requests == [("/v1/query/", "dbsnp.gene.geneid", 1000), ("/v1/query/", "dbsnp.gene.geneid", 500)]
+    with pytest.raises(ValueError):
+        next(join(outer_client, inner_client, e2_query="chrom:1", lookup=True))
+
+
+def test_join_key_lookup_truncated_terms(mock_client, scroll_handler, batch_terms):
+    """
+    Tests that the hits of the join values reaching the querymany size are scrolled
+    in full, and that the fields of e2_kwargs are left as given
+    """
+    import re
+    from urllib.parse import parse_qs
+
+    from biothings_client.utils.join import join
+
+    inner_fields = []
+    scrolled = []
+
+    def variants(geneid):
+        count = 12 if geneid == 2 else 1
+        return [{"_id": f"{geneid}-{n}", "dbsnp": {"gene": {"geneid": geneid}}} for n in range(count)]
+
+    def scrolled_variants(q):
+        geneids = [int(geneid) for geneid in re.findall(r"dbsnp\.gene\.geneid:(\d+)", q)]
+        scrolled.append(geneids)
+        return [hit for geneid in geneids for hit in variants(geneid)]
+
+    def on_scroll_request(request: httpx.Request) -> None:
+        if "scroll_id" not in request.url.params:
+            inner_fields.append(request.url.params["fields"])
+
+    scrolled_handler = scroll_handler(scrolled_variants, on_request=on_scroll_request)
+
+    def inner_handler(request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return scrolled_handler(request)
+        inner_fields.append(parse_qs(request.content.decode())["fields"][0])
+        hits = [{"query": term, **hit} for term in batch_terms(request) for hit in variants(int(term))[:10]]
+        return httpx.Response(200, json=hits)
+
+    e2_kwargs = {"fields": "dbsnp.rsid"}
+    chunks = join(
+        mock_client("gene", scroll_handler([{"_id": str(n), "entrezgene": n} for n in range(1, 1501)])),
+        mock_client("variant", inner_handler),
+        e1_join_field="entrezgene",
+        e2_join_field="dbsnp.gene.geneid",
+        e2_kwargs=e2_kwargs,
+        lookup=True,
+    )
+    docs = {doc["_id"]: doc for chunk in chunks for doc in chunk}
+    assert len(docs) == 1500
+    assert len(docs["2"]["variant"]) == 12
+    assert docs["3"]["variant"] == variants(3)
+    assert scrolled == [[2]]
+    assert e2_kwargs == {"fields": "dbsnp.rsid"}
+    assert inner_fields == ["dbsnp.rsid,dbsnp.gene.geneid"] * 3
@@ -0,0 +1,189 @@
+"""
+Test suite for the client utilities
+"""
+
+import pytest
+
+
+def test_check_output_options():
+    """
+    Tests that the output options can only be combined in the supported ways
+    """
+    from biothings_client.utils.options import COMPATIBLE_OUTPUTS, check_output_options
+
+    check_output_options(as_dataframe=True, as_records=False, to_parquet=False)
+    check_output_options(as_generator=True, as_arrow=True)
+    check_output_options(returnall=True, as_dataframe=True)
+    with pytest.raises(ValueError, match="as_records can't be combined with as_generator"):
+        check_output_options(as_generator=True, as_records=True, as_dataframe=False, compatible=())
+    with pytest.raises(ValueError, match="as_dataframe can't be combined with as_dataframe_chunks"):
+        check_output_options(as_dataframe_chunks=True, as_dataframe=True)
+    with pytest.raises(ValueError, match="to_parquet can't be combined with to_ndjson"):
+        check_output_options(to_ndjson=True, to_parquet=True)
+    with pytest.raises(ValueError, match="as_arrow can't be combined with as_generator"):
+        check_output_options(
+            COMPATIBLE_OUTPUTS - {frozenset(["as_generator", "as_arrow"])}, as_generator=True, as_arrow=True
+        )
+
+
+def test_decode_json():
+    """
+    Tests that the fast JSON decoder falls back on the standard library
+    for documents it rejects
+    """
+    import math
+
+    from biothings_client.utils.decoding import decode_json
+
+    assert decode_json(b'[{"_id": "1017", "taxid": 9606}]') == [{"_id": "1017", "taxid": 9606}]
+    assert math.isnan(decode_json(b'{"score": NaN}')["score"])
+    with pytest.raises(ValueError):
+        decode_json(b'{"_id": ')
+
+
+def test_field_extractor():
+    """
+    Tests extracting dotted fields from hits, collecting the values below lists
+    """
+    from biothings_client.utils.fields import FieldExtractor
+
+    hits = [
+        {"entrezgene": 1017, "ensembl": {"gene": "ENSG1", "transcript": ["T1", "T2"]}, "go": {"BP": {"id": "GO:1"}}},
+        {"entrezgene": 1018, "ensembl": [{"gene": "ENSG2"}, {"gene": "ENSG3", "transcript": ["T3"]}]},
+        {"_id": "1019", "ensembl": "ENSG4"},
+    ]
+    extractor = FieldExtractor("entrezgene,ensembl.gene,ensembl.transcript,go.BP.id")
+    assert extractor.columns(hits) == {
+        "entrezgene": [1017, 1018, None],
+        "ensembl.gene": ["ENSG1", ["ENSG2", "ENSG3"], None],
+        "ensembl.transcript": [["T1", "T2"], ["T3"], None],
+        "go.BP.id": ["GO:1", None, None],
+    }
+    assert FieldExtractor(["ensembl.gene"]).columns([]) == {"ensembl.gene": []}
+
+
+def test_json_array_parser():
+    """
+    Tests incrementally parsing the hits of batch and query responses
+    split in arbitrary chunks
+    """
+    import json
+
+    from biothings_client.utils.streaming import JsonArrayParser
+
+    hits = [{"_id": "1017", "alias": ["p33(CDK2)"], "name": 'cyclin "dependent" kinase 2 [}'}, {"_id": "1018"}, 3]
+    for key, document in [(None, hits), ("hits", {"total": 3, "hits": hits, "_scroll_id": "c2Nhbj"})]:
+        body = json.dumps(document, indent=1).encode("utf-8")
+        for chunk_size in (1, 7, len(body)):
+            parser = JsonArrayParser(key)
+            parsed = []
+            for offset in range(0, len(body), chunk_size):
+                parsed.extend(parser.feed(body[offset : offset + chunk_size]))
+            assert parsed == hits
+            envelope = parser.close()
+            assert envelope == ([] if key is None else {"total": 3, "hits": [], "_scroll_id": "c2Nhbj"})
+
+    parser = JsonArrayParser()
+    assert parser.feed(b'[{"_id": "1017"}, {"_id": ') == [{"_id": "1017"}]
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_query_accounting():
+    """
+    Tests counting the duplicate and missing query terms over the input
+    positions, and rendering only the first of them in the log lines
+    """
+    from biothings_client.utils.accounting import QueryAccounting, truncated_repr
+
+    accounting = QueryAccounting()
+    terms = [str(term) for term in range(3000)] + ["7", 12]
+    for batch in (terms[:1000], terms[1000:2500], terms[2500:]):
+        accounting.add_inputs(batch)
+        for term in batch:
+            term = str(term)
+            if int(term) % 3 == 0:
+                accounting.add_hit(term, found=False)
+            else:
+                accounting.add_hit(term)
+    accounting.add_hit("1", found=True)
+    accounting.add_hit("unregistered")
+    assert accounting.inputs == 3003 and accounting.hits == 2003
+    assert accounting.duplicates == [("1", 2), ("7", 2)]
+    assert accounting.missing == [str(term) for term in range(0, 3000, 3)] + ["12"]
+    assert accounting.is_missing(12) and not accounting.is_missing(7)
+    assert truncated_repr(accounting.iter_missing(), 20) == str(accounting.missing)[:20]
+    assert truncated_repr(iter([("1", 2)])) == "[('1', 2)]"
+
+
+def test_union_responses():
+    """
+    Tests the union of the responses of sub-queries, in the order of the sub-queries
+    or ranked by their scores
+    """
+    from biothings_client.utils.planner import union_responses
+
+    responses = [
+        {"took": 2, "total": 2, "max_score": 1.0, "hits": [{"_id": "a", "_score": 1.0}, {"_id": "b", "_score": 0.5}]},
+        {"took": 5, "total": 2, "max_score": 3.0, "hits": [{"_id": "c", "_score": 3.0}, {"_id": "a", "_score": 2.0}]},
+    ]
+    out = union_responses(responses, size=2)
+    assert [hit["_id"] for hit in out["hits"]] == ["a", "b"]
+    assert (out["took"], out["total"], out["max_score"]) == (5, 4, 3.0)
+    assert [hit["_id"] for hit in union_responses(responses, size=3, skip=1)["hits"]] == ["b", "c"]
+    # a hit of several sub-queries keeps the score of the first one
+    assert [hit["_id"] for hit in union_responses(responses, size=3, by_score=True)["hits"]] == ["c", "a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_async_batch_loader_cancelled():
+    """
+    Tests that the loads waiting for a batch are cancelled with it
+    """
+    import asyncio
+
+    from biothings_client.utils.batching import AsyncBatchLoader
+
+    started = asyncio.Event()
+
+    async def load_fn(keys):
+        started.set()
+        await asyncio.sleep(60)
+        return {}
+
+    loader = AsyncBatchLoader(load_fn, max_batch_size=2, window=60)
+    loads = [asyncio.ensure_future(loader.load(key)) for key in ("a", "b")]
+    await asyncio.wait_for(started.wait(), 5)
+    for batch in list(loader._batches):
+        batch.cancel()
+    results = await asyncio.wait_for(asyncio.gather(*loads, return_exceptions=True), 5)
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+def test_async_batch_loader_new_loop():
+    """
+    Tests that the timer of a batch pending on another event loop is cancelled when
+    a loader is used from a new loop
+    """
+    import asyncio
+
+    from biothings_client.utils.batching import AsyncBatchLoader
+
+    async def load_fn(keys):
+        return {key: key.upper() for key in keys}
+
+    loader = AsyncBatchLoader(load_fn, max_batch_size=10, window=60)
+    old_loop = asyncio.new_event_loop()
+    try:
+        pending = old_loop.create_task(loader.load("a"))
+        old_loop.run_until_complete(asyncio.sleep(0))
+        timer = loader._timer
+        assert timer is not None and not timer.cancelled()
+
+        loader.window = 0
+        assert asyncio.run(loader.load("b")) == "B"
+        assert timer.cancelled()
+    finally:
+        pending.cancel()
+        old_loop.run_until_complete(asyncio.gather(pending, return_exceptions=True))
+        old_loop.close()